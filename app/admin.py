@@ -1,44 +1,88 @@
-from django.contrib import admin
-from django.db.models import Avg, Count
+import re
+
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import path
+from django.urls import reverse
+from django.utils.html import format_html
 from .models import (
     Child, Teacher, Kindergarten, Group, 
     Enrollment, Review, KindergartenTeacher,
-    KindergartenImage
+    KindergartenImage, ArchivedReview, ArchivedEnrollment, EnrollmentApplication
 )
+from .waitlist import allocate_waitlist
+from . import admin_actions, deletion, fuzzy, objcache, stats
+from .admin_filters import AutocompleteFilter, DateBucketFilter, LargeTableMixin
+from .admin_inlines import PaginatedInlineMixin, PaginatedInlinesAdminMixin
+
+
+# Телефоны и email ищем обычным поиском по search_fields, остальное — по ФИО
+_CONTACT_QUERY = re.compile(r'[\d@]')
+
+
+def is_name_query(term):
+    return bool(term.strip()) and not _CONTACT_QUERY.search(term)
+
+
+class FuzzyNameSearchMixin:
+    """Поиск по ФИО через триграммный индекс: с опечатками и в латинице."""
+    fuzzy_kind = None
+    fuzzy_limit = 200
+
+    def get_search_results(self, request, queryset, search_term):
+        if not is_name_query(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        ranked = [pk for pk, _ in fuzzy.search(self.fuzzy_kind, search_term, limit=self.fuzzy_limit)]
+        queryset = queryset.filter(pk__in=ranked).annotate(fuzzy_rank=Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked)],
+            default=Value(len(ranked)),
+            output_field=IntegerField(),
+        ))
+        # По убыванию сходства, пока пользователь сам не выбрал сортировку
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('fuzzy_rank')
+        return queryset, False
 
 
 @admin.register(Child)
-class ChildAdmin(admin.ModelAdmin):
+class ChildAdmin(FuzzyNameSearchMixin, LargeTableMixin, admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'birth_date', 'parent_contact')
-    list_filter = ('birth_date',)
+    list_filter = (('birth_date', DateBucketFilter),)
     search_fields = ('first_name', 'last_name', 'parent_contact')
     ordering = ('last_name', 'first_name')
-    date_hierarchy = 'birth_date'
+    fuzzy_kind = 'child'
 
 
 @admin.register(Teacher)
-class TeacherAdmin(admin.ModelAdmin):
+class TeacherAdmin(FuzzyNameSearchMixin, LargeTableMixin, admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'phone_number', 'qualification', 'experience_years')
     list_filter = ('qualification', 'experience_years')
     search_fields = ('first_name', 'last_name', 'phone_number')
     ordering = ('last_name', 'first_name')
+    fuzzy_kind = 'teacher'
 
 
-class KindergartenImageInline(admin.TabularInline):
+class KindergartenImageInline(PaginatedInlineMixin, admin.TabularInline):
     model = KindergartenImage
     extra = 1
     fields = ['image', 'caption', 'order']
     classes = ['collapse']
 
 
-class GroupInline(admin.TabularInline):
+class GroupInline(PaginatedInlineMixin, admin.TabularInline):
     model = Group
     extra = 1
     show_change_link = True
     classes = ['collapse']
 
 
-class KindergartenTeacherInline(admin.TabularInline):
+class KindergartenTeacherInline(PaginatedInlineMixin, admin.TabularInline):
     model = KindergartenTeacher
     extra = 1
     show_change_link = True
@@ -46,28 +90,31 @@ class KindergartenTeacherInline(admin.TabularInline):
     autocomplete_fields = ['teacher']
 
 
-class ReviewInline(admin.TabularInline):
-    model = Review
-    extra = 0
-    readonly_fields = ('parent_name', 'rating', 'comment')
-    classes = ['collapse']
+def _related_count(model, field):
+    # Коррелированный подзапрос вместо JOIN + COUNT(DISTINCT): JOIN нескольких
+    # связей размножает строки и заставляет группировать весь список
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(n=Count('pk')).values('n')), Value(0))
 
 
 @admin.register(Kindergarten)
-class KindergartenAdmin(admin.ModelAdmin):
+class KindergartenAdmin(PaginatedInlinesAdminMixin, LargeTableMixin, admin.ModelAdmin):
     list_display = ('name', 'address', 'phone', 'capacity', 'established_at', 
                     'is_recommended', 'average_rating_display', 'groups_display', 'teachers_display')
-    list_filter = ('established_at', 'capacity', 'is_recommended')
-    search_fields = ('name', 'address', 'phone', 'description')
+    list_filter = ('district', ('established_at', DateBucketFilter), 'capacity', 'is_recommended')
+    search_fields = ('name', 'address', 'district', 'phone', 'description')
     ordering = ('name',)
-    date_hierarchy = 'established_at'
     readonly_fields = ('average_rating_display', 'groups_display', 'teachers_display')
     list_editable = ('is_recommended',)
+    actions = [admin_actions.mark_recommended, admin_actions.unmark_recommended]
     
     fieldsets = [
         ('Основная информация', {
             'fields': ['name', 'address', 'phone', 'description']
         }),
+        ('Расположение', {
+            'fields': ['district', 'latitude', 'longitude']
+        }),
         ('Характеристики', {
             'fields': ['capacity', 'established_at', 'is_recommended', 'features']
         }),
@@ -77,35 +124,104 @@ class KindergartenAdmin(admin.ModelAdmin):
         }),
     ]
     
-    inlines = [KindergartenImageInline, GroupInline, KindergartenTeacherInline, ReviewInline]
+    inlines = [KindergartenImageInline, GroupInline, KindergartenTeacherInline]
+    # Отзывы только для просмотра: таблица из values() вместо формсета
+    change_form_template = 'admin/app/kindergarten/change_form.html'
+    reviews_per_page = 20
     
+    # Значения из аннотаций get_queryset, без запросов на каждую строку списка
     def average_rating_display(self, obj):
-        return f"{obj.average_rating:.1f}"
+        return f"{getattr(obj, 'rating_avg', None) or 0:.1f}"
     average_rating_display.short_description = 'Средний рейтинг'
     
     def groups_display(self, obj):
-        return obj.group_set.count()
+        return getattr(obj, 'groups_cnt', '-')
     groups_display.short_description = 'Количество групп'
     
     def teachers_display(self, obj):
-        return obj.kindergartenteacher_set.count()
+        return getattr(obj, 'teachers_cnt', '-')
     teachers_display.short_description = 'Количество воспитателей'
     
+    def review_page(self, obj, offset=0):
+        """(строки отзывов сада начиная с offset, есть ли следующие)."""
+        rows = list(
+            Review.objects.filter(kindergarten=obj).order_by('-created_at', '-pk')
+            .values('pk', 'parent_name', 'rating', 'comment', 'is_held', 'created_at')
+            [offset:offset + self.reviews_per_page + 1]
+        )
+        return rows[:self.reviews_per_page], len(rows) > self.reviews_per_page
+
+    def render_change_form(self, request, context, add=False, change=False, form_url='', obj=None):
+        review_admin = self.admin_site._registry.get(Review)
+        if obj is not None and obj.pk and review_admin is not None and review_admin.has_view_permission(request):
+            reviews, has_more = self.review_page(obj)
+            context.update(reviews=reviews, reviews_has_more=has_more, reviews_next=len(reviews))
+        return super().render_change_form(request, context, add, change, form_url, obj)
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                '<path:object_id>/reviews/',
+                self.admin_site.admin_view(self.reviews_view),
+                name='%s_%s_reviews' % info,
+            ),
+            *super().get_urls(),
+        ]
+
+    def reviews_view(self, request, object_id):
+        obj = self.get_object(request, object_id)
+        if obj is None:
+            raise Http404
+        if not (self.has_view_or_change_permission(request, obj)
+                and self.admin_site._registry[Review].has_view_permission(request)):
+            raise PermissionDenied
+        try:
+            offset = max(int(request.GET.get('offset', 0)), 0)
+        except ValueError:
+            offset = 0
+        reviews, has_more = self.review_page(obj, offset)
+        html = render_to_string('admin/app/kindergarten/review_rows.html', {'reviews': reviews}, request)
+        return JsonResponse({'html': html, 'has_more': has_more, 'next': offset + len(reviews)})
+
+    def get_deleted_objects(self, objs, request):
+        # Вместо обхода всех зависимых строк — их число по каждой модели
+        objs = list(objs)
+        counts = deletion.dependent_counts(Kindergarten, [obj.pk for obj in objs])
+        perms_needed = set()
+        for model in [Kindergarten, *counts]:
+            model_admin = self.admin_site._registry.get(model)
+            if model_admin is not None and not model_admin.has_delete_permission(request):
+                perms_needed.add(model._meta.verbose_name)
+        model_count = {Kindergarten._meta.verbose_name_plural: len(objs)}
+        model_count.update((model._meta.verbose_name_plural, count) for model, count in counts.items())
+        return [str(obj) for obj in objs], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Kindergarten.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        # delete_view выполняется в транзакции; пакетное удаление запускаем
+        # после ее фиксации, чтобы каждая пачка коммитилась отдельно
+        ids = list(queryset.values_list('pk', flat=True))
+        transaction.on_commit(lambda: deletion.delete_kindergartens(ids))
+
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         # Используем другие имена для аннотаций, чтобы не конфликтовать с свойствами
         qs = qs.annotate(
-            rating_avg=Avg('review__rating'),
-            groups_cnt=Count('group', distinct=True),
-            teachers_cnt=Count('kindergartenteacher', distinct=True)
+            rating_avg=stats.rating_annotations()[1],
+            groups_cnt=_related_count(Group, 'kindergarten'),
+            teachers_cnt=_related_count(KindergartenTeacher, 'kindergarten'),
         )
         return qs
 
 
 @admin.register(KindergartenImage)
-class KindergartenImageAdmin(admin.ModelAdmin):
+class KindergartenImageAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('kindergarten', 'image_preview', 'caption', 'order', 'created_at')
-    list_filter = ('kindergarten', 'created_at')
+    list_filter = (('kindergarten', AutocompleteFilter), ('created_at', DateBucketFilter))
+    list_select_related = ('kindergarten',)
     search_fields = ('kindergarten__name', 'caption')
     ordering = ('kindergarten', 'order')
     list_editable = ('order',)
@@ -125,38 +241,87 @@ class EnrollmentInline(admin.TabularInline):
 
 
 @admin.register(Group)
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('name', 'kindergarten', 'age_range', 'max_capacity', 'current_enrollment')
-    list_filter = ('kindergarten', 'age_range')
+    list_filter = (('kindergarten', AutocompleteFilter), 'age_range')
+    list_select_related = ('kindergarten',)
     search_fields = ('name', 'age_range', 'kindergarten__name')
     ordering = ('kindergarten', 'name')
     inlines = [EnrollmentInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(enrolled_cnt=_related_count(Enrollment, 'group'))
     
     def current_enrollment(self, obj):
-        return f"{obj.enrollment_set.count()}/{obj.max_capacity}"
+        return f"{obj.enrolled_cnt}/{obj.max_capacity}"
     current_enrollment.short_description = 'Заполненность'
 
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('child', 'group', 'enrollment_date', 'status')
-    list_filter = ('enrollment_date', 'status', 'group__kindergarten')
+    list_filter = (('enrollment_date', DateBucketFilter), 'status', ('group__kindergarten', AutocompleteFilter))
     search_fields = ('child__first_name', 'child__last_name', 'group__name')
     ordering = ('-enrollment_date',)
-    date_hierarchy = 'enrollment_date'
+    list_select_related = ('child', 'group__kindergarten')
     raw_id_fields = ('child', 'group')
     list_editable = ('status',)
+    actions = [
+        'allocate_waitlist_action', 'preview_waitlist_action',
+        admin_actions.change_enrollment_status, admin_actions.transfer_enrollments,
+        admin_actions.close_school_year, admin_actions.archive_enrollments,
+    ]
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not is_name_query(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        children = [pk for pk, _ in fuzzy.search('child', search_term, limit=200)]
+        return queryset.filter(Q(child_id__in=children) | Q(group__name__icontains=search_term.strip())), False
+    
+    @admin.action(description='Распределить выбранные заявки из очереди')
+    def allocate_waitlist_action(self, request, queryset):
+        report = allocate_waitlist(queryset)
+        self.message_user(request, report.summary(), messages.SUCCESS)
+    
+    @admin.action(description='Предварительный расчет распределения очереди')
+    def preview_waitlist_action(self, request, queryset):
+        report = allocate_waitlist(queryset, dry_run=True)
+        self.message_user(request, report.summary(), messages.INFO)
+
+
+class DuplicateReviewFilter(admin.SimpleListFilter):
+    """Отзывы из групп почти одинаковых текстов (см. команду cluster_reviews)."""
+    title = 'Похожие отзывы'
+    parameter_name = 'duplicates'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Есть похожие'), ('no', 'Уникальные')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.exclude(duplicate_cluster=None)
+        if self.value() == 'no':
+            return queryset.filter(duplicate_cluster=None)
+        return queryset
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
-    list_display = ('kindergarten', 'parent_name', 'rating', 'stars_display', 'comment_preview', 'created_at')
-    list_filter = ('rating', 'kindergarten', 'created_at')
+class ReviewAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ('kindergarten', 'parent_name', 'rating', 'stars_display', 'comment_preview',
+                    'is_held', 'duplicates_link', 'created_at')
+    list_filter = (
+        'is_held', DuplicateReviewFilter, 'rating',
+        ('kindergarten', AutocompleteFilter), ('created_at', DateBucketFilter),
+    )
     search_fields = ('parent_name', 'comment', 'kindergarten__name')
     ordering = ('-created_at', '-rating')
     raw_id_fields = ('kindergarten',)
-    readonly_fields = ('created_at', 'updated_at')
-    date_hierarchy = 'created_at'
+    readonly_fields = ('created_at', 'updated_at', 'duplicate_cluster')
+    list_select_related = ('kindergarten',)
+    actions = [
+        admin_actions.publish_reviews, admin_actions.hold_reviews,
+        admin_actions.delete_reviews, admin_actions.archive_reviews,
+    ]
     
     fieldsets = [
         ('Основная информация', {
@@ -165,6 +330,9 @@ class ReviewAdmin(admin.ModelAdmin):
         ('Отзыв', {
             'fields': ['rating', 'comment']
         }),
+        ('Модерация', {
+            'fields': ['is_held', 'duplicate_cluster']
+        }),
         ('Даты', {
             'fields': ['created_at', 'updated_at'],
             'classes': ['collapse']
@@ -181,14 +349,87 @@ class ReviewAdmin(admin.ModelAdmin):
         return '★' * obj.rating + '☆' * (5 - obj.rating)
     stars_display.short_description = 'Рейтинг'
 
+    def duplicates_link(self, obj):
+        if obj.duplicate_cluster is None:
+            return '-'
+        url = reverse('admin:app_review_changelist') + f'?duplicate_cluster__exact={obj.duplicate_cluster}'
+        return format_html('<a href="{}">группа #{}</a>', url, obj.duplicate_cluster)
+    duplicates_link.short_description = 'Похожие'
+    duplicates_link.admin_order_field = 'duplicate_cluster'
+
 
 @admin.register(KindergartenTeacher)
-class KindergartenTeacherAdmin(admin.ModelAdmin):
+class KindergartenTeacherAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('teacher', 'kindergarten', 'role', 'years_at_kindergarten')
-    list_filter = ('kindergarten', 'role')
+    list_filter = (('kindergarten', AutocompleteFilter), 'role')
     search_fields = ('teacher__first_name', 'teacher__last_name', 'kindergarten__name')
     ordering = ('kindergarten', 'teacher')
     raw_id_fields = ('teacher', 'kindergarten')
+    actions = [admin_actions.reassign_staff, admin_actions.change_staff_role]
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('teacher', 'kindergarten')
\ No newline at end of file
+        return super().get_queryset(request).select_related('teacher', 'kindergarten')
+
+
+class ArchiveAdmin(LargeTableMixin, admin.ModelAdmin):
+    """Архив только для чтения; вернуть строки можно действием восстановления."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedReview)
+class ArchivedReviewAdmin(ArchiveAdmin):
+    list_display = ('kindergarten', 'parent_name', 'rating', 'created_at', 'archived_at')
+    list_filter = ('rating', ('created_at', DateBucketFilter), 'archived_at')
+    search_fields = ('parent_name', 'comment', 'kindergarten__name')
+    list_select_related = ('kindergarten',)
+    actions = [admin_actions.restore_reviews]
+
+
+@admin.register(ArchivedEnrollment)
+class ArchivedEnrollmentAdmin(ArchiveAdmin):
+    list_display = ('child', 'group', 'enrollment_date', 'status', 'archived_at')
+    list_filter = ('status', ('enrollment_date', DateBucketFilter), 'archived_at')
+    search_fields = ('child__first_name', 'child__last_name', 'group__name')
+    list_select_related = ('child', 'group__kindergarten')
+    actions = [admin_actions.restore_enrollments]
+
+
+@admin.register(EnrollmentApplication)
+class EnrollmentApplicationAdmin(LargeTableMixin, admin.ModelAdmin):
+    """Заявки с сайта только для просмотра: Child и Enrollment из них создает intake_worker."""
+    list_display = ('receipt_display', 'child_last_name', 'child_first_name', 'birth_date', 'kindergarten_display',
+                    'phone', 'status', 'submitted_at', 'enrollment_link')
+    list_filter = ('status', ('submitted_at', DateBucketFilter))
+    search_fields = ('=id', 'child_last_name', 'parent_name', 'phone')
+    ordering = ('-id',)
+    exclude = ('key', 'identity')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def receipt_display(self, obj):
+        return obj.receipt
+    receipt_display.short_description = 'Номер заявки'
+
+    def kindergarten_display(self, obj):
+        kindergarten = objcache.kindergartens.get(obj.kindergarten_id)
+        return kindergarten.name if kindergarten else f'#{obj.kindergarten_id}'
+    kindergarten_display.short_description = 'Детский сад'
+
+    def enrollment_link(self, obj):
+        if obj.enrollment_id is None:
+            return '-'
+        url = reverse('admin:app_enrollment_change', args=[obj.enrollment_id])
+        return format_html('<a href="{}">#{}</a>', url, obj.enrollment_id)
+    enrollment_link.short_description = 'Запись в группу'
@@ -0,0 +1,403 @@
+# app/admin_actions.py
+# Массовые действия админки, которые выполняются одним UPDATE/DELETE по
+# выбранному (или отфильтрованному) queryset вместо сохранения каждой строки.
+# Каждое действие сначала показывает страницу подтверждения с числом затронутых
+# записей; проверки вместимости и уникальности выполняются агрегирующими запросами.
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.template.response import TemplateResponse
+
+from . import archive, changefeed, duplicates, leaderboard, prerender
+from .models import Enrollment, Group, Kindergarten, KindergartenTeacher, Review
+from .signals import refresh_derived
+
+ACTIVE = 'активна'
+FINISHED = 'завершена'
+WAITING = 'ожидание'
+REJECTED = 'отклонена'
+
+
+def confirm_bulk_action(modeladmin, request, queryset, *, action, title, apply,
+                        form_class=None, description=''):
+    """Страница подтверждения массового действия.
+
+    apply(queryset, cleaned_data) выполняет изменение и возвращает число строк;
+    ValidationError из apply показывается на странице как ошибка формы.
+    """
+    confirmed = 'apply' in request.POST
+    form = None
+    if form_class is not None:
+        form = form_class(request.POST if confirmed else None, admin_site=modeladmin.admin_site)
+
+    if confirmed and (form is None or form.is_valid()):
+        cleaned_data = form.cleaned_data if form is not None else {}
+        try:
+            with transaction.atomic():
+                count = apply(queryset, cleaned_data)
+        except ValidationError as e:
+            if form is None:
+                modeladmin.message_user(request, ' '.join(e.messages), messages.ERROR)
+                return None
+            form.add_error(None, e)
+        else:
+            modeladmin.message_user(request, f'{title}: обработано записей — {count}.', messages.SUCCESS)
+            return None
+
+    opts = modeladmin.model._meta
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        'title': title,
+        'description': description,
+        'opts': opts,
+        'form': form,
+        'media': modeladmin.media + (form.media if form is not None else forms.Media()),
+        'action': action,
+        'preview_count': queryset.count(),
+        'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across', '0'),
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    }
+    request.current_app = modeladmin.admin_site.name
+    return TemplateResponse(request, 'admin/app/bulk_action_confirm.html', context)
+
+
+class BulkActionForm(forms.Form):
+    def __init__(self, *args, admin_site=None, **kwargs):
+        self.admin_site = admin_site
+        super().__init__(*args, **kwargs)
+
+
+def _kindergarten_ids(queryset, lookup):
+    # Сады затронутых записей запоминаем до UPDATE: после него фильтры
+    # changelist могут уже не выбирать эти строки
+    return set(queryset.order_by().values_list(lookup, flat=True).distinct())
+
+
+def _use_autocomplete(field, model, field_name, admin_site):
+    field.widget = AutocompleteSelect(model._meta.get_field(field_name), admin_site)
+    # виджету нужны choices поля, иначе он не покажет выбранное значение
+    field.widget.choices = field.choices
+
+
+# --- Записи в группы ---
+
+class EnrollmentStatusForm(BulkActionForm):
+    status = forms.ChoiceField(label='Новый статус', choices=Enrollment.STATUS_CHOICES)
+
+
+class EnrollmentTransferForm(BulkActionForm):
+    group = forms.ModelChoiceField(label='Группа', queryset=Group.objects.select_related('kindergarten'))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _use_autocomplete(self.fields['group'], Enrollment, 'group', self.admin_site)
+
+
+class CloseYearForm(BulkActionForm):
+    reject_waiting = forms.BooleanField(
+        label='Отклонить заявки, оставшиеся в ожидании', required=False
+    )
+
+
+def check_activation_capacity(queryset):
+    """После перевода записей queryset в статус "активна" ни одна группа
+    не должна превысить max_capacity. Один агрегирующий запрос."""
+    overfull = list(
+        Group.objects.filter(pk__in=queryset.values('group'))
+        .annotate(after=Count(
+            'enrollment',
+            filter=Q(enrollment__status=ACTIVE) | Q(enrollment__in=queryset.values('pk')),
+        ))
+        .filter(after__gt=F('max_capacity'))
+        .values_list('name', 'after', 'max_capacity')[:5]
+    )
+    if overfull:
+        raise ValidationError(
+            'Превышена вместимость групп: '
+            + ', '.join(f'{name} ({after}/{capacity})' for name, after, capacity in overfull)
+        )
+
+
+def check_transfer(queryset, group):
+    selected = queryset.values('pk')
+    row = Enrollment.objects.aggregate(
+        # активные записи в группе после переноса
+        active_after=Count('pk', filter=(
+            Q(group=group, status=ACTIVE) & ~Q(pk__in=selected)
+        ) | Q(pk__in=selected, status=ACTIVE)),
+        # дети, которые уже записаны в целевую группу другой записью
+        conflicts=Count('pk', filter=Q(group=group, child__in=queryset.values('child')) & ~Q(pk__in=selected)),
+        # один ребенок выбран дважды — после переноса нарушится уникальность
+        selected_children=Count('child', filter=Q(pk__in=selected), distinct=True),
+        selected_total=Count('pk', filter=Q(pk__in=selected)),
+    )
+    errors = []
+    if row['active_after'] > group.max_capacity:
+        errors.append(f'в группе "{group.name}" будет {row["active_after"]} активных записей при вместимости {group.max_capacity}')
+    if row['conflicts']:
+        errors.append(f'{row["conflicts"]} детей уже записаны в эту группу')
+    if row['selected_children'] < row['selected_total']:
+        errors.append('среди выбранных есть несколько записей одного ребенка')
+    if errors:
+        raise ValidationError('Перенос невозможен: ' + '; '.join(errors))
+
+
+def apply_enrollment_status(queryset, data):
+    status = data['status']
+    if status == ACTIVE:
+        check_activation_capacity(queryset)
+    kindergarten_ids = _kindergarten_ids(queryset, 'group__kindergarten_id')
+    count = changefeed.update(queryset.exclude(status=status), status=status)
+    prerender.enqueue_kindergartens(kindergarten_ids, include_list=False)
+    return count
+
+
+def apply_enrollment_transfer(queryset, data):
+    group = data['group']
+    check_transfer(queryset, group)
+    kindergarten_ids = _kindergarten_ids(queryset, 'group__kindergarten_id') | {group.kindergarten_id}
+    count = changefeed.update(queryset.exclude(group=group), group=group)
+    prerender.enqueue_kindergartens(kindergarten_ids, include_list=False)
+    return count
+
+
+def apply_close_year(queryset, data):
+    kindergarten_ids = _kindergarten_ids(queryset, 'group__kindergarten_id')
+    count = changefeed.update(queryset.filter(status=ACTIVE), status=FINISHED)
+    if data.get('reject_waiting'):
+        count += changefeed.update(queryset.filter(status=WAITING), status=REJECTED)
+    prerender.enqueue_kindergartens(kindergarten_ids, include_list=False)
+    return count
+
+
+@admin.action(description='Изменить статус выбранных записей')
+def change_enrollment_status(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='change_enrollment_status',
+        title='Изменение статуса записей', form_class=EnrollmentStatusForm,
+        apply=apply_enrollment_status,
+        description='При активации проверяется вместимость групп.',
+    )
+
+
+@admin.action(description='Перевести выбранные записи в другую группу')
+def transfer_enrollments(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='transfer_enrollments',
+        title='Перевод в другую группу', form_class=EnrollmentTransferForm,
+        apply=apply_enrollment_transfer,
+        description='Статус записей сохраняется; активные записи учитываются во вместимости новой группы.',
+    )
+
+
+@admin.action(description='Закрыть учебный год для выбранных записей')
+def close_school_year(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='close_school_year',
+        title='Закрытие учебного года', form_class=CloseYearForm,
+        apply=apply_close_year,
+        description='Активные записи получат статус "Завершена".',
+    )
+
+
+@admin.action(description='Перенести выбранные записи в архив')
+def archive_enrollments(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset.filter(status__in=archive.ARCHIVED_ENROLLMENT_STATUSES),
+        action='archive_enrollments', title='Перенос записей в архив',
+        apply=lambda queryset, data: archive.archive_enrollments(queryset),
+        description='Переносятся только завершенные и отклоненные записи.',
+    )
+
+
+# --- Отзывы ---
+
+def apply_delete_reviews(queryset, data):
+    # Прямой DELETE без загрузки объектов в Python; у отзывов нет зависимых
+    # таблиц, а кэши статистики сбрасываем сами, т.к. сигналы не отправляются.
+    kindergarten_ids = _kindergarten_ids(queryset, 'kindergarten_id')
+    duplicates.remove_reviews(queryset.values('pk'))
+    count = changefeed.raw_delete(queryset)
+    refresh_derived(Review)
+    leaderboard.update_kindergartens(kindergarten_ids)
+    prerender.enqueue_kindergartens(kindergarten_ids)
+    return count
+
+
+@admin.action(description='Удалить выбранные отзывы (одним запросом)')
+def delete_reviews(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='delete_reviews',
+        title='Удаление отзывов', apply=apply_delete_reviews,
+        description='Отзывы будут удалены безвозвратно.',
+    )
+
+
+@admin.action(description='Перенести выбранные отзывы в архив')
+def archive_reviews(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='archive_reviews',
+        title='Перенос отзывов в архив',
+        apply=lambda queryset, data: archive.archive_reviews(queryset.filter(is_held=False)),
+        description='Отзывы исчезнут со страниц садов, но останутся в рейтинге и статистике. '
+                    'Отзывы на модерации не переносятся.',
+    )
+
+
+def _set_held(value):
+    def apply(queryset, data):
+        queryset = queryset.exclude(is_held=value)
+        kindergarten_ids = _kindergarten_ids(queryset, 'kindergarten_id')
+        count = changefeed.update(queryset, is_held=value)
+        refresh_derived(Review)
+        leaderboard.update_kindergartens(kindergarten_ids)
+        prerender.enqueue_kindergartens(kindergarten_ids)
+        return count
+    return apply
+
+
+@admin.action(description='Опубликовать выбранные отзывы')
+def publish_reviews(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='publish_reviews',
+        title='Публикация отзывов', apply=_set_held(False),
+        description='Отзывы появятся на страницах садов и войдут в рейтинг.',
+    )
+
+
+@admin.action(description='Снять выбранные отзывы с публикации')
+def hold_reviews(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='hold_reviews',
+        title='Отзывы на модерацию', apply=_set_held(True),
+        description='Отзывы пропадут со страниц садов и из рейтинга до публикации.',
+    )
+
+
+# --- Архив ---
+
+@admin.action(description='Вернуть выбранные отзывы из архива')
+def restore_reviews(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='restore_reviews',
+        title='Восстановление отзывов',
+        apply=lambda queryset, data: archive.restore_reviews(queryset),
+    )
+
+
+@admin.action(description='Вернуть выбранные записи из архива')
+def restore_enrollments(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='restore_enrollments',
+        title='Восстановление записей',
+        apply=lambda queryset, data: archive.restore_enrollments(queryset)[0],
+        description='Записи детей, которые уже заново записаны в ту же группу, останутся в архиве.',
+    )
+
+
+# --- Работа воспитателей в садах ---
+
+class StaffReassignForm(BulkActionForm):
+    kindergarten = forms.ModelChoiceField(label='Детский сад', queryset=Kindergarten.objects.all())
+    role = forms.ChoiceField(
+        label='Должность', required=False,
+        choices=[('', 'Оставить прежнюю')] + KindergartenTeacher.ROLE_CHOICES,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _use_autocomplete(self.fields['kindergarten'], KindergartenTeacher, 'kindergarten', self.admin_site)
+
+
+class StaffRoleForm(BulkActionForm):
+    role = forms.ChoiceField(label='Должность', choices=KindergartenTeacher.ROLE_CHOICES)
+
+
+def check_reassign(queryset, kindergarten):
+    selected = queryset.values('pk')
+    row = KindergartenTeacher.objects.aggregate(
+        conflicts=Count('pk', filter=Q(kindergarten=kindergarten, teacher__in=queryset.values('teacher')) & ~Q(pk__in=selected)),
+        selected_teachers=Count('teacher', filter=Q(pk__in=selected), distinct=True),
+        selected_total=Count('pk', filter=Q(pk__in=selected)),
+    )
+    errors = []
+    if row['conflicts']:
+        errors.append(f'{row["conflicts"]} воспитателей уже работают в "{kindergarten.name}"')
+    if row['selected_teachers'] < row['selected_total']:
+        errors.append('среди выбранных есть несколько мест работы одного воспитателя')
+    if errors:
+        raise ValidationError('Перевод невозможен: ' + '; '.join(errors))
+
+
+def apply_staff_reassign(queryset, data):
+    kindergarten = data['kindergarten']
+    check_reassign(queryset, kindergarten)
+    changes = {'kindergarten': kindergarten, 'years_at_kindergarten': 0}
+    if data.get('role'):
+        changes['role'] = data['role']
+    kindergarten_ids = _kindergarten_ids(queryset, 'kindergarten_id') | {kindergarten.pk}
+    count = changefeed.update(queryset.exclude(kindergarten=kindergarten), **changes)
+    refresh_derived(KindergartenTeacher)
+    prerender.enqueue_kindergartens(kindergarten_ids, include_similar=False)
+    return count
+
+
+def apply_staff_role(queryset, data):
+    kindergarten_ids = _kindergarten_ids(queryset, 'kindergarten_id')
+    count = changefeed.update(queryset.exclude(role=data['role']), role=data['role'])
+    refresh_derived(KindergartenTeacher)
+    prerender.enqueue_kindergartens(kindergarten_ids, include_list=False, include_similar=False)
+    return count
+
+
+@admin.action(description='Перевести выбранных воспитателей в другой сад')
+def reassign_staff(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='reassign_staff',
+        title='Перевод воспитателей', form_class=StaffReassignForm,
+        apply=apply_staff_reassign,
+        description='Стаж в саду у переведенных воспитателей обнуляется.',
+    )
+
+
+@admin.action(description='Изменить должность выбранных воспитателей')
+def change_staff_role(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='change_staff_role',
+        title='Изменение должности', form_class=StaffRoleForm, apply=apply_staff_role,
+    )
+
+
+# --- Детские сады ---
+
+def _set_recommended(value):
+    def apply(queryset, data):
+        kindergarten_ids = _kindergarten_ids(queryset, 'pk')
+        count = changefeed.update(queryset.exclude(is_recommended=value), is_recommended=value)
+        refresh_derived(Kindergarten)
+        leaderboard.update_kindergartens(kindergarten_ids)
+        # Отметки "рекомендуемый" в блоке "Похожие сады" нет
+        prerender.enqueue_kindergartens(kindergarten_ids, include_similar=False)
+        return count
+    return apply
+
+
+@admin.action(description='Отметить выбранные сады как рекомендуемые')
+def mark_recommended(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='mark_recommended',
+        title='Отметка "Рекомендуемый"', apply=_set_recommended(True),
+    )
+
+
+@admin.action(description='Снять отметку "Рекомендуемый"')
+def unmark_recommended(modeladmin, request, queryset):
+    return confirm_bulk_action(
+        modeladmin, request, queryset, action='unmark_recommended',
+        title='Снятие отметки "Рекомендуемый"', apply=_set_recommended(False),
+    )
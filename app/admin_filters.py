@@ -0,0 +1,151 @@
+# app/admin_filters.py
+# Фильтры списков админки для больших таблиц. Стандартный фильтр по внешнему
+# ключу выводит ссылкой каждый сад, а date_hierarchy на каждом открытии списка
+# делает DISTINCT по датам всей таблицы. Здесь сад выбирается автодополнением
+# (варианты подгружаются по мере ввода), а разбивка по годам и месяцам
+# берется из кэшированных счетчиков.
+import datetime
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncMonth, TruncYear
+
+from .caching import namespaced_key
+from .pagination import EstimatedCountPaginator
+
+BUCKETS_NAMESPACE = 'admin-date-buckets'
+# Счетчики по датам могут отставать от таблицы не больше чем на это время
+BUCKETS_TIMEOUT = 10 * 60
+
+MONTHS = [
+    'январь', 'февраль', 'март', 'апрель', 'май', 'июнь',
+    'июль', 'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь',
+]
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """Фильтр по внешнему ключу с выбором через автодополнение админки.
+
+    Связанные объекты не загружаются: на странице только выбранный, остальные
+    ищет autocomplete_view по search_fields админки связанной модели.
+    """
+    template = 'admin/app/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None and not self.lookup_val_isnull,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg, self.lookup_kwarg_isnull]),
+            'display': 'Все',
+        }
+
+    def select(self):
+        widget = AutocompleteSelect(self.field, self.admin_site, attrs={
+            'class': 'autocomplete-filter',
+            'data-param': self.lookup_kwarg,
+            'style': 'width: 100%',
+        })
+        field = forms.ModelChoiceField(
+            self.field.remote_field.model._default_manager.all(), required=False, widget=widget,
+        )
+        value = self.lookup_val[-1] if self.lookup_val else None
+        return field.widget.render(f'filter-{self.lookup_kwarg}', value)
+
+
+def date_buckets(model, field_name, year=None):
+    """[(начало, число записей)] по годам, а с year — по месяцам этого года.
+
+    Один GROUP BY по таблице, результат кэшируется на BUCKETS_TIMEOUT.
+    """
+    key = namespaced_key(BUCKETS_NAMESPACE, model._meta.label, field_name, year)
+    buckets = cache.get(key)
+    if buckets is None:
+        rows = model._default_manager.order_by()
+        if year is not None:
+            rows = rows.filter(**{f'{field_name}__year': year})
+        trunc = TruncYear if year is None else TruncMonth
+        rows = rows.annotate(bucket=trunc(field_name)).values('bucket').annotate(n=Count('pk')).order_by('bucket')
+        buckets = [(row['bucket'], row['n']) for row in rows if row['bucket'] is not None]
+        cache.set(key, buckets, BUCKETS_TIMEOUT)
+    return buckets
+
+
+def _next_month(start):
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+class DateBucketFilter(admin.DateFieldListFilter):
+    """Фильтр по дате с разбивкой по годам и месяцам выбранного года.
+
+    Замена date_hierarchy: число записей в каждом периоде берется из
+    date_buckets, а сам отбор — диапазон __gte/__lt по индексу поля.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.model = model
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def _selected_year(self):
+        since = self.date_params.get(self.lookup_kwarg_since)
+        until = self.date_params.get(self.lookup_kwarg_until)
+        try:
+            since, until = datetime.date.fromisoformat(since[:10]), datetime.date.fromisoformat(until[:10])
+        except (TypeError, ValueError):
+            return None
+        # Месяцы показываются, когда выбран год или месяц внутри одного года
+        if since.day == 1 and (until.year == since.year or until == datetime.date(since.year + 1, 1, 1)):
+            return since.year
+        return None
+
+    def _bucket_choice(self, changelist, start, end, display):
+        params = {self.lookup_kwarg_since: str(start), self.lookup_kwarg_until: str(end)}
+        return {
+            'selected': self.date_params == params,
+            'query_string': changelist.get_query_string(params, [self.field_generic]),
+            'display': display,
+        }
+
+    def choices(self, changelist):
+        yield from super().choices(changelist)
+        year = self._selected_year()
+        # Начала периодов от TruncYear/TruncMonth: даты у DateField и моменты
+        # в текущем часовом поясе у DateTimeField, как у ссылок выше
+        for start, count in date_buckets(self.model, self.field_path):
+            yield self._bucket_choice(
+                changelist, start, start.replace(year=start.year + 1), f'{start.year} ({count})',
+            )
+            if start.year == year:
+                for month_start, month_count in date_buckets(self.model, self.field_path, year):
+                    yield self._bucket_choice(
+                        changelist, month_start, _next_month(month_start),
+                        f'— {MONTHS[month_start.month - 1]} ({month_count})',
+                    )
+
+
+class LargeTableMixin:
+    """Список админки без полных COUNT(*) и со скриптами фильтров-автодополнений."""
+    paginator = EstimatedCountPaginator
+    # Второй COUNT по всей таблице для надписи "N из M" не нужен
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        return (
+            super().media
+            + AutocompleteSelect(None, self.admin_site).media
+            + forms.Media(js=['admin/js/jquery.init.js', 'app/admin/autocomplete_filter.js'])
+        )
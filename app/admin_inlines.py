@@ -0,0 +1,118 @@
+# app/admin_inlines.py
+# Постраничные инлайны формы изменения. У популярного сада сотни групп,
+# сотрудников и фотографий: стандартный инлайн строит форму на каждую строку,
+# а POST заново проверяет их все. Здесь форма открывается с первой страницей
+# строк, следующие подгружаются кнопкой "Показать еще", а при сохранении
+# скрипт отправляет только измененные строки — формсет на POST выбирает из
+# базы лишь их.
+from django import forms
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.forms.models import BaseInlineFormSet
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import path
+
+PER_PAGE = 20
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Формсет инлайна с одной страницей строк; на POST — только присланные строки."""
+    per_page = PER_PAGE
+
+    def __init__(self, *args, page_offset=0, **kwargs):
+        self.page_offset = page_offset
+        self._has_more = False
+        super().__init__(*args, **kwargs)
+
+    def _submitted_pks(self):
+        pk_field = self.model._meta.pk
+        pks = []
+        for i in range(self.initial_form_count()):
+            value = self.data.get(self.add_prefix(f'{i}-{pk_field.name}'))
+            try:
+                pks.append(pk_field.to_python(value))
+            except ValidationError:
+                # Испорченный id: форма получит ошибку при проверке поля
+                continue
+        return [pk for pk in pks if pk is not None]
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()
+            if self.is_bound:
+                queryset = queryset.filter(pk__in=self._submitted_pks())
+            else:
+                # Одна лишняя строка показывает, есть ли следующая страница
+                page = list(queryset[self.page_offset:self.page_offset + self.per_page + 1])
+                self._has_more = len(page) > self.per_page
+                queryset = page[:self.per_page]
+            self._queryset = queryset
+        return self._queryset
+
+    @property
+    def has_more(self):
+        self.get_queryset()
+        return self._has_more
+
+    @property
+    def next_offset(self):
+        return self.page_offset + len(self.get_queryset())
+
+
+class PaginatedInlineMixin:
+    """Табличный инлайн, строки которого загружаются по per_page."""
+    formset = PaginatedInlineFormSet
+    template = 'admin/app/edit_inline/paginated_tabular.html'
+    per_page = PER_PAGE
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        return formset
+
+
+class PaginatedInlinesAdminMixin:
+    """Адрес подгрузки страниц для инлайнов PaginatedInlineMixin модели.
+
+    <id>/inline/<префикс формсета>/?offset=N отдает строки следующей страницы
+    в разметке самого инлайна; скрипт переносит их в форму и перенумеровывает.
+    """
+
+    @property
+    def media(self):
+        return super().media + forms.Media(js=['admin/js/jquery.init.js', 'app/admin/paginated_inlines.js'])
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                '<path:object_id>/inline/<str:prefix>/',
+                self.admin_site.admin_view(self.inline_page_view),
+                name='%s_%s_inline_page' % info,
+            ),
+            *super().get_urls(),
+        ]
+
+    def inline_page_view(self, request, object_id, prefix):
+        obj = self.get_object(request, object_id)
+        if obj is None:
+            raise Http404
+        if not self.has_view_or_change_permission(request, obj):
+            raise PermissionDenied
+        try:
+            offset = max(int(request.GET.get('offset', 0)), 0)
+        except ValueError:
+            offset = 0
+        for FormSet, inline in self.get_formsets_with_inlines(request, obj):
+            if isinstance(inline, PaginatedInlineMixin) and FormSet.get_default_prefix() == prefix:
+                break
+        else:
+            raise Http404
+        # Без пустых форм: скрипт берет из ответа только существующие строки
+        FormSet = inline.get_formset(request, obj, extra=0)
+        formset = FormSet(
+            instance=obj, prefix=prefix, queryset=inline.get_queryset(request), page_offset=offset,
+        )
+        inline_admin_formset = self.get_inline_formsets(request, [formset], [inline], obj)[0]
+        html = render_to_string(inline.template, {'inline_admin_formset': inline_admin_formset}, request)
+        return JsonResponse({'html': html, 'has_more': formset.has_more, 'next': formset.next_offset})
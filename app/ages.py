@@ -0,0 +1,47 @@
+# app/ages.py
+# Возраст детей в месяцах и разбор текстовых возрастных диапазонов групп.
+import re
+
+_NUMBER = r'(\d+(?:[.,]\d+)?)'
+_UNIT = r'\s*(мес\w*|г\w*|л\w*)?'
+_RANGE = re.compile(_NUMBER + _UNIT + r'\s*(?:-|–|—|до)\s*' + _NUMBER + _UNIT)
+_SINGLE = re.compile(_NUMBER + _UNIT)
+
+
+def age_in_months(birth_date, on_date):
+    months = (on_date.year - birth_date.year) * 12 + on_date.month - birth_date.month
+    if on_date.day < birth_date.day:
+        months -= 1
+    return months
+
+
+def _to_months(number, unit):
+    value = float(number.replace(',', '.'))
+    if unit and unit.startswith('мес'):
+        return round(value)
+    return round(value * 12)
+
+
+def parse_age_range(text):
+    """Разбирает "3-4 года", "от 1,5 до 3 лет", "6 мес - 1 год" в (min, max) месяцев.
+
+    Диапазон полуоткрытый: подходит ребёнок с min <= возраст < max, т.е.
+    "3-4 года" — от 36 до 48 месяцев. Одно число ("5 лет") — весь этот год.
+    Возвращает None, если текст не удалось разобрать.
+    """
+    text = (text or '').lower()
+    match = _RANGE.search(text)
+    if match:
+        low_number, low_unit, high_number, high_unit = match.groups()
+        # "1,5-3 года": единица измерения указана только у верхней границы
+        low = _to_months(low_number, low_unit or high_unit)
+        high = _to_months(high_number, high_unit)
+    else:
+        match = _SINGLE.search(text)
+        if not match:
+            return None
+        low = _to_months(*match.groups())
+        high = low + (1 if (match.group(2) or '').startswith('мес') else 12)
+    if high <= low:
+        return None
+    return low, high
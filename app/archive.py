@@ -0,0 +1,205 @@
+# app/archive.py
+# Перенос "холодных" строк в архивные таблицы: отзывы старше заданного срока
+# и завершенные/отклоненные записи в группы. Строки переносятся пачками, каждая
+# пачка — в своей транзакции: копия в архив, итоги по отзывам, DELETE из рабочей
+# таблицы. Восстановление выполняет обратный перенос с теми же id.
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import changefeed, duplicates, prerender
+from .models import (
+    ArchivedEnrollment, ArchivedReview, Enrollment, Group, Review, ReviewArchiveTotals,
+)
+from .signals import refresh_derived
+from .stats import RATINGS
+
+ARCHIVED_ENROLLMENT_STATUSES = ('завершена', 'отклонена')
+
+REVIEW_FIELDS = (
+    'id', 'kindergarten_id', 'parent_name', 'parent_email', 'parent_phone',
+    'rating', 'comment', 'duplicate_cluster', 'created_at', 'updated_at',
+)
+ENROLLMENT_FIELDS = ('id', 'child_id', 'group_id', 'enrollment_date', 'status')
+
+
+def _batches(queryset, batch_size):
+    # Пачки по возрастанию id; тело цикла у вызывающего выполняется в той же транзакции
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+            yield ids
+        last_pk = ids[-1]
+
+
+def _change_totals(rows, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) оценки rows из ReviewArchiveTotals."""
+    per_kindergarten = defaultdict(Counter)
+    for kindergarten_id, rating in rows:
+        totals = per_kindergarten[kindergarten_id]
+        totals['count'] += 1
+        totals['rating_sum'] += rating
+        totals[f'rating_{rating}'] += 1
+
+    ReviewArchiveTotals.objects.bulk_create(
+        [ReviewArchiveTotals(kindergarten_id=pk) for pk in per_kindergarten],
+        ignore_conflicts=True,
+    )
+    for kindergarten_id, totals in per_kindergarten.items():
+        ReviewArchiveTotals.objects.filter(kindergarten_id=kindergarten_id).update(**{
+            field: F(field) + sign * value for field, value in totals.items()
+        })
+
+
+def cold_reviews(older_than):
+    # Задержанные отзывы ждут модератора и в архивные итоги не попадают
+    return Review.objects.filter(created_at__lt=older_than, is_held=False)
+
+
+def cold_enrollments(older_than=None, statuses=ARCHIVED_ENROLLMENT_STATUSES):
+    """Закрытые записи (по умолчанию завершенные и отклоненные), поданные раньше older_than."""
+    enrollments = Enrollment.objects.filter(status__in=statuses)
+    if older_than is not None:
+        enrollments = enrollments.filter(enrollment_date__lt=older_than)
+    return enrollments
+
+
+def archive_reviews(queryset, batch_size=1000):
+    """Переносит отзывы queryset в архив; возвращает их число."""
+    moved = 0
+    kindergarten_ids = set()
+    for ids in _batches(queryset, batch_size):
+        rows = list(Review.objects.filter(pk__in=ids).values_list(*REVIEW_FIELDS))
+        now = timezone.now()
+        ArchivedReview.objects.bulk_create(
+            [ArchivedReview(**dict(zip(REVIEW_FIELDS, row)), archived_at=now) for row in rows]
+        )
+        _change_totals([(row[1], row[5]) for row in rows], 1)
+        # Прямой DELETE: зависимых таблиц нет, сигналы заменяет refresh_derived ниже
+        batch = Review.objects.filter(pk__in=ids)
+        batch._raw_delete(batch.db)
+        duplicates.remove_reviews(ids)
+        changefeed.record(Review, [row[0] for row in rows], changefeed.DELETE)
+        moved += len(rows)
+        kindergarten_ids.update(row[1] for row in rows)
+
+    if moved:
+        refresh_derived(Review)
+        prerender.enqueue_kindergartens(kindergarten_ids)
+    return moved
+
+
+def _recreate(model, fields, rows, auto_fields):
+    objects = [model(**dict(zip(fields, row))) for row in rows]
+    model.objects.bulk_create(objects)
+    # bulk_create заново проставляет auto_now(_add) — возвращаем исходные даты
+    for obj, row in zip(objects, rows):
+        for field in auto_fields:
+            setattr(obj, field, row[fields.index(field)])
+    model.objects.bulk_update(objects, auto_fields)
+
+
+def restore_reviews(queryset, batch_size=1000):
+    """Возвращает архивные отзывы из queryset в рабочую таблицу."""
+    restored = 0
+    kindergarten_ids = set()
+    for ids in _batches(queryset, batch_size):
+        rows = list(ArchivedReview.objects.filter(pk__in=ids).values_list(*REVIEW_FIELDS))
+        _recreate(Review, REVIEW_FIELDS, rows, ['created_at', 'updated_at'])
+        duplicates.index_reviews((row[0], row[6]) for row in rows)
+        changefeed.record(Review, [row[0] for row in rows], changefeed.CREATE)
+        _change_totals([(row[1], row[5]) for row in rows], -1)
+        ArchivedReview.objects.filter(pk__in=ids).delete()
+        restored += len(rows)
+        kindergarten_ids.update(row[1] for row in rows)
+
+    if restored:
+        refresh_derived(Review)
+        prerender.enqueue_kindergartens(kindergarten_ids)
+    return restored
+
+
+def archive_enrollments(queryset, batch_size=1000):
+    """Переносит записи queryset в архив; возвращает их число."""
+    moved = 0
+    group_ids = set()
+    for ids in _batches(queryset, batch_size):
+        rows = list(Enrollment.objects.filter(pk__in=ids).values_list(*ENROLLMENT_FIELDS))
+        now = timezone.now()
+        ArchivedEnrollment.objects.bulk_create(
+            [ArchivedEnrollment(**dict(zip(ENROLLMENT_FIELDS, row)), archived_at=now) for row in rows]
+        )
+        batch = Enrollment.objects.filter(pk__in=ids)
+        batch._raw_delete(batch.db)
+        changefeed.record(Enrollment, [row[0] for row in rows], changefeed.DELETE)
+        moved += len(rows)
+        group_ids.update(row[2] for row in rows)
+
+    if moved:
+        _enqueue_groups(group_ids)
+    return moved
+
+
+def restore_enrollments(queryset, batch_size=1000):
+    """Возвращает архивные записи в рабочую таблицу.
+
+    Возвращает (восстановлено, пропущено): запись пропускается и остается
+    в архиве, если ребенок уже заново записан в ту же группу или в queryset
+    есть более новая (с большим id) архивная запись ребенка в эту группу.
+    """
+    restored = skipped = 0
+    group_ids = set()
+    for ids in _batches(queryset, batch_size):
+        rows = list(ArchivedEnrollment.objects.filter(pk__in=ids).order_by('pk').values_list(*ENROLLMENT_FIELDS))
+        child_ids = {row[1] for row in rows}
+        group_ids_in_batch = {row[2] for row in rows}
+        taken = set(
+            Enrollment.objects.filter(
+                child_id__in=child_ids, group_id__in=group_ids_in_batch,
+            ).values_list('child_id', 'group_id')
+        )
+        # Более новые записи тех же пар из следующих пачек восстановятся там
+        taken.update(
+            queryset.filter(
+                pk__gt=ids[-1], child_id__in=child_ids, group_id__in=group_ids_in_batch,
+            ).values_list('child_id', 'group_id')
+        )
+        # В пачке от каждой пары (child, group) остается самая новая запись
+        newest = {(row[1], row[2]): row for row in rows}
+        rows_to_restore = [row for pair, row in newest.items() if pair not in taken]
+        _recreate(Enrollment, ENROLLMENT_FIELDS, rows_to_restore, ['enrollment_date'])
+        changefeed.record(Enrollment, [row[0] for row in rows_to_restore], changefeed.CREATE)
+        ArchivedEnrollment.objects.filter(pk__in=[row[0] for row in rows_to_restore]).delete()
+        restored += len(rows_to_restore)
+        skipped += len(rows) - len(rows_to_restore)
+        group_ids.update(row[2] for row in rows_to_restore)
+
+    if restored:
+        _enqueue_groups(group_ids)
+    return restored, skipped
+
+
+def _enqueue_groups(group_ids):
+    prerender.enqueue_kindergartens(
+        Group.objects.filter(pk__in=group_ids).values('kindergarten_id'), include_list=False
+    )
+
+
+def rebuild_review_totals():
+    """Пересчитывает ReviewArchiveTotals по архивной таблице."""
+    with transaction.atomic():
+        ReviewArchiveTotals.objects.all().delete()
+        rows = ArchivedReview.objects.order_by().values('kindergarten_id').annotate(
+            count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS},
+        )
+        ReviewArchiveTotals.objects.bulk_create(ReviewArchiveTotals(**row) for row in rows)
+    refresh_derived(Review)
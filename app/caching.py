@@ -0,0 +1,40 @@
+# app/caching.py
+# Версионированные пространства имён в общем кэше: чтобы сбросить все
+# закэшированные значения пространства, достаточно увеличить его версию.
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(namespace):
+    return f'ns:{namespace}:version'
+
+
+def _fresh_version():
+    # Версия вытесненного из кэша ключа не должна совпасть ни с одной прежней:
+    # иначе снова станут читаться значения, записанные до сброса
+    return time.time_ns()
+
+
+def namespace_version(namespace):
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_namespace(*namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), _fresh_version(), None)
+
+
+def namespaced_key(namespace, *parts):
+    raw = '|'.join(str(part) for part in parts)
+    digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return f'ns:{namespace}:v{namespace_version(namespace)}:{digest}'
@@ -0,0 +1,134 @@
+# app/changefeed.py
+# Журнал изменений каталога для внешних потребителей (хранилище отчетов,
+# синхронизация с городским порталом, сброс кэшей): создание, изменение
+# и удаление отслеживаемых моделей записывается строкой ChangeEvent, номер
+# события (seq, он же id) только растет — SQLite-таблица с AUTOINCREMENT не
+# выдает номера повторно даже после сжатия журнала. Потребитель хранит
+# последний прочитанный seq и забирает следующие события (read).
+#
+# События пишутся в той же транзакции, что и сами изменения: они
+# фиксируются и откатываются (в том числе до точки сохранения) вместе
+# с данными, и сбой после COMMIT не может их потерять. SQLite держит
+# блокировку записи от первой записи транзакции до COMMIT, поэтому номера
+# событий идут в порядке фиксации транзакций. Одиночные save()/delete()
+# записываются сигналами, пакетные UPDATE/DELETE по queryset — через
+# update()/raw_delete() или явный record() в месте вызова.
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import (
+    ChangeEvent, Enrollment, Group, Kindergarten, KindergartenImage, KindergartenTeacher, Review, Teacher,
+)
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+TRACKED_MODELS = (Kindergarten, Group, Teacher, KindergartenTeacher, Enrollment, Review, KindergartenImage)
+LABELS = {model: model._meta.model_name for model in TRACKED_MODELS}
+
+MAX_PAGE = 1000
+COMPACT_CHUNK = 5000
+# pk__in пачками: SQLite ограничивает число параметров в одном запросе
+WRITE_CHUNK = 900
+
+
+def record(model, ids, action, fields=None, using=DEFAULT_DB_ALIAS):
+    """Добавляет события action для объектов model с первичными ключами ids."""
+    label = LABELS.get(model)
+    if label is None:
+        return
+    # update_fields и аргументы update() могут быть и attname ('group_id')
+    fields = sorted({model._meta.get_field(name).name for name in fields}) if fields else None
+    events = [ChangeEvent(model=label, object_id=pk, action=action, fields=fields) for pk in ids]
+    if events:
+        ChangeEvent.objects.using(using).bulk_create(events, batch_size=500)
+
+
+def update(queryset, **values):
+    """queryset.update(**values) с событиями изменения; возвращает число строк."""
+    with transaction.atomic(using=queryset.db):
+        ids = list(queryset.order_by().values_list('pk', flat=True))
+        if not ids:
+            return 0
+        count = queryset.update(**values)
+        record(queryset.model, ids, UPDATE, values, using=queryset.db)
+    return count
+
+
+def raw_delete(queryset):
+    """Прямой DELETE по queryset (без сигналов) с событиями удаления."""
+    with transaction.atomic(using=queryset.db):
+        ids = list(queryset.order_by().values_list('pk', flat=True)) if queryset.model in LABELS else []
+        count = queryset._raw_delete(queryset.db)
+        record(queryset.model, ids, DELETE, using=queryset.db)
+    return count
+
+
+def read(since=0, limit=MAX_PAGE, models=None):
+    """Страница журнала после seq since: {'events', 'next', 'has_more'}."""
+    limit = min(max(limit, 1), MAX_PAGE)
+    events = ChangeEvent.objects.filter(pk__gt=since).order_by('pk')
+    if models:
+        events = events.filter(model__in=models)
+    rows = list(events.values_list('pk', 'model', 'object_id', 'action', 'fields', 'created_at')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'events': [
+            {'seq': seq, 'model': model, 'id': object_id, 'action': action, 'fields': fields,
+             'at': created_at.isoformat()}
+            for seq, model, object_id, action, fields, created_at in rows
+        ],
+        'next': rows[-1][0] if rows else since,
+        'has_more': has_more,
+    }
+
+
+def _collapse(events):
+    """(действие, поля) одного события, заменяющего историю объекта events."""
+    last_action, _ = events[-1]
+    if last_action == DELETE:
+        return DELETE, None
+    if any(action == CREATE for action, _ in events):
+        return CREATE, None
+    fields = set()
+    for _, changed in events:
+        if changed is None:
+            return UPDATE, None
+        fields.update(changed)
+    return UPDATE, sorted(fields)
+
+
+def compact(before):
+    """Сжимает события раньше before: у каждого объекта остается последнее.
+
+    Оставшееся событие сохраняет свой seq и получает итоговое действие:
+    удаление, создание (если объект создан в сжимаемом отрезке) или изменение
+    с объединением измененных полей. Удаления не выбрасываются, чтобы
+    отставший потребитель узнал и о них. Возвращает число удаленных событий.
+    """
+    history = defaultdict(list)
+    old = ChangeEvent.objects.filter(created_at__lt=before).order_by('pk')
+    for pk, model, object_id, action, fields in old.values_list(
+        'pk', 'model', 'object_id', 'action', 'fields',
+    ).iterator(chunk_size=COMPACT_CHUNK):
+        history[model, object_id].append((pk, action, fields))
+
+    removed = 0
+    redundant, collapsed = [], []
+    for events in history.values():
+        if len(events) < 2:
+            continue
+        action, fields = _collapse([(action, fields) for _, action, fields in events])
+        kept = events[-1]
+        redundant.extend(pk for pk, _, _ in events[:-1])
+        if (action, fields) != (kept[1], kept[2]):
+            collapsed.append(ChangeEvent(pk=kept[0], action=action, fields=fields))
+    for start in range(0, max(len(redundant), len(collapsed)), WRITE_CHUNK):
+        with transaction.atomic():
+            chunk = ChangeEvent.objects.filter(pk__in=redundant[start:start + WRITE_CHUNK])
+            removed += chunk._raw_delete(chunk.db)
+            ChangeEvent.objects.bulk_update(collapsed[start:start + WRITE_CHUNK], ['action', 'fields'])
+    return removed
@@ -0,0 +1,107 @@
+# app/deletion.py
+# Удаление записей со всеми зависимыми строками без обхода графа CASCADE
+# в Python: зависимые модели находятся по метаданным один раз, для страницы
+# подтверждения считаются COUNT-запросами, а удаляются пачками прямых DELETE
+# (от самых дальних зависимостей к корню). Сигналы удаления не отправляются,
+# поэтому кэши сбрасываются через refresh_derived, страницы и файлы ставятся
+# в очереди перерисовки и удаления, события пишутся в журнал изменений.
+from django.db import models, transaction
+
+from . import changefeed, duplicates, leaderboard, media, prerender
+from .models import Kindergarten, Review
+from .signals import refresh_derived
+
+
+def cascade_plan(model, lookup=''):
+    """[(модель, путь к корню)] всех строк, удаляемых каскадом вместе с model.
+
+    Путь — lookup от зависимой модели до первичного ключа корня
+    ('group__kindergarten' для записей в группы). Порядок — от дальних
+    зависимостей к ближним, в нем строки можно удалять без нарушения FK.
+    """
+    plan = []
+    # Как Collector в Django: включая скрытые связи (related_name='+')
+    for relation in model._meta.get_fields(include_hidden=True):
+        if not (relation.auto_created and not relation.concrete and (relation.one_to_many or relation.one_to_one)):
+            continue
+        path = f'{relation.field.name}__{lookup}' if lookup else relation.field.name
+        if relation.on_delete is models.CASCADE:
+            plan.extend(cascade_plan(relation.related_model, path))
+            plan.append((relation.related_model, path))
+        elif relation.on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f'{relation.related_model.__name__}.{relation.field.name}: пакетное удаление '
+                f'поддерживает только CASCADE и DO_NOTHING'
+            )
+    return plan
+
+
+def dependent_counts(model, ids):
+    """{модель: число строк}, которые будут удалены вместе с записями ids."""
+    counts = {}
+    for related_model, path in cascade_plan(model):
+        count = related_model._default_manager.filter(**{f'{path}__in': ids}).count()
+        if count:
+            counts[related_model] = counts.get(related_model, 0) + count
+    return counts
+
+
+def _delete_rows(queryset, file_fields):
+    if file_fields:
+        names = queryset.values_list(*[field.name for field in file_fields])
+        media.release_files(name for row in names for name in row)
+    if queryset.model is Review:
+        # У полос индекса похожих отзывов нет внешнего ключа — каскад их не видит
+        duplicates.remove_reviews(queryset.values('pk'))
+    return changefeed.raw_delete(queryset)
+
+
+def delete_cascade(model, ids, chunk_size=1000):
+    """Удаляет записи model с первичными ключами ids и все зависимые строки.
+
+    Зависимые строки удаляются пачками по chunk_size, каждая в своей
+    транзакции, чтобы не держать блокировку базы долго. Последний шаг —
+    дочистка появившихся за это время зависимостей и удаление самих
+    записей — выполняется в одной транзакции. Возвращает {модель: удалено}.
+    """
+    ids = list(ids)
+    plan = cascade_plan(model)
+    files = {
+        related_model: [field for field in related_model._meta.concrete_fields
+                        if isinstance(field, models.FileField)]
+        for related_model in {model} | {related_model for related_model, _ in plan}
+    }
+    deleted = dict.fromkeys([related_model for related_model, _ in plan] + [model], 0)
+
+    for related_model, path in plan:
+        rows = related_model._default_manager.filter(**{f'{path}__in': ids}).order_by('pk')
+        while True:
+            with transaction.atomic():
+                pks = list(rows.values_list('pk', flat=True)[:chunk_size])
+                if not pks:
+                    break
+                deleted[related_model] += _delete_rows(
+                    related_model._default_manager.filter(pk__in=pks), files[related_model]
+                )
+
+    with transaction.atomic():
+        for related_model, path in plan:
+            deleted[related_model] += _delete_rows(
+                related_model._default_manager.filter(**{f'{path}__in': ids}), files[related_model]
+            )
+        deleted[model] += _delete_rows(model._default_manager.filter(pk__in=ids), files[model])
+
+    refresh_derived(*deleted)
+    return {related_model: count for related_model, count in deleted.items() if count}
+
+
+def delete_kindergartens(ids, chunk_size=1000):
+    ids = list(ids)
+    # Страницы удаленных садов воркер не найдет и уберет из статической копии
+    paths = [prerender.detail_path(pk) for pk in ids] + [prerender.list_path()]
+    # Ссылки на них из "Похожих садов" каскад удалит — карточки с ними ищем заранее
+    paths += prerender.listing_paths(ids)
+    leaderboard.remove_kindergartens(ids)
+    deleted = delete_cascade(Kindergarten, ids, chunk_size=chunk_size)
+    prerender.enqueue(paths)
+    return deleted
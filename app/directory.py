@@ -0,0 +1,62 @@
+# app/directory.py
+# Справочник воспитателей: каждый воспитатель один раз, места работы
+# подгружаются одним запросом, фильтры идут по индексам.
+from django.db.models import Prefetch
+
+from .caching import namespaced_key
+from .models import KindergartenTeacher, Teacher
+from .text import normalize_name, prefix_range
+
+CACHE_NAMESPACE = 'teacher-directory'
+
+
+def _name_condition(query):
+    words = normalize_name(query).split()
+    if not words:
+        return None
+    # "Иванова Мария" и "Мария Иванова" — префиксы ключа "фамилия имя"
+    variants = {' '.join(words)}
+    if len(words) == 2:
+        variants.add(f'{words[1]} {words[0]}')
+    condition = None
+    for variant in variants:
+        low, high = prefix_range(variant)
+        q = Teacher.objects.filter(search_name__gte=low, search_name__lt=high)
+        condition = q if condition is None else condition | q
+    return condition
+
+
+def search_teachers(search='', qualification='', role='', kindergarten_id=None):
+    teachers = Teacher.objects.all()
+
+    if search:
+        matched = _name_condition(search)
+        if matched is not None:
+            teachers = matched
+
+    if qualification:
+        teachers = teachers.filter(qualification=qualification)
+
+    if role or kindergarten_id:
+        # Полусоединение через подзапрос вместо JOIN: без дублей и без distinct()
+        assignments = KindergartenTeacher.objects.all()
+        if kindergarten_id:
+            assignments = assignments.filter(kindergarten_id=kindergarten_id)
+        if role:
+            assignments = assignments.filter(role=role)
+        teachers = teachers.filter(pk__in=assignments.values('teacher_id'))
+
+    return teachers.prefetch_related(Prefetch(
+        'kindergartenteacher_set',
+        queryset=KindergartenTeacher.objects.select_related('kindergarten').only(
+            'teacher', 'role', 'years_at_kindergarten',
+            'kindergarten', 'kindergarten__name',
+        ).order_by('kindergarten__name'),
+        to_attr='assignments',
+    ))
+
+
+def count_cache_key(search='', qualification='', role='', kindergarten_id=None):
+    return namespaced_key(
+        CACHE_NAMESPACE, 'count', normalize_name(search), qualification, role, kindergarten_id or ''
+    )
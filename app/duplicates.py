@@ -0,0 +1,246 @@
+# app/duplicates.py
+# Поиск почти одинаковых отзывов (спам, разосланный по разным садам).
+# Комментарий разбивается на шинглы — тройки соседних слов; по ним считается
+# MinHash-сигнатура из NUM_PERM минимумов, которая режется на BANDS полос.
+# Ключи полос хранятся в ReviewBand: тексты с коэффициентом Жаккара выше
+# ~0.5 почти наверняка совпадают хотя бы в одной полосе, поэтому кандидаты
+# находятся одним запросом по индексу, а точное сходство считается только
+# для них. Новый отзыв, похожий на существующий, задерживается до модерации.
+import random
+import re
+import struct
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db import connections, transaction
+
+from . import changefeed
+from .models import Review, ReviewBand
+
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Отзыв считается дубликатом при сходстве шинглов не ниже порога
+THRESHOLD = 0.6
+# Короткие тексты ("Отличный сад!") совпадают и у честных родителей
+MIN_SHINGLES = 4
+MAX_CANDIDATES = 50
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(7)
+_PERMUTATIONS = [(_random.randrange(1, _PRIME), _random.randrange(_PRIME)) for _ in range(NUM_PERM)]
+_BAND = struct.Struct(f'<{ROWS}Q')
+_WORD = re.compile(r'\w+')
+
+
+def shingles(text):
+    words = _WORD.findall((text or '').lower().replace('ё', 'е'))
+    if len(words) < SHINGLE_WORDS:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(shingle_set):
+    # Перестановки — универсальное хеширование (a * h + b) mod p над crc32 шингла
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingle_set]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(shingle_set):
+    """Ключи полос сигнатуры; номер полосы — в старших битах ключа."""
+    if not shingle_set:
+        return []
+    values = signature(shingle_set)
+    return [
+        band << 32 | zlib.crc32(_BAND.pack(*values[band * ROWS:(band + 1) * ROWS]))
+        for band in range(BANDS)
+    ]
+
+
+def jaccard(left, right):
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def index_review(review):
+    keys = band_keys(shingles(review.comment))
+    ReviewBand.objects.filter(review_id=review.pk).delete()
+    ReviewBand.objects.bulk_create(ReviewBand(review_id=review.pk, key=key) for key in keys)
+
+
+def index_reviews(rows):
+    """Индексирует пачку отзывов [(id, комментарий)], созданных без сигналов (восстановление из архива)."""
+    rows = list(rows)
+    remove_reviews([pk for pk, _ in rows])
+    ReviewBand.objects.bulk_create(
+        [ReviewBand(review_id=pk, key=key) for pk, comment in rows for key in band_keys(shingles(comment))],
+        batch_size=5000,
+    )
+
+
+def remove_review(review):
+    ReviewBand.objects.filter(review_id=review.pk).delete()
+
+
+def remove_reviews(review_ids):
+    """Удаляет полосы отзывов review_ids (список или подзапрос) при пакетном DELETE без сигналов."""
+    ReviewBand.objects.filter(review_id__in=review_ids)._raw_delete(ReviewBand.objects.db)
+
+
+@lru_cache(maxsize=None)
+def _candidates_sql():
+    quote = connections[Review.objects.db].ops.quote_name
+    review, band = Review._meta, ReviewBand._meta
+    columns = ', '.join(quote(review.get_field(name).column) for name in ('id', 'comment', 'duplicate_cluster'))
+    return (
+        f'SELECT {columns} FROM {quote(review.db_table)} WHERE {quote("id")} IN ('
+        f'SELECT {quote("review_id")} FROM {quote(band.db_table)} WHERE {quote("key")} IN ({", ".join(["%s"] * BANDS)})'
+        f') AND {quote("id")} <> %s LIMIT %s'
+    )
+
+
+def find_similar(comment, exclude_pk=None, threshold=THRESHOLD):
+    """[(id отзыва, его группа, сходство)] для почти того же текста, по убыванию сходства.
+
+    Один запрос по индексу полос: отзывы, у которых совпал хотя бы один ключ. Для текста
+    без похожих это доли миллисекунды; точное сходство считается только для
+    не более чем MAX_CANDIDATES кандидатов.
+    """
+    words = shingles(comment)
+    if len(words) < MIN_SHINGLES:
+        return []
+    # Готовый SQL вместо queryset: построение запроса ORM стоило бы больше самого поиска
+    with connections[Review.objects.db].cursor() as cursor:
+        cursor.execute(_candidates_sql(), [*band_keys(words), exclude_pk or 0, MAX_CANDIDATES])
+        candidates = cursor.fetchall()
+    matches = []
+    for pk, text, cluster in candidates:
+        score = jaccard(words, shingles(text))
+        if score >= threshold:
+            matches.append((pk, cluster, score))
+    matches.sort(key=lambda match: (-match[2], match[0]))
+    return matches
+
+
+def screen(review):
+    """Проверяет новый отзыв перед сохранением; похожий на существующие задерживает.
+
+    Отзыв попадает в группу найденных похожих (duplicate_cluster), у которых
+    группа проставляется, если ее еще не было. Возвращает найденные совпадения.
+    """
+    matches = find_similar(review.comment, exclude_pk=review.pk)
+    if matches:
+        cluster = min(group or pk for pk, group, _ in matches)
+        changefeed.update(
+            Review.objects.filter(pk__in=[pk for pk, _, _ in matches], duplicate_cluster=None),
+            duplicate_cluster=cluster,
+        )
+        review.is_held = True
+        review.duplicate_cluster = cluster
+    return matches
+
+
+def signatures(batch_size=5000):
+    """{id отзыва: (шинглы, ключи полос)} для всех отзывов."""
+    rows = Review.objects.order_by().values_list('pk', 'comment')
+    result = {}
+    for pk, comment in rows.iterator(chunk_size=batch_size):
+        words = shingles(comment)
+        result[pk] = (words, band_keys(words))
+    return result
+
+
+def rebuild_index(batch_size=5000):
+    """Перестраивает ReviewBand; возвращает signatures() для кластеризации."""
+    result = signatures(batch_size)
+    meta = ReviewBand._meta
+    quote = connections[ReviewBand.objects.db].ops.quote_name
+    sql = f'INSERT INTO {quote(meta.db_table)} ({quote("review_id")}, {quote("key")}) VALUES (%s, %s)'
+    # По BANDS строк на отзыв: executemany, как в similar.rebuild, а не bulk_create
+    with transaction.atomic(using=ReviewBand.objects.db):
+        ReviewBand.objects.all()._raw_delete(ReviewBand.objects.db)
+        with connections[ReviewBand.objects.db].cursor() as cursor:
+            cursor.executemany(sql, [(pk, key) for pk, (_, keys) in result.items() for key in keys])
+    return result
+
+
+def find_clusters(signatures, threshold=THRESHOLD, probes=5):
+    """Группы почти одинаковых отзывов: [(наибольшее сходство, [id, ...])].
+
+    Кандидаты — отзывы с общим ключом полосы (корзина LSH). Внутри корзины
+    каждый отзыв сравнивается с первыми probes ее отзывами: для групп из
+    сотен копий одного текста это линейно, а не квадратично.
+    """
+    buckets = defaultdict(list)
+    for pk, (words, keys) in signatures.items():
+        if len(words) >= MIN_SHINGLES:
+            for key in keys:
+                buckets[key].append(pk)
+
+    parent = {}
+    best = defaultdict(float)
+
+    def find(pk):
+        while parent.setdefault(pk, pk) != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for position, pk in enumerate(members[1:], start=1):
+            for other in members[:min(probes, position)]:
+                pair = (other, pk)
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                score = jaccard(signatures[other][0], signatures[pk][0])
+                if score < threshold:
+                    continue
+                root_left, root_right = find(other), find(pk)
+                if root_left != root_right:
+                    parent[root_right] = root_left
+                    best[root_left] = max(best[root_left], best.pop(root_right, 0.0))
+                best[root_left] = max(best[root_left], score)
+
+    clusters = defaultdict(list)
+    for pk in parent:
+        clusters[find(pk)].append(pk)
+    return sorted(
+        ((best[root], sorted(members)) for root, members in clusters.items() if len(members) > 1),
+        key=lambda cluster: (-len(cluster[1]), -cluster[0], cluster[1]),
+    )
+
+
+def assign_clusters(clusters, hold=False):
+    """Записывает группы в Review.duplicate_cluster (id первого отзыва группы).
+
+    С hold задерживает все отзывы группы, кроме самого раннего. Возвращает
+    id садов, у которых отзывы были сняты с публикации.
+    """
+    kindergarten_ids = set()
+    clustered = {pk for _, members in clusters for pk in members}
+    with transaction.atomic():
+        # Обновляются только отзывы, у которых группа изменилась, — иначе
+        # каждый запуск писал бы в журнал изменений все сгруппированные отзывы
+        stale = [
+            pk for pk in Review.objects.exclude(duplicate_cluster=None).values_list('pk', flat=True)
+            if pk not in clustered
+        ]
+        for start in range(0, len(stale), 900):
+            changefeed.update(Review.objects.filter(pk__in=stale[start:start + 900]), duplicate_cluster=None)
+        for _, members in clusters:
+            changefeed.update(
+                Review.objects.filter(pk__in=members).exclude(duplicate_cluster=members[0]),
+                duplicate_cluster=members[0],
+            )
+            if hold:
+                published = Review.objects.filter(pk__in=members[1:], is_held=False)
+                kindergarten_ids.update(published.values_list('kindergarten_id', flat=True))
+                changefeed.update(published, is_held=True)
+    return kindergarten_ids
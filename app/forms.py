@@ -1,6 +1,10 @@
 # app/forms.py
 from django import forms
-from .models import Review
+from django.utils import timezone
+
+from . import duplicates
+from .ages import age_in_months
+from .models import KindergartenTeacher, Review, Teacher
 
 class ReviewForm(forms.ModelForm):
     rating = forms.IntegerField(
@@ -21,4 +25,70 @@ class ReviewForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['parent_name'].widget.attrs.update({'placeholder': 'Ваше имя'})
\ No newline at end of file
+        self.fields['parent_name'].widget.attrs.update({'placeholder': 'Ваше имя'})
+
+    def save(self, commit=True):
+        review = super().save(commit=False)
+        # Новый отзыв, почти совпадающий с уже оставленными, ждет модератора
+        if review.pk is None:
+            duplicates.screen(review)
+        if commit:
+            review.save()
+        return review
+
+class TeacherFilterForm(forms.Form):
+    search = forms.CharField(required=False, max_length=100)
+    qualification = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Любая квалификация')] + Teacher.QUALIFICATION_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    role = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Любая должность')] + KindergartenTeacher.ROLE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    kindergarten = forms.IntegerField(required=False, min_value=1)
+
+    def filters(self):
+        # Поле с ошибкой просто не фильтрует: в cleaned_data остаются только верные поля
+        self.is_valid()
+        data = self.cleaned_data
+        return {
+            'search': data.get('search', '').strip(),
+            'qualification': data.get('qualification', ''),
+            'role': data.get('role', ''),
+            'kindergarten_id': data.get('kindergarten'),
+        }
+
+
+class FreeSeatsForm(forms.Form):
+    birth_date = forms.DateField(
+        label='Дата рождения ребенка',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
+
+
+MAX_AGE_MONTHS = 7 * 12
+
+
+class EnrollmentApplicationForm(forms.Form):
+    """Заявка на запись из модального окна карточки сада; проверка без запросов к базе."""
+    # Клиент создает ключ при открытии окна и повторяет его при переотправке
+    key = forms.RegexField(regex=r'^[\w-]{8,64}$', required=False)
+    child_last_name = forms.CharField(max_length=100)
+    child_first_name = forms.CharField(max_length=100)
+    birth_date = forms.DateField()
+    parent_name = forms.CharField(max_length=100)
+    phone = forms.RegexField(regex=r'^\+?[\d\s()-]{6,20}$', max_length=20)
+    email = forms.EmailField(required=False)
+    message = forms.CharField(required=False, max_length=2000)
+
+    def clean_birth_date(self):
+        birth_date = self.cleaned_data['birth_date']
+        today = timezone.localdate()
+        if birth_date > today:
+            raise forms.ValidationError('Дата рождения не может быть в будущем')
+        if age_in_months(birth_date, today) >= MAX_AGE_MONTHS:
+            raise forms.ValidationError('Запись принимается для детей до 7 лет')
+        return birth_date
@@ -0,0 +1,223 @@
+# app/fuzzy.py
+# Нечеткий поиск детей и воспитателей по ФИО: триграммы транслитерированного
+# ключа хранятся в NameTrigram, кандидаты отбираются одним GROUP BY по индексу
+# (по самым редким триграммам запроса), а точная оценка сходства считается
+# в Python только для них.
+import math
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .caching import namespaced_key
+from .models import Child, NameTrigram, Teacher
+from .text import name_key, similarity, trigrams
+
+MODELS = {'child': Child, 'teacher': Teacher}
+KINDS = {model: kind for kind, model in MODELS.items()}
+NAME_FIELDS = ('first_name', 'last_name')
+
+FREQUENCY_NAMESPACE = 'name-trigram-frequency'
+FREQUENCY_TIMEOUT = 60 * 60
+
+# Во сколько раз больше кандидатов, чем нужно результатов, проверяется точно
+CANDIDATE_FACTOR = 4
+# Сколько строк индекса можно просмотреть сверх обязательных редких триграмм
+POSTING_BUDGET = 20000
+
+
+def name_trigrams(first_name, last_name):
+    return trigrams(name_key(f'{last_name} {first_name}'))
+
+
+def index_object(instance):
+    """Приводит триграммы объекта в NameTrigram к его текущему ФИО."""
+    kind = KINDS[type(instance)]
+    wanted = name_trigrams(instance.first_name, instance.last_name)
+    rows = NameTrigram.objects.filter(kind=kind, object_id=instance.pk)
+    existing = set(rows.values_list('trigram', flat=True))
+    if existing - wanted:
+        rows.filter(trigram__in=existing - wanted).delete()
+    NameTrigram.objects.bulk_create(
+        NameTrigram(kind=kind, object_id=instance.pk, trigram=gram) for gram in wanted - existing
+    )
+
+
+def index_new_objects(objects):
+    """Добавляет в индекс только что созданные пакетом объекты (bulk_create сигналы не отправляет)."""
+    NameTrigram.objects.bulk_create(
+        NameTrigram(kind=KINDS[type(obj)], object_id=obj.pk, trigram=gram)
+        for obj in objects
+        for gram in name_trigrams(obj.first_name, obj.last_name)
+    )
+
+
+def remove_object(instance):
+    NameTrigram.objects.filter(kind=KINDS[type(instance)], object_id=instance.pk).delete()
+
+
+def rebuild_index(kind, batch_size=5000):
+    """Полностью перестраивает индекс для детей или воспитателей."""
+    NameTrigram.objects.filter(kind=kind).delete()
+    batch, count = [], 0
+    names = MODELS[kind].objects.order_by().values_list('pk', *NAME_FIELDS)
+    for pk, first_name, last_name in names.iterator(chunk_size=batch_size):
+        batch.extend(
+            NameTrigram(kind=kind, object_id=pk, trigram=gram)
+            for gram in name_trigrams(first_name, last_name)
+        )
+        count += 1
+        if len(batch) >= batch_size:
+            NameTrigram.objects.bulk_create(batch)
+            batch = []
+    NameTrigram.objects.bulk_create(batch)
+    return count
+
+
+def trigram_frequency(kind):
+    """Сколько раз встречается каждая триграмма; кэшируется на час.
+
+    Частоты нужны только для выбора самых избирательных триграмм запроса,
+    поэтому устаревшие значения не влияют на полноту поиска.
+    """
+    key = namespaced_key(FREQUENCY_NAMESPACE, kind)
+    frequency = cache.get(key)
+    if frequency is None:
+        frequency = dict(
+            NameTrigram.objects.filter(kind=kind).values('trigram')
+            .annotate(count=Count('id')).values_list('trigram', 'count')
+        )
+        cache.set(key, frequency, FREQUENCY_TIMEOUT)
+    return frequency
+
+
+def _probe_grams(kind, grams, min_shared):
+    # Совпадение с min_shared общими триграммами обязательно содержит хотя бы
+    # одну из len - min_shared + 1 любых триграмм запроса; берем самые редкие
+    # и добавляем следующие, пока укладываемся в бюджет просматриваемых строк.
+    frequency = trigram_frequency(kind)
+    ordered = sorted(grams, key=lambda gram: (frequency.get(gram, 0), gram))
+    required = len(grams) - min_shared + 1
+    probe = ordered[:required]
+    postings = sum(frequency.get(gram, 0) for gram in probe)
+    for gram in ordered[required:]:
+        postings += frequency.get(gram, 0)
+        if postings > POSTING_BUDGET:
+            break
+        probe.append(gram)
+    return probe
+
+
+def search(kind, query, limit=50, threshold=0.5):
+    """Ищет ФИО, похожие на query; возвращает [(pk, оценка)] по убыванию сходства.
+
+    Оценка — доля триграмм запроса, найденных в ФИО (как word_similarity
+    в pg_trgm), поэтому "Иван" находит "Иванов Петр"; при равной оценке
+    выше стоят имена, целиком совпадающие с запросом.
+    """
+    grams = trigrams(name_key(query))
+    if not grams:
+        return []
+
+    min_shared = max(1, math.ceil(threshold * len(grams)))
+    probe = _probe_grams(kind, grams, min_shared)
+    # среди пропущенных частых триграмм могут быть общие — порог снижается на их число
+    probe_min_shared = max(1, min_shared - (len(grams) - len(probe)))
+    candidates = list(
+        NameTrigram.objects.filter(kind=kind, trigram__in=probe)
+        .values('object_id')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=probe_min_shared)
+        .order_by('-shared')
+        .values_list('object_id', 'shared')[:limit * CANDIDATE_FACTOR]
+    )
+    if not candidates:
+        return []
+
+    names = MODELS[kind].objects.filter(pk__in=[pk for pk, _ in candidates]).values_list('pk', *NAME_FIELDS)
+    ranked = []
+    for pk, first_name, last_name in names:
+        target = name_trigrams(first_name, last_name)
+        shared = len(grams & target)
+        ranked.append((shared / len(grams), similarity(grams, target), pk))
+    ranked.sort(key=lambda item: (-item[0], -item[1], item[2]))
+    return [(pk, score) for score, _, pk in ranked[:limit] if score >= threshold]
+
+
+def similar_pairs(records, threshold):
+    """Пары записей с коэффициентом Жаккара триграмм не ниже threshold.
+
+    records — [(pk, множество триграмм)]. Используется фильтр по префиксу:
+    триграммы упорядочены от редких к частым, и пара может совпасть только
+    если у нее есть общая триграмма среди первых len - ceil(t * len) + 1.
+    """
+    frequency = Counter(gram for _, grams in records for gram in grams)
+    records = sorted(records, key=lambda record: len(record[1]))
+    index = defaultdict(list)
+    grams_by_pk = {}
+    for pk, grams in records:
+        if not grams:
+            continue
+        ordered = sorted(grams, key=lambda gram: (frequency[gram], gram))
+        prefix = ordered[:len(ordered) - math.ceil(threshold * len(ordered)) + 1]
+        candidates = set()
+        for gram in prefix:
+            candidates.update(index[gram])
+        for other in candidates:
+            other_grams = grams_by_pk[other]
+            # записи отсортированы по размеру: слишком короткие не дотянут до порога
+            if len(other_grams) < threshold * len(grams):
+                continue
+            score = similarity(grams, other_grams)
+            if score >= threshold:
+                yield other, pk, score
+        grams_by_pk[pk] = grams
+        for gram in prefix:
+            index[gram].append(pk)
+
+
+def find_duplicate_children(threshold=0.7, same_birth_date=True):
+    """Группы возможных дублей среди детей: [(максимальная оценка, [pk, ...])].
+
+    По умолчанию сравниваются только дети с одинаковой датой рождения.
+    """
+    # блок (дата рождения) -> триграммы ФИО -> дети; одинаковые ФИО сравниваются один раз
+    blocks = defaultdict(lambda: defaultdict(list))
+    rows = Child.objects.order_by().values_list('pk', *NAME_FIELDS, 'birth_date')
+    for pk, first_name, last_name, birth_date in rows.iterator(chunk_size=5000):
+        block = birth_date if same_birth_date else None
+        blocks[block][frozenset(name_trigrams(first_name, last_name))].append(pk)
+
+    parent = {}
+    best = defaultdict(float)
+
+    def find(pk):
+        while parent.setdefault(pk, pk) != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    def union(left, right, score):
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[root_right] = root_left
+            best[root_left] = max(best[root_left], best.pop(root_right, 0.0))
+        best[root_left] = max(best[root_left], score)
+
+    for names in blocks.values():
+        for pks in names.values():
+            for pk in pks[1:]:
+                union(pks[0], pk, 1.0)
+        if len(names) < 2:
+            continue
+        representatives = [(pks[0], grams) for grams, pks in names.items()]
+        for left, right, score in similar_pairs(representatives, threshold):
+            union(left, right, score)
+
+    clusters = defaultdict(list)
+    for pk in parent:
+        clusters[find(pk)].append(pk)
+    return sorted(
+        ((best[root], sorted(members)) for root, members in clusters.items()),
+        key=lambda cluster: (-cluster[0], cluster[1]),
+    )
@@ -0,0 +1,185 @@
+# app/geo.py
+# Пространственный индекс детских садов: равномерная сетка в памяти процесса.
+# Индекс строится лениво и перестраивается, когда меняется версия пространства
+# имён в кэше (её увеличивают сигналы сохранения/удаления Kindergarten).
+import heapq
+import math
+import threading
+
+from .caching import bump_namespace, namespace_version
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+CELL_SIZE_DEG = 0.01  # ~1.1 км по широте
+
+INDEX_NAMESPACE = 'geo-index'
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_point(lat, lon):
+    """Возвращает (lat, lon) из строковых параметров запроса или None."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class GridIndex:
+    def __init__(self, points, cell_size=CELL_SIZE_DEG):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.size = 0
+        for pk, lat, lon in points:
+            self.cells.setdefault(self._cell(lat, lon), []).append((pk, lat, lon))
+            self.size += 1
+        if self.cells:
+            rows = [c[0] for c in self.cells]
+            cols = [c[1] for c in self.cells]
+            self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            yield row, col
+            return
+        for c in range(col - r, col + r + 1):
+            yield row - r, c
+            yield row + r, c
+        for rr in range(row - r + 1, row + r):
+            yield rr, col - r
+            yield rr, col + r
+
+    def _ring_gap_km(self, lat, r):
+        # Нижняя граница расстояния до любой ячейки кольца r + 1.
+        edge_lat = min(89.9, abs(lat) + (r + 1) * self.cell_size)
+        cell_km = self.cell_size * KM_PER_DEGREE
+        return r * cell_km * min(1.0, math.cos(math.radians(edge_lat)))
+
+    def within(self, lat, lon, radius_km):
+        """Все точки в радиусе radius_km, отсортированные по расстоянию: [(км, pk)]."""
+        if not self.size:
+            return []
+        d_lat = radius_km / KM_PER_DEGREE
+        d_lon = d_lat / max(0.01, math.cos(math.radians(min(89.9, abs(lat) + d_lat))))
+        row0, col0 = self._cell(lat - d_lat, lon - d_lon)
+        row1, col1 = self._cell(lat + d_lat, lon + d_lon)
+        min_row, max_row, min_col, max_col = self.bounds
+        row0, row1 = max(row0, min_row), min(row1, max_row)
+        col0, col1 = max(col0, min_col), min(col1, max_col)
+
+        result = []
+        if (row1 - row0 + 1) * (col1 - col0 + 1) > len(self.cells):
+            buckets = (
+                points for (row, col), points in self.cells.items()
+                if row0 <= row <= row1 and col0 <= col <= col1
+            )
+        else:
+            buckets = (
+                self.cells.get((row, col), ())
+                for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)
+            )
+        for points in buckets:
+            for pk, p_lat, p_lon in points:
+                distance = haversine_km(lat, lon, p_lat, p_lon)
+                if distance <= radius_km:
+                    result.append((distance, pk))
+        result.sort()
+        return result
+
+    def nearest(self, lat, lon, k, max_radius_km=None):
+        """k ближайших точек (не дальше max_radius_km, если задан): [(км, pk)]."""
+        if not self.size or k <= 0:
+            return []
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self.bounds
+        max_ring = max(row - min_row, max_row - row, col - min_col, max_col - col)
+        heap = []  # max-куча по расстоянию из k лучших: (-км, pk)
+        visited = 0
+        r = 0
+        while r <= max_ring:
+            for cell in self._ring(row, col, r):
+                visited += 1
+                for pk, p_lat, p_lon in self.cells.get(cell, ()):
+                    distance = haversine_km(lat, lon, p_lat, p_lon)
+                    if max_radius_km is not None and distance > max_radius_km:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-distance, pk))
+                    elif distance < -heap[0][0]:
+                        heapq.heapreplace(heap, (-distance, pk))
+            gap = self._ring_gap_km(lat, r)
+            if len(heap) == k and -heap[0][0] <= gap:
+                break
+            if max_radius_km is not None and gap > max_radius_km:
+                break
+            if visited > 4 * len(self.cells):
+                # Точки далеко и разрежены: дешевле досчитать перебором.
+                return self._brute_nearest(lat, lon, k, max_radius_km)
+            r += 1
+        return sorted((-d, pk) for d, pk in heap)
+
+    def _brute_nearest(self, lat, lon, k, max_radius_km):
+        distances = (
+            (haversine_km(lat, lon, p_lat, p_lon), pk)
+            for points in self.cells.values() for pk, p_lat, p_lon in points
+        )
+        if max_radius_km is not None:
+            distances = (item for item in distances if item[0] <= max_radius_km)
+        return heapq.nsmallest(k, distances)
+
+
+_index = None
+_index_generation = None
+_lock = threading.Lock()
+
+
+def get_index():
+    global _index, _index_generation
+    generation = namespace_version(INDEX_NAMESPACE)
+    if _index is not None and _index_generation == generation:
+        return _index
+    with _lock:
+        if _index is None or _index_generation != generation:
+            from .models import Kindergarten
+            points = Kindergarten.objects.filter(
+                latitude__isnull=False, longitude__isnull=False
+            ).values_list('pk', 'latitude', 'longitude')
+            _index = GridIndex(points.iterator(chunk_size=5000))
+            _index_generation = generation
+    return _index
+
+
+def invalidate_index():
+    bump_namespace(INDEX_NAMESPACE)
+
+
+ADDRESS_ABBREVIATIONS = {
+    'г': 'город', 'ул': 'улица', 'пр': 'проспект', 'пр-т': 'проспект',
+    'просп': 'проспект', 'пер': 'переулок', 'б-р': 'бульвар', 'бул': 'бульвар',
+    'ш': 'шоссе', 'пл': 'площадь', 'наб': 'набережная', 'мкр': 'микрорайон',
+    'мкрн': 'микрорайон', 'д': 'дом', 'к': 'корпус', 'корп': 'корпус',
+    'стр': 'строение',
+}
+
+
+def normalize_address(address):
+    """Ключ для сопоставления адресов с газеттиром: регистр, ё, сокращения, пунктуация."""
+    address = address.lower().replace('ё', 'е')
+    for char in ',.;:"«»()№#':
+        address = address.replace(char, ' ')
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in address.split()]
+    return ' '.join(word for word in words if word not in ('город', 'дом'))
@@ -0,0 +1,204 @@
+# app/intake.py
+# Прием заявок на запись в детский сад. В день открытия записи заявки идут
+# тысячами в минуту, часть — повторные нажатия и переотправки. Запрос только
+# проверяет форму и добавляет строку в EnrollmentApplication: повтор той же
+# отправки (ключ key) или вторая действующая заявка на того же ребенка в тот
+# же сад (identity) отсекаются уникальными индексами и получают прежний номер;
+# после отказа или закрытой записи заявку можно подать снова. Child и
+# Enrollment из заявок создает воркер (intake_worker) пачками в одной
+# транзакции, поэтому основные таблицы не пишутся на каждый запрос.
+import hashlib
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import changefeed, fuzzy, prerender
+from .ages import age_in_months
+from .models import Child, Enrollment, EnrollmentApplication, Group
+from .text import name_key
+
+PENDING = 'новая'
+ACCEPTED = 'принята'
+DUPLICATE = 'повтор'
+NO_GROUP = 'без группы'
+CLOSED = 'закрыта'
+# Заявки, которые держат ключ ребенка (см. ограничение app_intake_identity_uniq)
+OPEN_STATUSES = (PENDING, ACCEPTED)
+
+WAITING = 'ожидание'
+ACTIVE = 'активна'
+
+
+class KeyReused(Exception):
+    """Ключ отправки уже использован заявкой с другими данными ребенка."""
+
+    def __init__(self, application):
+        super().__init__(application.receipt)
+        self.application = application
+
+
+def _child_key(last_name, first_name, birth_date):
+    # ФИО сводится к name_key, поэтому "Ёлкин" и "елкин " — один ребенок
+    return name_key(f'{last_name} {first_name}'), birth_date
+
+
+def child_identity(kindergarten_id, last_name, first_name, birth_date):
+    """Ключ заявки на ребенка в сад для ограничения app_intake_identity_uniq (EnrollmentApplication.identity)."""
+    name, birth_date = _child_key(last_name, first_name, birth_date)
+    return hashlib.sha256(f'{kindergarten_id}|{name}|{birth_date.isoformat()}'.encode()).hexdigest()
+
+
+def submit(kindergarten_id, key, data):
+    """Сохраняет заявку; возвращает (заявка, True) или (ранее принятая заявка, False).
+
+    data — очищенные данные EnrollmentApplicationForm без ключа. Если по ключу
+    уже сохранена заявка на другого ребенка или в другой сад (исправили форму
+    после обрыва связи), выбрасывает KeyReused.
+    """
+    identity = child_identity(
+        kindergarten_id, data['child_last_name'], data['child_first_name'], data['birth_date'],
+    )
+    application = EnrollmentApplication(kindergarten_id=kindergarten_id, key=key, identity=identity, **data)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                application.save(force_insert=True)
+            return application, True
+        except IntegrityError:
+            # Один INSERT на заявку; проверка дубля — только когда он сработал
+            existing = _existing(key, identity)
+            if existing is None:
+                raise
+            # Запись по прежней заявке уже закрыта — заявка подается заново
+            if not _close_finished(existing):
+                return existing, False
+    return existing, False
+
+
+def _existing(key, identity):
+    existing = EnrollmentApplication.objects.filter(key=key).first()
+    if existing is not None:
+        if existing.identity != identity:
+            raise KeyReused(existing)
+        return existing
+    return EnrollmentApplication.objects.filter(identity=identity, status__in=OPEN_STATUSES).first()
+
+
+def _close_finished(application):
+    """Закрывает принятую заявку, запись по которой завершена, отклонена или в архиве."""
+    if application.status != ACCEPTED or Enrollment.objects.filter(
+        pk=application.enrollment_id, status__in=(WAITING, ACTIVE),
+    ).exists():
+        return False
+    return EnrollmentApplication.objects.filter(pk=application.pk, status=ACCEPTED).update(status=CLOSED) > 0
+
+
+def _groups_by_kindergarten(kindergarten_ids):
+    groups = {}
+    rows = Group.objects.filter(kindergarten_id__in=kindergarten_ids).order_by('name', 'pk').values_list(
+        'pk', 'kindergarten_id', 'min_age_months', 'max_age_months',
+    )
+    for pk, kindergarten_id, min_age, max_age in rows:
+        groups.setdefault(kindergarten_id, []).append((pk, min_age, max_age))
+    return groups
+
+
+def _pick_group(groups, age):
+    """Первая по названию группа сада, подходящая по возрасту; группы без диапазона — в последнюю очередь."""
+    fallback = None
+    for pk, min_age, max_age in groups:
+        if min_age is None or max_age is None:
+            fallback = fallback or pk
+        elif min_age <= age < max_age:
+            return pk
+    return fallback
+
+
+def drain(batch_size=500, on_date=None):
+    """Разбирает до batch_size новых заявок в Child и Enrollment одной транзакцией.
+
+    Возвращает Counter статусов или None, если новых заявок нет. Ребенок
+    ищется среди существующих по name_key ФИО и дате рождения; запись
+    создается в статусе "ожидание" в подходящую по возрасту группу сада, места
+    потом распределяет allocate_waitlist. Рассчитан на один воркер.
+    """
+    on_date = on_date or timezone.localdate()
+    with transaction.atomic():
+        applications = list(EnrollmentApplication.objects.filter(status=PENDING).order_by('pk')[:batch_size])
+        if not applications:
+            return None
+
+        groups = _groups_by_kindergarten({a.kindergarten_id for a in applications})
+        children = {}
+        for pk, first_name, last_name, birth_date in Child.objects.filter(
+            birth_date__in={a.birth_date for a in applications},
+        ).order_by('pk').values_list('pk', 'first_name', 'last_name', 'birth_date'):
+            children.setdefault(_child_key(last_name, first_name, birth_date), pk)
+
+        placed = []
+        new_children = {}
+        for application in applications:
+            age = age_in_months(application.birth_date, on_date)
+            group_id = _pick_group(groups.get(application.kindergarten_id, []), age)
+            if group_id is None:
+                application.status = NO_GROUP
+                continue
+            child_key = _child_key(application.child_last_name, application.child_first_name, application.birth_date)
+            if child_key not in children and child_key not in new_children:
+                new_children[child_key] = Child(
+                    first_name=application.child_first_name.strip(),
+                    last_name=application.child_last_name.strip(),
+                    birth_date=application.birth_date,
+                    parent_contact=f'{application.parent_name}, {application.phone}'[:100],
+                )
+            placed.append((application, child_key, group_id))
+
+        Child.objects.bulk_create(new_children.values())
+        fuzzy.index_new_objects(new_children.values())
+        children.update((child_key, child.pk) for child_key, child in new_children.items())
+
+        # Ребенок уже ждет места или ходит в этот сад (любая группа) — заявка повторная;
+        # закрытая запись в выбранную группу открывается заново (child и group уникальны)
+        kindergarten_of_group = {pk: kg for kg, rows in groups.items() for pk, _, _ in rows}
+        enrolled, closed = {}, {}
+        for pk, child_id, group_id, kindergarten_id, status in Enrollment.objects.filter(
+            child_id__in={children[child_key] for _, child_key, _ in placed},
+            group__kindergarten_id__in=groups,
+        ).values_list('pk', 'child_id', 'group_id', 'group__kindergarten_id', 'status'):
+            if status in (WAITING, ACTIVE):
+                enrolled.setdefault((child_id, kindergarten_id), pk)
+            else:
+                closed[child_id, group_id] = pk
+
+        new_enrollments = {}
+        links = []
+        for application, child_key, group_id in placed:
+            slot = (children[child_key], kindergarten_of_group[group_id])
+            if slot in enrolled:
+                application.status = DUPLICATE
+                application.enrollment_id = enrolled[slot]
+                continue
+            application.status = DUPLICATE if slot in new_enrollments else ACCEPTED
+            new_enrollments.setdefault(slot, Enrollment(
+                pk=closed.get((slot[0], group_id)), child_id=slot[0], group_id=group_id, status=WAITING,
+            ))
+            links.append((application, slot))
+        created = [e for e in new_enrollments.values() if e.pk is None]
+        reopened = [e.pk for e in new_enrollments.values() if e.pk is not None]
+        Enrollment.objects.bulk_create(created)
+        changefeed.record(Enrollment, [e.pk for e in created], changefeed.CREATE)
+        if reopened:
+            # В конец очереди: дата записи — день повторной заявки
+            changefeed.update(Enrollment.objects.filter(pk__in=reopened), status=WAITING, enrollment_date=on_date)
+        for application, slot in links:
+            application.enrollment_id = new_enrollments[slot].pk
+
+        now = timezone.now()
+        for application in applications:
+            application.processed_at = now
+        EnrollmentApplication.objects.bulk_update(applications, ['status', 'enrollment_id', 'processed_at'])
+
+    if new_enrollments:
+        prerender.enqueue_kindergartens({kg for _, kg in new_enrollments}, include_list=False)
+    return Counter(application.status for application in applications)
@@ -0,0 +1,268 @@
+# app/leaderboard.py
+# Предрассчитанный рейтинг садов: общий и по районам. Балл — байесовское
+# среднее: к отзывам сада добавляется prior_weight "средних" отзывов с оценкой
+# prior_mean, поэтому сад с одной пятеркой не обгоняет сад с сотнями оценок
+# около 4.8. Места хранятся в LeaderboardEntry.rank, и страница списка —
+# это диапазон мест по индексу, без агрегации и сортировки всех садов.
+#
+# Порядок мест: рекомендуемые выше, затем балл по убыванию, затем id. При
+# записи отзывов сад переставляется на новое место сдвигом мест между старой
+# и новой позицией (update_kindergartens). prior_mean при этом не меняется —
+# его пересчитывает полная перестройка (rebuild, команда rebuild_leaderboard).
+from django.conf import settings
+from django.core import checks
+from django.db import connections, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Kindergarten, Leaderboard, LeaderboardEntry, Review, ReviewArchiveTotals
+
+OVERALL = ''
+
+# UPDATE ... FROM в _renumber_sql — с этой версии SQLite (Django 5.2 допускает 3.31)
+MIN_SQLITE_VERSION = (3, 33)
+
+
+def bayesian_score(count, rating_sum, prior_mean, prior_weight):
+    if count + prior_weight == 0:
+        return 0.0
+    return (prior_mean * prior_weight + rating_sum) / (prior_weight + count)
+
+
+def _totals(kindergarten_ids=None):
+    """{id сада: (район, рекомендуемый, отзывов, сумма оценок)} с учетом архива."""
+    kindergartens = Kindergarten.objects.order_by()
+    reviews = Review.objects.filter(is_held=False).order_by()
+    archived = ReviewArchiveTotals.objects.order_by()
+    if kindergarten_ids is not None:
+        kindergartens = kindergartens.filter(pk__in=kindergarten_ids)
+        reviews = reviews.filter(kindergarten_id__in=kindergarten_ids)
+        archived = archived.filter(kindergarten_id__in=kindergarten_ids)
+    counts = {
+        row['kindergarten_id']: (row['n'], row['s'])
+        for row in reviews.values('kindergarten_id').annotate(n=Count('id'), s=Sum('rating'))
+    }
+    for kindergarten_id, count, rating_sum in archived.values_list('kindergarten_id', 'count', 'rating_sum'):
+        n, s = counts.get(kindergarten_id, (0, 0))
+        counts[kindergarten_id] = (n + count, s + rating_sum)
+    return {
+        pk: (district, is_recommended, *counts.get(pk, (0, 0)))
+        for pk, district, is_recommended in kindergartens.values_list('pk', 'district', 'is_recommended')
+    }
+
+
+def _entry_values(totals, prior_mean, prior_weight):
+    district, is_recommended, count, rating_sum = totals
+    return {
+        'score': bayesian_score(count, rating_sum, prior_mean, prior_weight),
+        'is_recommended': is_recommended,
+        'reviews_count': count,
+        'average_rating': rating_sum / count if count else None,
+    }
+
+
+def _sort_key(kindergarten_id, values):
+    return (not values['is_recommended'], -values['score'], kindergarten_id)
+
+
+def rebuild():
+    """Пересчитывает все рейтинги заново; возвращает {район: садов}."""
+    totals = _totals()
+    count = sum(row[2] for row in totals.values())
+    rating_sum = sum(row[3] for row in totals.values())
+    prior_mean = rating_sum / count if count else 0.0
+    prior_weight = settings.LEADERBOARD_PRIOR_WEIGHT
+
+    members = {OVERALL: []}
+    for pk, row in totals.items():
+        values = _entry_values(row, prior_mean, prior_weight)
+        members[OVERALL].append((pk, values))
+        if row[0]:
+            members.setdefault(row[0], []).append((pk, values))
+
+    now = timezone.now()
+    with transaction.atomic():
+        Leaderboard.objects.exclude(district__in=members).delete()
+        for district, rows in members.items():
+            board, _ = Leaderboard.objects.update_or_create(district=district, defaults={
+                'prior_mean': prior_mean, 'prior_weight': prior_weight,
+                'size': len(rows), 'rebuilt_at': now,
+            })
+            board.entries.all().delete()
+            rows.sort(key=lambda item: _sort_key(*item))
+            LeaderboardEntry.objects.bulk_create([
+                LeaderboardEntry(board=board, kindergarten_id=pk, rank=rank, **values)
+                for rank, (pk, values) in enumerate(rows, start=1)
+            ], batch_size=1000)
+    return {district: len(rows) for district, rows in members.items()}
+
+
+def _remove(board, kindergarten_id):
+    entry = board.entries.filter(kindergarten_id=kindergarten_id).first()
+    if entry is None:
+        return
+    entry.delete()
+    board.entries.filter(rank__gt=entry.rank).update(rank=F('rank') - 1)
+    Leaderboard.objects.filter(pk=board.pk).update(size=F('size') - 1)
+
+
+def _place(board, kindergarten_id, values):
+    # Новое место = 1 + число других садов, которые идут раньше по ключу сортировки
+    ahead = Q(score__gt=values['score']) | Q(score=values['score'], kindergarten_id__lt=kindergarten_id)
+    if values['is_recommended']:
+        ahead = Q(is_recommended=True) & ahead
+    else:
+        ahead = Q(is_recommended=True) | (Q(is_recommended=False) & ahead)
+    rank = board.entries.filter(ahead).exclude(kindergarten_id=kindergarten_id).count() + 1
+
+    entry = board.entries.filter(kindergarten_id=kindergarten_id).first()
+    if entry is None:
+        board.entries.filter(rank__gte=rank).update(rank=F('rank') + 1)
+        LeaderboardEntry.objects.create(board=board, kindergarten_id=kindergarten_id, rank=rank, **values)
+        Leaderboard.objects.filter(pk=board.pk).update(size=F('size') + 1)
+        return
+    if rank < entry.rank:
+        board.entries.filter(rank__gte=rank, rank__lt=entry.rank).update(rank=F('rank') + 1)
+    elif rank > entry.rank:
+        board.entries.filter(rank__gt=entry.rank, rank__lte=rank).update(rank=F('rank') - 1)
+    LeaderboardEntry.objects.filter(pk=entry.pk).update(rank=rank, **values)
+
+
+def update_kindergartens(kindergarten_ids):
+    """Переставляет сады ids в рейтингах после изменения их отзывов или карточки.
+
+    Сады, которых больше нет, убираются из рейтингов. Если рейтинг еще ни разу
+    не строился, ничего не делает: первое построение — rebuild.
+    """
+    kindergarten_ids = set(kindergarten_ids)
+    if not kindergarten_ids:
+        return
+    with transaction.atomic():
+        overall = Leaderboard.objects.filter(district=OVERALL).first()
+        if overall is None:
+            return
+        totals = _totals(kindergarten_ids)
+        boards = {board.district: board for board in Leaderboard.objects.all()}
+        for kindergarten_id in sorted(kindergarten_ids):
+            row = totals.get(kindergarten_id)
+            targets = {OVERALL, row[0]} if row else set()
+            for board in Leaderboard.objects.filter(entries__kindergarten_id=kindergarten_id):
+                if board.district not in targets:
+                    _remove(board, kindergarten_id)
+            if row is None:
+                continue
+            values = _entry_values(row, overall.prior_mean, overall.prior_weight)
+            for district in targets:
+                if district not in boards:
+                    boards[district] = Leaderboard.objects.create(
+                        district=district, prior_mean=overall.prior_mean, prior_weight=overall.prior_weight,
+                    )
+                _place(boards[district], kindergarten_id, values)
+
+
+@checks.register(checks.Tags.database)
+def check_sqlite_version(app_configs, databases, **kwargs):
+    errors = []
+    for alias in databases or ():
+        connection = connections[alias]
+        if connection.vendor == 'sqlite' and connection.Database.sqlite_version_info < MIN_SQLITE_VERSION:
+            errors.append(checks.Error(
+                f'Рейтингу садов нужен SQLite {".".join(map(str, MIN_SQLITE_VERSION))} или новее '
+                f'(UPDATE ... FROM), установлен {connection.Database.sqlite_version}',
+                id='app.E001',
+            ))
+    return errors
+
+
+def _renumber_sql():
+    # Коррелированный подзапрос вместо FROM не годится: SQLite вычисляет его
+    # по строкам, уже измененным этим же UPDATE
+    quote = connections[LeaderboardEntry.objects.db].ops.quote_name
+    table, rank = quote(LeaderboardEntry._meta.db_table), quote('rank')
+    return (
+        f'UPDATE {table} SET {rank} = renumbered.new_rank FROM ('
+        f'SELECT {quote("id")}, ROW_NUMBER() OVER (ORDER BY {rank}) + %s AS new_rank '
+        f'FROM {table} WHERE {quote("board_id")} = %s AND {rank} > %s'
+        f') AS renumbered WHERE {table}.{quote("id")} = renumbered.{quote("id")} '
+        f'AND {table}.{rank} <> renumbered.new_rank'
+    )
+
+
+def remove_kindergartens(kindergarten_ids):
+    """Убирает сады из рейтингов (перед удалением садов).
+
+    Записи всех садов удаляются одним запросом, затем места каждого
+    затронутого рейтинга после первого освободившегося перенумеровываются
+    одним UPDATE с ROW_NUMBER(), а не сдвигом на каждый сад.
+    """
+    kindergarten_ids = list(kindergarten_ids)
+    if not kindergarten_ids:
+        return
+    with transaction.atomic():
+        entries = LeaderboardEntry.objects.filter(kindergarten_id__in=kindergarten_ids).order_by()
+        gaps = list(entries.values('board_id').annotate(first=Min('rank'), n=Count('id')).values_list(
+            'board_id', 'first', 'n',
+        ))
+        if not gaps:
+            return
+        entries._raw_delete(entries.db)
+        with connections[LeaderboardEntry.objects.db].cursor() as cursor:
+            for board_id, first, n in gaps:
+                cursor.execute(_renumber_sql(), [first - 1, board_id, first])
+                Leaderboard.objects.filter(pk=board_id).update(size=F('size') - n)
+
+
+def get_board(district=OVERALL):
+    return Leaderboard.objects.filter(district=district).first()
+
+
+def districts():
+    return list(
+        Leaderboard.objects.exclude(district=OVERALL).filter(size__gt=0)
+        .order_by('district').values_list('district', flat=True)
+    )
+
+
+class Ranking:
+    """Рейтинг как последовательность садов для Paginator.
+
+    Срез читает только строки своей страницы: по диапазону мест или, при
+    by_score, по индексу балла без учета отметки "рекомендуемый". У садов
+    заполнены те же аннотации, что в списке садов.
+    """
+
+    def __init__(self, board, by_score=False):
+        self.board = board
+        self.by_score = by_score
+
+    def count(self):
+        return self.board.size
+
+    def __len__(self):
+        return self.board.size
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop if index.stop is not None else self.board.size
+        entries = self.board.entries.all()
+        if self.by_score:
+            entries = entries.order_by('-score', 'kindergarten_id')[start:stop]
+        else:
+            entries = entries.filter(rank__gt=start, rank__lte=stop).order_by('rank')
+        entries = list(entries)
+        kindergartens = Kindergarten.objects.annotate(
+            groups_count_value=Count('group', distinct=True),
+            teachers_count_value=Count('kindergartenteacher', distinct=True),
+        ).in_bulk([entry.kindergarten_id for entry in entries])
+        page = []
+        for entry in entries:
+            kindergarten = kindergartens.get(entry.kindergarten_id)
+            if kindergarten is None:
+                continue
+            kindergarten.avg_rating_value = entry.average_rating
+            kindergarten.reviews_count = entry.reviews_count
+            kindergarten.rank = entry.rank
+            kindergarten.score = entry.score
+            page.append(kindergarten)
+        return page
@@ -0,0 +1,297 @@
+# app/loadtest.py
+# Нагрузочный тест через HTTP на стандартной библиотеке: сценарии ходят по
+# настоящим маршрутам (new/urls.py) запущенного сервера. Нагрузка открытая
+# (open-loop): запросы отправляются по расписанию с заданной частотой, не
+# дожидаясь ответов на предыдущие, поэтому задержка считается от момента,
+# когда запрос должен был уйти, и включает ожидание в очереди клиента.
+import http.cookiejar
+import json
+import math
+import queue
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.urls import Resolver404, resolve
+
+from .models import Child, Kindergarten, Review, Teacher
+
+# Имя родителя в отзывах, которые создает тест, — по нему их легко найти и удалить
+LOADTEST_NAME = 'Нагрузочный тест'
+
+DEFAULT_MIX = {
+    'browse': 35, 'detail': 30, 'reviews': 12, 'teachers': 12, 'review_post': 3, 'admin': 8,
+}
+
+_CSRF_INPUT = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+REVIEWS_PER_PAGE = 10
+TEACHERS_PER_PAGE = 12
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Перенаправление после POST — это ответ сервера, а не новый запрос сценария
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Session:
+    """Виртуальный пользователь: свои cookies, CSRF-токен и вход в админку."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect,
+        )
+        self.csrf_token = None
+        self.admin_logged_in = False
+
+    def request(self, method, path, data=None):
+        """(статус, тело); сетевые ошибки возвращаются как статус 0."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if body is not None:
+            request.add_header('Content-Type', 'application/x-www-form-urlencoded')
+            request.add_header('Referer', self.base_url + path)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, OSError):
+            return 0, b''
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+
+    def add(self, stage, route, latency, status, ok):
+        with self._lock:
+            self.latencies[stage, route].append(latency)
+            self.statuses[stage, route][status] += 1
+            if not ok:
+                self.errors[stage, route] += 1
+
+
+def route_name(method, path):
+    try:
+        return f'{method} {resolve(urllib.parse.urlsplit(path).path).view_name}'
+    except Resolver404:
+        return f'{method} {path}'
+
+
+def percentile(sorted_values, fraction):
+    # Ближайший ранг: значение, не меньше которого доля fraction всех значений
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+class Workload:
+    """Данные для сценариев (id, поисковые слова, число страниц) и сами сценарии."""
+
+    def __init__(self, admin_credentials=None, seed=None):
+        self.random = random.Random(seed)
+        self.kindergarten_ids = list(Kindergarten.objects.order_by('?').values_list('pk', flat=True)[:1000])
+        words = set()
+        for name in Kindergarten.objects.values_list('name', flat=True)[:1000]:
+            words.update(word for word in re.findall(r'\w+', name) if len(word) > 3)
+        self.search_words = sorted(words) or ['сад']
+        self.child_names = list(Child.objects.order_by('?').values_list('last_name', flat=True)[:200]) or ['Иванов']
+        self.review_pages = max(math.ceil(Review.objects.filter(is_held=False).count() / REVIEWS_PER_PAGE), 1)
+        self.teacher_pages = max(math.ceil(Teacher.objects.count() / TEACHERS_PER_PAGE), 1)
+        self.admin_credentials = admin_credentials
+        if not self.kindergarten_ids:
+            raise ValueError('В базе нет детских садов — нечего нагружать')
+
+    def choice(self, values):
+        return self.random.choice(values)
+
+    def browse(self, session, record):
+        params = {}
+        if self.random.random() < 0.4:
+            params['search'] = self.choice(self.search_words)
+        if self.random.random() < 0.5:
+            params['sort'] = self.choice(['rating', 'name', 'capacity', 'recommended'])
+        record(session, 'GET', '/' + ('?' + urllib.parse.urlencode(params) if params else ''))
+
+    def detail(self, session, record):
+        record(session, 'GET', f'/kindergartens/{self.choice(self.kindergarten_ids)}/')
+
+    def reviews(self, session, record):
+        params = {'page': self.random.randint(1, self.review_pages)}
+        if self.random.random() < 0.3:
+            params = {'kindergarten': self.choice(self.kindergarten_ids)}
+        record(session, 'GET', '/reviews/?' + urllib.parse.urlencode(params))
+
+    def teachers(self, session, record):
+        record(session, 'GET', f'/teachers/?page={self.random.randint(1, self.teacher_pages)}')
+
+    def review_post(self, session, record):
+        if session.csrf_token is None:
+            status, body = record(session, 'GET', '/reviews/')
+            match = _CSRF_INPUT.search(body)
+            if match is None:
+                return
+            session.csrf_token = match.group(1).decode()
+        record(session, 'POST', '/reviews/', {
+            'csrfmiddlewaretoken': session.csrf_token,
+            'add_review': '1',
+            'kindergarten': self.choice(self.kindergarten_ids),
+            'parent_name': LOADTEST_NAME,
+            'rating': self.random.randint(1, 5),
+            'comment': 'Отзыв, созданный нагрузочным тестом.',
+        }, expected=(302,))
+
+    def admin(self, session, record):
+        if self.admin_credentials is None:
+            return
+        if not session.admin_logged_in:
+            status, body = record(session, 'GET', '/admin/login/')
+            match = _CSRF_INPUT.search(body)
+            if match is None:
+                return
+            username, password = self.admin_credentials
+            status, _ = record(session, 'POST', '/admin/login/', {
+                'csrfmiddlewaretoken': match.group(1).decode(),
+                'username': username, 'password': password, 'next': '/admin/',
+            }, expected=(302,))
+            session.admin_logged_in = status == 302
+            if not session.admin_logged_in:
+                return
+        path = self.choice([
+            '/admin/app/kindergarten/',
+            '/admin/app/kindergarten/?o=7',
+            '/admin/app/enrollment/?' + urllib.parse.urlencode({'status__exact': 'ожидание'}),
+            '/admin/app/review/',
+            '/admin/app/child/?' + urllib.parse.urlencode({'q': self.choice(self.child_names)}),
+        ])
+        record(session, 'GET', path)
+
+
+def run(base_url, rates, duration, mix=None, concurrency=64, timeout=30.0,
+        admin_credentials=None, seed=None, ramp_callback=None):
+    """Прогоняет ступени нагрузки rates (запросов сценариев в секунду) по duration секунд.
+
+    Возвращает отчет (dict) для сериализации в JSON.
+    """
+    mix = {name: weight for name, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+    if admin_credentials is None:
+        mix.pop('admin', None)
+    workload = Workload(admin_credentials, seed)
+    scenarios = [getattr(workload, name) for name in mix]
+    weights = list(mix.values())
+    recorder = Recorder()
+    sessions = queue.SimpleQueue()
+    schedule_random = random.Random(seed)
+
+    def execute(stage, scenario, scheduled):
+        try:
+            session = sessions.get_nowait()
+        except queue.Empty:
+            session = Session(base_url, timeout)
+        # Первый запрос сценария отсчитывается от времени по расписанию,
+        # следующие (например, POST после GET за токеном) — от своего начала
+        start = [scheduled]
+
+        def record(session, method, path, data=None, expected=None):
+            status, body = session.request(method, path, data)
+            finished = time.monotonic()
+            ok = status in expected if expected else 200 <= status < 400
+            recorder.add(stage, route_name(method, path), finished - start[0], status, ok)
+            start[0] = finished
+            return status, body
+
+        try:
+            scenario(session, record)
+        except Exception:
+            # Ошибка в самом сценарии (например, неожиданный ответ) — тоже ошибка
+            recorder.add(stage, f'ERROR {scenario.__name__}', time.monotonic() - start[0], 0, False)
+        finally:
+            sessions.put(session)
+
+    stages = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for stage, rate in enumerate(rates):
+            if ramp_callback:
+                ramp_callback(stage, rate)
+            stage_start = time.monotonic()
+            count = int(rate * duration)
+            scheduled = stage_start
+            for _ in range(count):
+                # Пуассоновский поток: экспоненциальные интервалы между запросами
+                scheduled += schedule_random.expovariate(rate)
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                scenario = schedule_random.choices(scenarios, weights)[0]
+                executor.submit(execute, stage, scenario, scheduled)
+            stages.append({'target_rps': rate, 'duration_s': duration, 'scheduled': count})
+        # Ждем ответы на все отправленные запросы
+    return _report(base_url, mix, concurrency, stages, recorder)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def _summary(latencies, errors, statuses, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round((count - errors) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': _ms(percentile(latencies, 0.50)),
+        'p95_ms': _ms(percentile(latencies, 0.95)),
+        'p99_ms': _ms(percentile(latencies, 0.99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+    }
+
+
+def _report(base_url, mix, concurrency, stages, recorder):
+    result_stages = []
+    for stage, info in enumerate(stages):
+        elapsed = info['duration_s']
+        routes = {}
+        all_latencies, all_errors, all_statuses = [], 0, Counter()
+        for (stage_index, route), latencies in sorted(recorder.latencies.items()):
+            if stage_index != stage:
+                continue
+            errors = recorder.errors[stage_index, route]
+            statuses = recorder.statuses[stage_index, route]
+            routes[route] = _summary(latencies, errors, statuses, elapsed)
+            all_latencies.extend(latencies)
+            all_errors += errors
+            all_statuses.update(statuses)
+        result_stages.append({
+            'target_rps': info['target_rps'],
+            'duration_s': elapsed,
+            'scenarios_scheduled': info['scheduled'],
+            'total': _summary(all_latencies, all_errors, all_statuses, elapsed),
+            'routes': routes,
+        })
+    return {
+        'base_url': base_url,
+        'mix': mix,
+        'concurrency': concurrency,
+        'stages': result_stages,
+    }
+
+
+def dumps(report):
+    return json.dumps(report, ensure_ascii=False, indent=2)
@@ -0,0 +1,18 @@
+# app/lookups.py
+# Лёгкие закэшированные справочники для выпадающих списков.
+from django.core.cache import cache
+
+from .caching import namespaced_key
+from .models import Kindergarten
+
+KINDERGARTEN_CHOICES_NAMESPACE = 'kindergarten-choices'
+
+
+def kindergarten_choices():
+    """Список {'id', 'name'} всех садов в порядке названия."""
+    key = namespaced_key(KINDERGARTEN_CHOICES_NAMESPACE, 'all')
+    choices = cache.get(key)
+    if choices is None:
+        choices = list(Kindergarten.objects.order_by('name').values('id', 'name'))
+        cache.set(key, choices, None)
+    return choices
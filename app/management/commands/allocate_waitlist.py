@@ -0,0 +1,46 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import Enrollment, Group
+from app.waitlist import allocate_waitlist
+
+
+class Command(BaseCommand):
+    help = 'Распределяет очередь ожидания по группам со свободными местами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать отчет, ничего не менять')
+        parser.add_argument('--date', help='Дата расчета возраста (ГГГГ-ММ-ДД), по умолчанию сегодня')
+        parser.add_argument('--kindergarten', type=int, help='Обработать только один детский сад')
+        parser.add_argument('--details', type=int, default=0, metavar='N',
+                            help='Вывести первые N решений')
+
+    def handle(self, *args, **options):
+        on_date = None
+        if options['date']:
+            try:
+                on_date = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('Дата должна быть в формате ГГГГ-ММ-ДД')
+
+        enrollments = None
+        if options['kindergarten']:
+            enrollments = Enrollment.objects.filter(group__kindergarten_id=options['kindergarten'])
+
+        report = allocate_waitlist(enrollments, on_date=on_date, dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(report.summary()))
+
+        if options['details']:
+            decisions = report.decisions[:options['details']]
+            group_ids = {d.from_group_id for d in decisions} | {d.to_group_id for d in decisions}
+            groups = Group.objects.select_related('kindergarten').in_bulk(group_ids - {None})
+            for decision in decisions:
+                if decision.to_group_id is None:
+                    outcome = f'в очереди ({decision.reason})'
+                else:
+                    outcome = f'зачислен в {groups[decision.to_group_id]}'
+                self.stdout.write(
+                    f'  заявка #{decision.enrollment_id}, ребенок #{decision.child_id}: {outcome}'
+                )
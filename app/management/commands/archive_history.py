@@ -0,0 +1,53 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app import archive
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые отзывы и закрытые записи в группы в архивные таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--review-days', type=int, default=3 * 365, metavar='N',
+                            help='Архивировать отзывы старше N дней (по умолчанию 3 года)')
+        parser.add_argument('--enrollment-days', type=int, default=365, metavar='N',
+                            help='Архивировать закрытые записи, поданные более N дней назад')
+        parser.add_argument('--status', action='append', dest='statuses',
+                            choices=archive.ARCHIVED_ENROLLMENT_STATUSES,
+                            help='Статусы записей для архивации (можно повторять), по умолчанию все закрытые')
+        parser.add_argument('--skip-reviews', action='store_true')
+        parser.add_argument('--skip-enrollments', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать строки, ничего не переносить')
+        parser.add_argument('--rebuild-totals', action='store_true',
+                            help='Пересчитать итоги архива отзывов по архивной таблице')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+
+        if options['rebuild_totals']:
+            archive.rebuild_review_totals()
+            self.stdout.write(self.style.SUCCESS('Итоги архива отзывов пересчитаны'))
+
+        if not options['skip_reviews']:
+            reviews = archive.cold_reviews(now - datetime.timedelta(days=options['review_days']))
+            if options['dry_run']:
+                self.stdout.write(f'Отзывов к переносу: {reviews.count()}')
+            else:
+                count = archive.archive_reviews(reviews, batch_size=batch_size)
+                self.stdout.write(self.style.SUCCESS(f'Перенесено отзывов: {count}'))
+
+        if not options['skip_enrollments']:
+            enrollments = archive.cold_enrollments(
+                now.date() - datetime.timedelta(days=options['enrollment_days']),
+                statuses=options['statuses'] or archive.ARCHIVED_ENROLLMENT_STATUSES,
+            )
+            if options['dry_run']:
+                self.stdout.write(f'Записей к переносу: {enrollments.count()}')
+            else:
+                count = archive.archive_enrollments(enrollments, batch_size=batch_size)
+                self.stdout.write(self.style.SUCCESS(f'Перенесено записей: {count}'))
@@ -0,0 +1,145 @@
+import datetime
+import statistics
+import subprocess
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.template.backends.django import DjangoTemplates
+from django.template.loader import engines
+from django.urls import resolve
+
+from app import prerender, views
+from app.models import Kindergarten
+
+TEMPLATE_DIR = 'app/templates'
+
+
+def default_paths():
+    kindergarten = Kindergarten.objects.annotate(n=Count('group')).order_by('-n').first()
+    birth_date = datetime.date.today() - datetime.timedelta(days=4 * 365)
+    paths = [prerender.list_path(), '/reviews/', '/teachers/', f'/groups/free-seats/?birth_date={birth_date}']
+    if kindergarten is not None:
+        paths.insert(1, prerender.detail_path(kindergarten.pk))
+    return paths
+
+
+def make_request(path):
+    path, _, query = path.partition('?')
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META.update({'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'QUERY_STRING': query})
+    request.GET = QueryDict(query)
+    request.resolver_match = resolve(path)
+    request.user = AnonymousUser()
+    return request
+
+
+def capture_render(path):
+    """(имя шаблона, контекст, запрос), с которыми представление отрисовывает path."""
+    request = make_request(path)
+    captured = []
+
+    def render(request, template_name, context=None, *args, **kwargs):
+        captured.append((template_name, context or {}, request))
+        return HttpResponse()
+
+    with mock.patch.object(views, 'render', render):
+        match = request.resolver_match
+        match.func(request, *match.args, **match.kwargs)
+    if not captured:
+        raise CommandError(f'{path}: представление не отрисовало шаблон')
+    return captured[0]
+
+
+def make_engine(loaders):
+    return DjangoTemplates({
+        'NAME': 'benchmark',
+        'DIRS': [],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'context_processors': settings.TEMPLATES[0]['OPTIONS']['context_processors'],
+            'loaders': loaders,
+        },
+    })
+
+
+def git_templates(ref):
+    """{имя: исходный текст} шаблонов приложения в ревизии ref."""
+    def git(*args):
+        try:
+            return subprocess.run(
+                ['git', *args], cwd=settings.BASE_DIR, capture_output=True, check=True, text=True,
+            ).stdout
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise CommandError(f'git {" ".join(args)}: {getattr(e, "stderr", "") or e}')
+
+    sources = {}
+    for name in git('ls-tree', '-r', '--name-only', ref, '--', TEMPLATE_DIR + '/').splitlines():
+        sources[name[len(TEMPLATE_DIR) + 1:]] = git('show', f'{ref}:{name}')
+    return sources
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Время отрисовки шаблонов страниц каталога: контекст берется из настоящих '
+            'представлений, затем шаблон отрисовывается --repeat раз. С --baseline-ref '
+            'рядом выводится время шаблонов из указанной ревизии git (до изменений)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Страницы (по умолчанию список, карточка, отзывы, '
+                                                     'воспитатели и свободные места)')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--baseline-ref', help='Ревизия git для сравнения, например HEAD~1')
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        variants = [('после', engines['django'])]
+        # Без кэширующего загрузчика шаблон читается и компилируется при каждой отрисовке
+        variants.append(('без кэша', make_engine([
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ])))
+        if options['baseline_ref']:
+            variants.insert(0, ('до', make_engine([
+                ('django.template.loaders.cached.Loader', [
+                    ('django.template.loaders.locmem.Loader', git_templates(options['baseline_ref'])),
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ])))
+
+        self.stdout.write(f'{"страница":<40} {"шаблон":<26}' + ''.join(f'{name:>22}' for name, _ in variants))
+        for path in options['paths'] or default_paths():
+            template_name, context, request = capture_render(path)
+            cells = []
+            for _, engine in variants:
+                median, queries = self.measure(engine, template_name, context, request, repeat)
+                cells.append(f'{median:.2f} мс, SQL {queries}')
+            self.stdout.write(f'{path:<40} {template_name:<26}' + ''.join(f'{cell:>22}' for cell in cells))
+
+    def measure(self, engine, template_name, context, request, repeat):
+        # Первая отрисовка прогревает кэш шаблонов и ленивые querysets контекста
+        engine.get_template(template_name).render(context, request)
+        timings = []
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            for _ in range(repeat):
+                start = time.perf_counter()
+                engine.get_template(template_name).render(context, request)
+                timings.append((time.perf_counter() - start) * 1000)
+        # Медиана времени и число SQL-запросов за одну отрисовку
+        return statistics.median(timings), counter.count // repeat
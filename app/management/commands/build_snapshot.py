@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Собирает или обновляет по журналу изменений снимок публичного каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Файл снимка (по умолчанию CATALOGUE_SNAPSHOT_PATH)')
+        parser.add_argument('--full', action='store_true', help='Собрать заново, а не обновить')
+        parser.add_argument('--verify', action='store_true', help='Только проверить sha256 снимка')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['verify']:
+            if not snapshot.verify(path):
+                raise CommandError('Снимок не совпадает с манифестом или не найден')
+            self.stdout.write(self.style.SUCCESS('Снимок совпадает с манифестом'))
+            return
+        manifest = snapshot.build(path) if options['full'] else snapshot.refresh(path)
+        if manifest is None:
+            self.stdout.write('Изменений нет, снимок не обновлялся')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок версии {manifest["version"]}: {manifest["size"]} байт, sha256 {manifest["sha256"][:12]}'
+        ))
@@ -0,0 +1,41 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import changefeed
+
+
+class Command(BaseCommand):
+    help = ('Выводит события журнала изменений после номера --since построчно в JSON. '
+            'Номер, с которого продолжать чтение, выводится в stderr')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=int, default=0, help='Последний прочитанный номер события')
+        parser.add_argument('--limit', type=int, default=0, metavar='N', help='Не больше N событий (0 — все)')
+        parser.add_argument('--model', action='append', choices=sorted(changefeed.LABELS.values()),
+                            help='Только события модели; можно указать несколько раз')
+        parser.add_argument('--follow', action='store_true', help='Ждать новые события, как tail -f')
+        parser.add_argument('--interval', type=float, default=2.0, help='Пауза между опросами при --follow, с')
+
+    def handle(self, *args, **options):
+        if options['since'] < 0 or options['limit'] < 0:
+            raise CommandError('--since и --limit не могут быть отрицательными')
+        cursor, left = options['since'], options['limit'] or None
+        try:
+            while True:
+                page = changefeed.read(cursor, min(left or changefeed.MAX_PAGE, changefeed.MAX_PAGE), options['model'])
+                for event in page['events']:
+                    self.stdout.write(json.dumps(event, ensure_ascii=False))
+                cursor = page['next']
+                if left is not None:
+                    left -= len(page['events'])
+                    if not left:
+                        break
+                if not page['has_more']:
+                    if not options['follow']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stderr.write(f'next: {cursor}')
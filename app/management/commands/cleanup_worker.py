@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import media
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из MEDIA_ROOT файлы из очереди удаления'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и выйти')
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help='Пауза между проверками пустой очереди, секунд')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            results = media.sweep(options['batch_size'])
+            if results:
+                deleted, kept = results
+                self.stdout.write(f'удалено файлов: {deleted}, снова используются: {kept}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import duplicates, leaderboard, prerender
+from app.models import Review
+from app.signals import refresh_derived
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает индекс MinHash отзывов и находит группы почти одинаковых текстов. '
+            'Группы видны в админке отзывов (фильтр "Похожие отзывы")')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=duplicates.THRESHOLD,
+                            help=f'Минимальное сходство текстов от 0 до 1 (по умолчанию {duplicates.THRESHOLD})')
+        parser.add_argument('--hold', action='store_true',
+                            help='Снять с публикации все отзывы группы, кроме самого раннего')
+        parser.add_argument('--dry-run', action='store_true', help='Только вывести группы, ничего не записывая')
+        parser.add_argument('--limit', type=int, default=20, metavar='N',
+                            help='Вывести на экран первые N групп')
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('Порог сходства должен быть в диапазоне (0, 1]')
+
+        started = time.perf_counter()
+        signatures = duplicates.signatures() if options['dry_run'] else duplicates.rebuild_index()
+        clusters = duplicates.find_clusters(signatures, threshold=options['threshold'])
+        total = sum(len(members) for _, members in clusters)
+        self.stdout.write(self.style.SUCCESS(
+            f'Отзывов: {len(signatures)}, групп похожих: {len(clusters)}, отзывов в них: {total} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
+
+        if not options['dry_run']:
+            kindergarten_ids = duplicates.assign_clusters(clusters, hold=options['hold'])
+            if kindergarten_ids:
+                refresh_derived(Review)
+                leaderboard.update_kindergartens(kindergarten_ids)
+                prerender.enqueue_kindergartens(kindergarten_ids)
+                self.stdout.write(f'Сняты с публикации отзывы {len(kindergarten_ids)} садов')
+
+        shown = clusters[:options['limit']]
+        reviews = Review.objects.select_related('kindergarten').in_bulk([pk for _, members in shown for pk in members])
+        for number, (score, members) in enumerate(shown, start=1):
+            self.stdout.write(f'{number}. группа #{members[0]}, отзывов {len(members)}, сходство {score:.2f}')
+            for pk in members[:5]:
+                review = reviews[pk]
+                comment = ' '.join(review.comment.split())
+                self.stdout.write(f'  #{pk} {review.kindergarten.name}: {review.parent_name}, «{comment[:70]}»')
+            if len(members) > 5:
+                self.stdout.write(f'  … и еще {len(members) - 5}')
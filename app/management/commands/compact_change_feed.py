@@ -0,0 +1,20 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app import changefeed
+
+
+class Command(BaseCommand):
+    help = ('Сжимает журнал изменений: у событий старше --days для каждого объекта остается '
+            'только последнее (с объединенными полями). Номера событий не меняются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Сжимать события старше стольких дней')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days не может быть отрицательным')
+        removed = changefeed.compact(timezone.now() - datetime.timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено событий: {removed}'))
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from app import changefeed, media, prerender
+from app.storage import ContentAddressedStorage, hash_chunks, is_content_name
+
+
+class Command(BaseCommand):
+    help = ('Переводит загруженные файлы в хранилище по содержимому: одинаковые файлы '
+            'сливаются в один, записи переключаются на новые имена, старые файлы ставятся в очередь удаления')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать дубликаты и освобождаемое место')
+
+    def handle(self, *args, **options):
+        for model, field in media.file_fields():
+            storage = field.storage
+            if not isinstance(storage, ContentAddressedStorage):
+                continue
+            names = (
+                model._default_manager.order_by().exclude(**{field.name: ''})
+                .values_list(field.name, flat=True).distinct()
+            )
+            legacy = [name for name in names.iterator() if not is_content_name(name)]
+            label = f'{model._meta.label}.{field.name}'
+            if options['dry_run']:
+                self.report(label, storage, legacy)
+            else:
+                self.convert(label, model, field, storage, legacy)
+
+        if not options['dry_run']:
+            counts = media.rebuild_blob_counts()
+            self.stdout.write(self.style.SUCCESS(f'Файлов в хранилище со ссылками: {len(counts)}'))
+
+    def report(self, label, storage, names):
+        by_digest = defaultdict(list)
+        missing = 0
+        for name in names:
+            if not storage.exists(name):
+                missing += 1
+                continue
+            with storage.open(name) as f:
+                by_digest[hash_chunks(f.chunks())].append(name)
+        duplicates = sum(len(group) - 1 for group in by_digest.values())
+        reclaimable = sum(
+            storage.size(name) for group in by_digest.values() for name in group[1:]
+        )
+        self.stdout.write(
+            f'{label}: старых файлов {len(names)}, уникальных {len(by_digest)}, '
+            f'дубликатов {duplicates} ({reclaimable / 1024 / 1024:.1f} МБ), нет на диске {missing}'
+        )
+
+    def convert(self, label, model, field, storage, names):
+        converted = missing = 0
+        paths = set()
+        for name in names:
+            if not storage.exists(name):
+                missing += 1
+                continue
+            with storage.open(name) as f:
+                new_name = storage.save(name, f)
+            rows = model._default_manager.filter(**{field.name: name})
+            if model in prerender.DEPENDENT_MODELS:
+                paths.update(path for obj in rows for path in prerender.affected_paths(obj))
+            changefeed.update(rows, **{field.name: new_name})
+            converted += 1
+        # Старые файлы удаляет cleanup_worker, а не команда: опубликованные
+        # статические страницы ссылаются на них, пока не будут перерисованы
+        prerender.enqueue(paths)
+        media.enqueue_files(names)
+        self.stdout.write(f'{label}: переименовано файлов {converted}, нет на диске {missing}')
@@ -0,0 +1,60 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.fuzzy import find_duplicate_children
+from app.models import Child
+
+
+class Command(BaseCommand):
+    help = 'Отчет о возможных дублях детей: похожие ФИО (с учетом транслитерации) и одна дата рождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=0.7,
+                            help='Минимальное сходство ФИО от 0 до 1 (по умолчанию 0.7)')
+        parser.add_argument('--ignore-birth-date', action='store_true',
+                            help='Сравнивать детей с разными датами рождения')
+        parser.add_argument('--csv', metavar='PATH', help='Сохранить отчет в CSV-файл')
+        parser.add_argument('--limit', type=int, default=50, metavar='N',
+                            help='Вывести на экран первые N групп дублей')
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('Порог сходства должен быть в диапазоне (0, 1]')
+
+        clusters = find_duplicate_children(
+            threshold=options['threshold'],
+            same_birth_date=not options['ignore_birth_date'],
+        )
+        children = Child.objects.in_bulk([pk for _, members in clusters for pk in members])
+        total = sum(len(members) for _, members in clusters)
+        self.stdout.write(self.style.SUCCESS(
+            f'Найдено групп возможных дублей: {len(clusters)}, детей в них: {total}'
+        ))
+
+        if options['csv']:
+            self.write_csv(options['csv'], clusters, children)
+
+        for number, (score, members) in enumerate(clusters[:options['limit']], start=1):
+            self.stdout.write(f'{number}. сходство {score:.2f}')
+            for pk in members:
+                child = children[pk]
+                self.stdout.write(
+                    f'  #{pk} {child.last_name} {child.first_name}, {child.birth_date:%d.%m.%Y}, {child.parent_contact}'
+                )
+
+    def write_csv(self, path, clusters, children):
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['cluster', 'score', 'child_id', 'last_name', 'first_name', 'birth_date', 'parent_contact'])
+                for number, (score, members) in enumerate(clusters, start=1):
+                    for pk in members:
+                        child = children[pk]
+                        writer.writerow([
+                            number, f'{score:.3f}', pk, child.last_name, child.first_name,
+                            child.birth_date.isoformat(), child.parent_contact,
+                        ])
+        except OSError as e:
+            raise CommandError(f'Не удалось записать отчет: {e}')
+        self.stdout.write(f'Отчет сохранен в {path}')
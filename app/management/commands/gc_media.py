@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from app import media
+
+
+class Command(BaseCommand):
+    help = 'Находит и удаляет файлы в каталогах загрузки, на которые не ссылается ни одна запись'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help='Не трогать файлы моложе N часов (загрузки в процессе)')
+        parser.add_argument('--dry-run', action='store_true', help='Только вывести список')
+        parser.add_argument('--queue', action='store_true',
+                            help='Поставить файлы в очередь cleanup_worker вместо удаления')
+
+    def handle(self, *args, **options):
+        orphans = list(media.orphaned_files(datetime.timedelta(hours=options['min_age_hours'])))
+        size = sum(media.storage_for(name).size(name) for name in orphans)
+        if options['dry_run']:
+            for name in orphans:
+                self.stdout.write(name)
+        elif options['queue']:
+            media.enqueue_files(orphans)
+        else:
+            for name in orphans:
+                media.storage_for(name).delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без ссылок: {len(orphans)}, {size / 1024 / 1024:.1f} МБ'
+        ))
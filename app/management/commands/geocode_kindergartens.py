@@ -0,0 +1,74 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import changefeed, geo
+from app.models import Kindergarten
+
+
+class Command(BaseCommand):
+    help = 'Проставляет координаты детским садам по офлайн-газеттиру адресов (CSV: address, latitude, longitude)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('gazetteer', help='Путь к CSV-файлу газеттира')
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Перезаписать уже заданные координаты')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--delimiter', default=',')
+
+    def handle(self, *args, **options):
+        gazetteer = self.load_gazetteer(options['gazetteer'], options['delimiter'])
+        self.stdout.write(f'Загружено адресов из газеттира: {len(gazetteer)}')
+
+        kindergartens = Kindergarten.objects.only('address', 'latitude', 'longitude')
+        if not options['overwrite']:
+            kindergartens = kindergartens.filter(latitude__isnull=True)
+
+        batch, updated, missing = [], 0, []
+        for kindergarten in kindergartens.iterator(chunk_size=options['batch_size']):
+            point = gazetteer.get(geo.normalize_address(kindergarten.address))
+            if point is None:
+                missing.append(kindergarten)
+                continue
+            kindergarten.latitude, kindergarten.longitude = point
+            batch.append(kindergarten)
+            if len(batch) >= options['batch_size']:
+                updated += self.flush(batch)
+        updated += self.flush(batch)
+
+        # bulk_update не отправляет сигналы, поэтому индекс сбрасываем явно
+        if updated:
+            geo.invalidate_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Обновлено координат: {updated}'))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'Не найдено в газеттире: {len(missing)}'))
+            for kindergarten in missing[:20]:
+                self.stdout.write(f'  #{kindergarten.pk}: {kindergarten.address}')
+
+    def load_gazetteer(self, path, delimiter):
+        gazetteer = {}
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f, delimiter=delimiter)
+                missing_columns = {'address', 'latitude', 'longitude'} - set(reader.fieldnames or ())
+                if missing_columns:
+                    raise CommandError(f'В газеттире нет колонок: {", ".join(sorted(missing_columns))}')
+                for line, row in enumerate(reader, start=2):
+                    point = geo.parse_point(row['latitude'], row['longitude'])
+                    if point is None:
+                        self.stderr.write(f'Строка {line}: некорректные координаты, пропущена')
+                        continue
+                    gazetteer[geo.normalize_address(row['address'])] = point
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать газеттир: {e}')
+        return gazetteer
+
+    def flush(self, batch):
+        count = len(batch)
+        if batch:
+            Kindergarten.objects.bulk_update(batch, ['latitude', 'longitude'])
+            changefeed.record(Kindergarten, [kindergarten.pk for kindergarten in batch],
+                              changefeed.UPDATE, ['latitude', 'longitude'])
+            batch.clear()
+        return count
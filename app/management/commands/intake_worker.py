@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import intake
+
+
+class Command(BaseCommand):
+    help = 'Разбирает заявки на запись с сайта в детей и записи в группы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и выйти')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между проверками пустой очереди, секунд')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            results = intake.drain(options['batch_size'])
+            if results:
+                self.stdout.write(', '.join(f'{status}: {count}' for status, count in results.most_common()))
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
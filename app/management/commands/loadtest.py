@@ -0,0 +1,85 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app import loadtest
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in loadtest.DEFAULT_MIX:
+            raise CommandError(f'Неизвестный сценарий "{name}", есть: {", ".join(loadtest.DEFAULT_MIX)}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Вес сценария "{name}" должен быть числом')
+    return mix
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера: открытая нагрузка ступенями, '
+            'отчет по маршрутам (RPS, p50/p95/p99, доля ошибок) в JSON. '
+            f'Сценарий review_post создает отзывы от имени "{loadtest.LOADTEST_NAME}".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--rates', default='5,10,20,40',
+                            help='Ступени нагрузки, сценариев в секунду, через запятую')
+        parser.add_argument('--duration', type=float, default=30.0, help='Длительность ступени, секунд')
+        parser.add_argument('--mix', type=parse_mix,
+                            help='Веса сценариев, например browse=40,detail=30,review_post=0 '
+                                 f'(по умолчанию {",".join(f"{k}={v}" for k, v in loadtest.DEFAULT_MIX.items())})')
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help='Максимум одновременных запросов клиента')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--admin-user', help='Пользователь для сценария admin (без него сценарий пропускается)')
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--label', default='', help='Метка прогона в отчете (например, версия сборки)')
+        parser.add_argument('--output', help='Файл для JSON-отчета (по умолчанию вывод в консоль)')
+
+    def handle(self, *args, **options):
+        try:
+            rates = [float(rate) for rate in options['rates'].split(',')]
+        except ValueError:
+            raise CommandError('--rates: числа через запятую')
+        if any(rate <= 0 for rate in rates):
+            raise CommandError('--rates: частота должна быть больше нуля')
+
+        admin_credentials = None
+        if options['admin_user']:
+            password = os.environ.get('LOADTEST_ADMIN_PASSWORD')
+            if not password:
+                raise CommandError('Пароль администратора передается в LOADTEST_ADMIN_PASSWORD')
+            admin_credentials = (options['admin_user'], password)
+
+        started_at = timezone.now()
+
+        def progress(stage, rate):
+            self.stderr.write(f'ступень {stage + 1}/{len(rates)}: {rate:g} сценариев/с')
+
+        try:
+            report = loadtest.run(
+                options['base_url'], rates, options['duration'], mix=options['mix'],
+                concurrency=options['concurrency'], timeout=options['timeout'],
+                admin_credentials=admin_credentials, seed=options['seed'], ramp_callback=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        report = {'label': options['label'], 'started_at': started_at.isoformat(), **report}
+
+        output = loadtest.dumps(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            for stage in report['stages']:
+                total = stage['total']
+                self.stderr.write(
+                    f'{stage["target_rps"]:g}/с: {total["throughput_rps"]} ответов/с, '
+                    f'p95 {total["p95_ms"]} мс, ошибок {total["error_rate"]:.1%}'
+                )
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from app import prerender
+from app.models import PrerenderTask
+
+
+def publish_chunk(paths):
+    return prerender.publish_many(paths)
+
+
+class Command(BaseCommand):
+    help = 'Полная перерисовка статических копий списка и карточек детских садов в несколько процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Перерисовать только эти пути (например, /kindergartens/5/)')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=50,
+                            help='Сколько страниц отдавать процессу за раз')
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        full_rebuild = not options['paths']
+        paths = prerender.all_paths() if full_rebuild else options['paths']
+        chunk_size = max(options['chunk_size'], 1)
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+        totals = Counter()
+        if options['processes'] > 1 and len(chunks) > 1:
+            # Дочерние процессы получают копию памяти родителя (fork), поэтому
+            # открытые соединения с базой закрываем: каждый откроет свое
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options['processes'], mp_context=multiprocessing.get_context('fork'),
+            ) as executor:
+                for results in executor.map(publish_chunk, chunks):
+                    totals.update(results)
+        else:
+            for chunk in chunks:
+                totals.update(publish_chunk(chunk))
+
+        if full_rebuild:
+            totals['removed'] += prerender.remove_stale_files(paths)
+            # Все поставленные до начала перерисовки задачи уже выполнены
+            PrerenderTask.objects.filter(requested_at__lte=started).delete()
+
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Страниц: {len(paths)}, записано: {totals["written"]}, без изменений: {totals["unchanged"]}, '
+            f'удалено: {totals["removed"]} за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import prerender
+
+
+class Command(BaseCommand):
+    help = 'Перерисовывает статические страницы из очереди изменений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и выйти')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Пауза между проверками пустой очереди, секунд')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        while True:
+            results = prerender.process_queue(options['batch_size'])
+            if results:
+                self.stdout.write(
+                    f'записано: {results["written"]}, без изменений: {results["unchanged"]}, '
+                    f'удалено: {results["removed"]}'
+                )
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
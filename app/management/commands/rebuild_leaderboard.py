@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app import leaderboard
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг садов (общий и по районам) и среднюю оценку, к которой '
+            'сглаживаются баллы. Запускать периодически, например раз в сутки из cron')
+
+    def handle(self, *args, **options):
+        sizes = leaderboard.rebuild()
+        for district, size in sorted(sizes.items()):
+            self.stdout.write(f'{district or "Все сады"}: {size}')
+        board = leaderboard.get_board()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны: {len(sizes)}, средняя оценка {board.prior_mean:.2f}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app import fuzzy
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает триграммный индекс ФИО (например, после массового импорта в обход save())'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(fuzzy.MODELS), help='Только дети или только воспитатели')
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else sorted(fuzzy.MODELS)
+        for kind in kinds:
+            count = fuzzy.rebuild_index(kind)
+            self.stdout.write(self.style.SUCCESS(f'{kind}: проиндексировано записей — {count}'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    from app import similar
+except ImportError:
+    similar = None
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие сады для всего каталога (нужен NumPy). '
+            'Запускать периодически и после массового импорта садов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=12, help='Сколько похожих садов хранить для каждого')
+        parser.add_argument('--block-size', type=int, default=1024,
+                            help='Строк матрицы признаков за один шаг умножения (память ~ block × садов)')
+
+    def handle(self, *args, **options):
+        if similar is None:
+            raise CommandError('Для расчета похожих садов установите NumPy: pip install numpy')
+        started = time.perf_counter()
+        count = similar.rebuild(k=max(options['top_k'], 1), block_size=max(options['block_size'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано похожих садов: {count} за {time.perf_counter() - started:.1f} с'
+        ))
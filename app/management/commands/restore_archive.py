@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app import archive
+from app.models import ArchivedEnrollment, ArchivedReview
+
+
+class Command(BaseCommand):
+    help = 'Возвращает строки из архива в рабочие таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['reviews', 'enrollments'])
+        parser.add_argument('--kindergarten', type=int, help='Только строки одного детского сада')
+        parser.add_argument('--id', type=int, action='append', dest='ids',
+                            help='Конкретные id (можно повторять)')
+        parser.add_argument('--all', action='store_true', help='Вернуть весь архив')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not (options['kindergarten'] or options['ids'] or options['all']):
+            raise CommandError('Укажите --kindergarten, --id или --all')
+
+        if options['kind'] == 'reviews':
+            queryset = ArchivedReview.objects.all()
+            kindergarten_lookup = 'kindergarten_id'
+        else:
+            queryset = ArchivedEnrollment.objects.all()
+            kindergarten_lookup = 'group__kindergarten_id'
+        if options['kindergarten']:
+            queryset = queryset.filter(**{kindergarten_lookup: options['kindergarten']})
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+
+        if options['kind'] == 'reviews':
+            count = archive.restore_reviews(queryset, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Восстановлено отзывов: {count}'))
+        else:
+            count, skipped = archive.restore_enrollments(queryset, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Восстановлено записей: {count}'))
+            if skipped:
+                self.stdout.write(self.style.WARNING(
+                    f'Оставлено в архиве: {skipped} (ребенок уже заново записан в ту же группу)'
+                ))
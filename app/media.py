@@ -0,0 +1,183 @@
+# app/media.py
+# Учет ссылок на файлы и их отложенное удаление. Строки, сохраняющие или
+# удаляющие файл, меняют счетчик StoredBlob; файлы, на которые больше никто
+# не ссылается, ставятся в очередь FileCleanupTask, которую разбирает сборщик
+# (команда cleanup_worker). Перед удалением сборщик еще раз проверяет ссылки
+# по самим строкам и не трогает недавно загруженные файлы. Команда gc_media находит файлы без ссылок, оставшиеся
+# по другим причинам (незавершенные загрузки, сбои).
+import datetime
+import logging
+import os
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import FileCleanupTask, StoredBlob
+
+logger = logging.getLogger(__name__)
+
+
+def file_fields():
+    """[(модель, поле)] для всех файловых полей приложения."""
+    return [
+        (model, field)
+        for model in apps.get_app_config('app').get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def upload_directory(field):
+    if isinstance(field.upload_to, str):
+        return field.upload_to.split('%')[0].rstrip('/')
+    return None
+
+
+def storage_for(name):
+    """Хранилище поля, в каталог загрузки которого попадает name."""
+    for _, field in file_fields():
+        directory = upload_directory(field)
+        if directory and name.startswith(directory + '/'):
+            return field.storage
+    return default_storage
+
+
+def referenced_names(names=None):
+    """Имена файлов, на которые ссылаются строки; names ограничивает проверку."""
+    referenced = set()
+    for model, field in file_fields():
+        rows = model._default_manager.order_by().exclude(**{field.name: ''})
+        if names is not None:
+            rows = rows.filter(**{f'{field.name}__in': names})
+        referenced.update(rows.values_list(field.name, flat=True).distinct())
+    return referenced
+
+
+def _create_blobs(names):
+    blobs = []
+    for name in names:
+        try:
+            size = storage_for(name).size(name)
+        except OSError:
+            size = 0
+        blobs.append(StoredBlob(name=name, size=size))
+    StoredBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+
+
+def acquire_files(names):
+    """Учитывает новые ссылки строк на файлы names."""
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+    _create_blobs(counts)
+    for name, count in counts.items():
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+
+
+def release_files(names):
+    """Снимает ссылки на файлы names; файлы без ссылок ставит в очередь удаления."""
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+    for name, count in counts.items():
+        StoredBlob.objects.filter(name=name).update(
+            ref_count=Greatest(F('ref_count') - count, Value(0))
+        )
+    still_used = set(
+        StoredBlob.objects.filter(name__in=counts, ref_count__gt=0).values_list('name', flat=True)
+    )
+    enqueue_files(counts.keys() - still_used)
+
+
+def rebuild_blob_counts():
+    """Пересчитывает StoredBlob.ref_count по строкам с файлами."""
+    counts = Counter()
+    for model, field in file_fields():
+        rows = model._default_manager.order_by().exclude(**{field.name: ''})
+        counts.update(dict(
+            rows.values(field.name).annotate(n=models.Count('pk')).values_list(field.name, 'n')
+        ))
+    StoredBlob.objects.exclude(name__in=counts).update(ref_count=0)
+    known = set(StoredBlob.objects.filter(name__in=counts).values_list('name', flat=True))
+    _create_blobs(counts.keys() - known)
+    for name, count in counts.items():
+        StoredBlob.objects.filter(name=name).update(ref_count=count)
+    return counts
+
+
+def enqueue_files(names):
+    names = {name for name in names if name}
+    if not names:
+        return
+    now = timezone.now()
+    FileCleanupTask.objects.bulk_create(
+        [FileCleanupTask(name=name, requested_at=now) for name in names],
+        update_conflicts=True, unique_fields=['name'], update_fields=['requested_at'],
+    )
+
+
+def sweep(limit=500, min_age=datetime.timedelta(hours=1)):
+    """Удаляет до limit файлов из очереди; возвращает (удалено, оставлено) или None.
+
+    Файлы, на которые снова ссылаются строки или StoredBlob, остаются на
+    диске. Задачи и файлы моложе min_age не трогаются: ContentAddressedStorage
+    отдает уже сохраненный файл новой загрузке того же содержимого (и обновляет
+    его время), а строка загрузки может быть еще не сохранена. Такие задачи и
+    задачи с ошибкой удаления уходят в конец очереди.
+    """
+    cutoff = timezone.now() - min_age
+    tasks = list(FileCleanupTask.objects.filter(requested_at__lt=cutoff).order_by('requested_at')[:limit])
+    if not tasks:
+        return None
+    names = [task.name for task in tasks]
+    referenced = referenced_names(names)
+    referenced.update(StoredBlob.objects.filter(name__in=names, ref_count__gt=0).values_list('name', flat=True))
+    deleted = kept = 0
+    for task in tasks:
+        if task.name in referenced:
+            kept += 1
+        else:
+            storage = storage_for(task.name)
+            try:
+                if storage.exists(task.name) and storage.get_modified_time(task.name) >= cutoff:
+                    FileCleanupTask.objects.filter(pk=task.pk).update(requested_at=timezone.now())
+                    continue
+                storage.delete(task.name)
+            except OSError:
+                logger.exception('Не удалось удалить файл %s', task.name)
+                FileCleanupTask.objects.filter(pk=task.pk).update(requested_at=timezone.now())
+                continue
+            StoredBlob.objects.filter(name=task.name, ref_count=0).delete()
+            deleted += 1
+        FileCleanupTask.objects.filter(pk=task.pk, requested_at=task.requested_at).delete()
+    return deleted, kept
+
+
+def stored_files(storage, directory):
+    """Имена всех файлов в хранилище под directory (рекурсивно)."""
+    subdirs, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for subdir in subdirs:
+        yield from stored_files(storage, os.path.join(directory, subdir))
+
+
+def orphaned_files(min_age=datetime.timedelta(days=1)):
+    """Файлы в каталогах загрузки без ссылок из базы, не моложе min_age.
+
+    Свежие файлы пропускаются: их строка может быть еще не сохранена.
+    """
+    referenced = referenced_names()
+    cutoff = timezone.now() - min_age
+    directories = {upload_directory(field): field.storage for _, field in file_fields()}
+    for directory, storage in sorted(directories.items()):
+        if not directory or not storage.exists(directory):
+            continue
+        for name in stored_files(storage, directory):
+            if name not in referenced and storage.get_modified_time(name) < cutoff:
+                yield name
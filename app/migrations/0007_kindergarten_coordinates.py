@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_kindergartenimage_caption'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='kindergartenimage',
+            options={'ordering': ['order'], 'verbose_name': 'Фотография детского сада', 'verbose_name_plural': 'Фотографии детских садов'},
+        ),
+        migrations.AddField(
+            model_name='kindergartenimage',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='kindergartenimage',
+            name='order',
+            field=models.IntegerField(default=0, verbose_name='Порядок'),
+        ),
+        migrations.AlterField(
+            model_name='kindergartenimage',
+            name='caption',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Подпись'),
+        ),
+        migrations.AlterField(
+            model_name='kindergartenimage',
+            name='kindergarten',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='app.kindergarten'),
+        ),
+        migrations.AddField(
+            model_name='kindergarten',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AddField(
+            model_name='kindergarten',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+from app.text import normalize_name
+
+
+def fill_search_name(apps, schema_editor):
+    Teacher = apps.get_model('app', 'Teacher')
+    batch = []
+    for teacher in Teacher.objects.only('first_name', 'last_name').iterator(chunk_size=2000):
+        teacher.search_name = normalize_name(f"{teacher.last_name} {teacher.first_name}")
+        batch.append(teacher)
+        if len(batch) >= 2000:
+            Teacher.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    Teacher.objects.bulk_update(batch, ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_kindergarten_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacher',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=201),
+        ),
+        migrations.AlterField(
+            model_name='teacher',
+            name='qualification',
+            field=models.CharField(choices=[('высшая', 'Высшая категория'), ('первая', 'Первая категория'), ('вторая', 'Вторая категория'), ('без', 'Без категории'), ('молодой', 'Молодой специалист')], db_index=True, max_length=50, verbose_name='Квалификация'),
+        ),
+        migrations.AddIndex(
+            model_name='teacher',
+            index=models.Index(fields=['last_name', 'first_name'], name='app_teacher_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kindergartenteacher',
+            index=models.Index(fields=['kindergarten', 'role'], name='app_kgteacher_kg_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kindergartenteacher',
+            index=models.Index(fields=['role', 'teacher'], name='app_kgteacher_role_teacher_idx'),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:14
+
+from django.db import migrations, models
+
+from app.ages import parse_age_range
+
+
+def fill_age_bounds(apps, schema_editor):
+    Group = apps.get_model('app', 'Group')
+    batch = []
+    for group in Group.objects.only('age_range').iterator(chunk_size=2000):
+        bounds = parse_age_range(group.age_range)
+        if bounds is None:
+            continue
+        group.min_age_months, group.max_age_months = bounds
+        batch.append(group)
+        if len(batch) >= 2000:
+            Group.objects.bulk_update(batch, ['min_age_months', 'max_age_months'])
+            batch = []
+    Group.objects.bulk_update(batch, ['min_age_months', 'max_age_months'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_teacher_directory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='max_age_months',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Не включительно: для группы 3-4 года — 48', null=True, verbose_name='Возраст до (мес.)'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='min_age_months',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Если не указан, определяется по полю "Возрастная группа"', null=True, verbose_name='Возраст от (мес.)'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['min_age_months', 'max_age_months'], name='app_group_age_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['group', 'status'], name='app_enroll_group_status_idx'),
+        ),
+        migrations.RunPython(fill_age_bounds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+from app.text import name_key, trigrams
+
+
+def fill_name_trigrams(apps, schema_editor):
+    NameTrigram = apps.get_model('app', 'NameTrigram')
+    for kind, model_name in (('child', 'Child'), ('teacher', 'Teacher')):
+        model = apps.get_model('app', model_name)
+        batch = []
+        names = model.objects.order_by().values_list('pk', 'first_name', 'last_name')
+        for pk, first_name, last_name in names.iterator(chunk_size=5000):
+            batch.extend(
+                NameTrigram(kind=kind, object_id=pk, trigram=gram)
+                for gram in trigrams(name_key(f'{last_name} {first_name}'))
+            )
+            if len(batch) >= 5000:
+                NameTrigram.objects.bulk_create(batch)
+                batch = []
+        NameTrigram.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_group_age_bounds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('child', 'Ребенок'), ('teacher', 'Воспитатель')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+            options={
+                'verbose_name': 'Триграмма имени',
+                'verbose_name_plural': 'Триграммы имен',
+                'indexes': [models.Index(fields=['kind', 'trigram', 'object_id'], name='app_trigram_lookup_idx'), models.Index(fields=['object_id', 'kind'], name='app_trigram_object_idx')],
+            },
+        ),
+        migrations.RunPython(fill_name_trigrams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_name_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrerenderTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('requested_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Задача публикации страницы',
+                'verbose_name_plural': 'Очередь публикации страниц',
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 19:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_prerendertask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEnrollment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('enrollment_date', models.DateField(verbose_name='Дата записи')),
+                ('status', models.CharField(choices=[('активна', 'Активна'), ('ожидание', 'В ожидании'), ('отклонена', 'Отклонена'), ('завершена', 'Завершена')], max_length=20, verbose_name='Статус')),
+                ('archived_at', models.DateTimeField(verbose_name='Перенесена в архив')),
+                ('child', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.child', verbose_name='Ребенок')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Архивная запись в группу',
+                'verbose_name_plural': 'Архив записей в группы',
+                'ordering': ['-enrollment_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReview',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('parent_name', models.CharField(max_length=100, verbose_name='Имя родителя')),
+                ('parent_email', models.EmailField(blank=True, max_length=254, verbose_name='Email родителя')),
+                ('parent_phone', models.CharField(blank=True, max_length=20, verbose_name='Телефон родителя')),
+                ('rating', models.IntegerField(verbose_name='Оценка')),
+                ('comment', models.TextField(verbose_name='Комментарий')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('archived_at', models.DateTimeField(verbose_name='Перенесен в архив')),
+                ('kindergarten', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.kindergarten', verbose_name='Детский сад')),
+            ],
+            options={
+                'verbose_name': 'Архивный отзыв',
+                'verbose_name_plural': 'Архив отзывов',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewArchiveTotals',
+            fields=[
+                ('kindergarten', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_archive_totals', serialize=False, to='app.kindergarten', verbose_name='Детский сад')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Отзывов в архиве')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Итоги архива отзывов',
+                'verbose_name_plural': 'Итоги архива отзывов',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileCleanupTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('requested_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Файл к удалению',
+                'verbose_name_plural': 'Очередь удаления файлов',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-19 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_content_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('district', models.CharField(blank=True, max_length=100, unique=True, verbose_name='Район')),
+                ('prior_mean', models.FloatField(default=0, verbose_name='Средняя оценка по всем садам')),
+                ('prior_weight', models.FloatField(default=0, verbose_name='Вес средней оценки')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Садов')),
+                ('rebuilt_at', models.DateTimeField(blank=True, null=True, verbose_name='Пересчитан')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг',
+                'verbose_name_plural': 'Рейтинги',
+            },
+        ),
+        migrations.AddField(
+            model_name='kindergarten',
+            name='district',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Район'),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Балл')),
+                ('is_recommended', models.BooleanField(default=False, verbose_name='Рекомендуемый')),
+                ('reviews_count', models.PositiveIntegerField(default=0, verbose_name='Отзывов')),
+                ('average_rating', models.FloatField(null=True, verbose_name='Средняя оценка')),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='app.leaderboard', verbose_name='Рейтинг')),
+                ('kindergarten', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.kindergarten', verbose_name='Детский сад')),
+            ],
+            options={
+                'verbose_name': 'Место в рейтинге',
+                'verbose_name_plural': 'Места в рейтинге',
+                'indexes': [models.Index(fields=['board', 'rank'], name='app_lb_rank_idx'), models.Index(fields=['board', 'is_recommended', 'score'], name='app_lb_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'kindergarten'), name='app_leaderboard_entry_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 22:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarKindergarten',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Близость')),
+                ('kindergarten', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='app.kindergarten', verbose_name='Детский сад')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.kindergarten', verbose_name='Похожий сад')),
+            ],
+            options={
+                'verbose_name': 'Похожий сад',
+                'verbose_name_plural': 'Похожие сады',
+                'constraints': [models.UniqueConstraint(fields=('kindergarten', 'rank'), name='app_similar_rank_uniq')],
+            },
+        ),
+    ]
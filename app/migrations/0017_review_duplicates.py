@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_similar_kindergartens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='duplicate_cluster',
+            field=models.BigIntegerField(blank=True, db_index=True, help_text='id первого отзыва группы почти одинаковых текстов', null=True, verbose_name='Группа похожих'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='is_held',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='На модерации'),
+        ),
+        migrations.CreateModel(
+            name='ReviewBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_id', models.BigIntegerField()),
+                ('key', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Полоса сигнатуры отзыва',
+                'verbose_name_plural': 'Полосы сигнатур отзывов',
+                'indexes': [models.Index(fields=['key', 'review_id'], name='app_review_band_key_idx'), models.Index(fields=['review_id'], name='app_review_band_review_idx')],
+            },
+        ),
+    ]
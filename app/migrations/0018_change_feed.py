@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_review_duplicates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('action', models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление')], max_length=10, verbose_name='Действие')),
+                ('fields', models.JSONField(blank=True, null=True, verbose_name='Поля')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Записано')),
+            ],
+            options={
+                'verbose_name': 'Событие журнала изменений',
+                'verbose_name_plural': 'Журнал изменений',
+                'indexes': [models.Index(fields=['model', 'id'], name='app_change_model_idx'), models.Index(fields=['model', 'object_id'], name='app_change_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentApplication',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ отправки')),
+                ('identity', models.CharField(max_length=64, unique=True, verbose_name='Ключ ребенка')),
+                ('kindergarten_id', models.BigIntegerField(verbose_name='ID детского сада')),
+                ('child_last_name', models.CharField(max_length=100, verbose_name='Фамилия ребенка')),
+                ('child_first_name', models.CharField(max_length=100, verbose_name='Имя ребенка')),
+                ('birth_date', models.DateField(verbose_name='Дата рождения')),
+                ('parent_name', models.CharField(max_length=100, verbose_name='Имя родителя')),
+                ('phone', models.CharField(max_length=20, verbose_name='Телефон')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='Email')),
+                ('message', models.TextField(blank=True, verbose_name='Сообщение')),
+                ('submitted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправлена')),
+                ('status', models.CharField(choices=[('новая', 'Новая'), ('принята', 'Принята'), ('повтор', 'Повторная'), ('без группы', 'Нет подходящей группы')], default='новая', max_length=20, verbose_name='Статус')),
+                ('enrollment_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID записи в группу')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработана')),
+            ],
+            options={
+                'verbose_name': 'Заявка на запись',
+                'verbose_name_plural': 'Заявки на запись',
+                'indexes': [models.Index(condition=models.Q(('status', 'новая')), fields=['id'], name='app_intake_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_enrollment_applications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedreview',
+            name='duplicate_cluster',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Группа похожих'),
+        ),
+    ]
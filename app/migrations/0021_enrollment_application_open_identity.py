@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_archived_review_duplicate_cluster'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='identity',
+            field=models.CharField(max_length=64, verbose_name='Ключ ребенка'),
+        ),
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='status',
+            field=models.CharField(choices=[('новая', 'Новая'), ('принята', 'Принята'), ('повтор', 'Повторная'), ('без группы', 'Нет подходящей группы'), ('закрыта', 'Запись завершена или отклонена')], default='новая', max_length=20, verbose_name='Статус'),
+        ),
+        migrations.AddConstraint(
+            model_name='enrollmentapplication',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['новая', 'принята'])), fields=('identity',), name='app_intake_identity_uniq'),
+        ),
+    ]
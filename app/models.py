@@ -1,11 +1,18 @@
 from django.db import models
-from django.db.models import Avg
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+from . import objcache
+from .ages import parse_age_range
+from .storage import ContentAddressedStorage
+from .text import normalize_name
 
 
 class KindergartenImage(models.Model):
     kindergarten = models.ForeignKey('Kindergarten', on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='kindergartens/images/', verbose_name='Изображение')
+    image = models.ImageField(
+        upload_to='kindergartens/images/', storage=ContentAddressedStorage(), verbose_name='Изображение'
+    )
     caption = models.CharField(max_length=200, blank=True, verbose_name='Подпись')
     order = models.IntegerField(default=0, verbose_name='Порядок')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -16,13 +23,16 @@ class KindergartenImage(models.Model):
         verbose_name_plural = 'Фотографии детских садов'
 
     def __str__(self):
-        return f"Фото {self.kindergarten.name}"
+        return f"Фото {objcache.related(self, 'kindergarten').name}"
 
 
 class Kindergarten(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название')
     address = models.CharField(max_length=300, verbose_name='Адрес')
+    district = models.CharField(max_length=100, blank=True, db_index=True, verbose_name='Район')
     phone = models.CharField(max_length=20, blank=True, verbose_name='Телефон')
+    latitude = models.FloatField(null=True, blank=True, verbose_name='Широта')
+    longitude = models.FloatField(null=True, blank=True, verbose_name='Долгота')
     capacity = models.IntegerField(verbose_name='Вместимость', validators=[MinValueValidator(1)])
     established_at = models.DateField(verbose_name='Дата основания')
     
@@ -45,8 +55,13 @@ class Kindergarten(models.Model):
 
     @property
     def average_rating(self):
-        rating = self.review_set.aggregate(Avg('rating'))['rating__avg']
-        return rating if rating else 0
+        # С учетом отзывов, перенесенных в архив
+        from .stats import review_stats
+        return review_stats(self.pk).average
+
+    @property
+    def has_location(self):
+        return self.latitude is not None and self.longitude is not None
 
     @property
     def features_list(self):
@@ -74,17 +89,27 @@ class Teacher(models.Model):
     first_name = models.CharField(max_length=100, verbose_name='Имя')
     last_name = models.CharField(max_length=100, verbose_name='Фамилия')
     phone_number = models.CharField(max_length=20, verbose_name='Телефон')
-    qualification = models.CharField(max_length=50, choices=QUALIFICATION_CHOICES, verbose_name='Квалификация')
+    qualification = models.CharField(max_length=50, choices=QUALIFICATION_CHOICES, db_index=True, verbose_name='Квалификация')
     experience_years = models.IntegerField(default=0, verbose_name='Стаж (лет)')
+    # "фамилия имя" в нижнем регистре для индексного поиска по префиксу
+    search_name = models.CharField(max_length=201, editable=False, db_index=True, default='')
     
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [models.Index(fields=['last_name', 'first_name'], name='app_teacher_name_idx')]
         verbose_name = 'Воспитатель'
         verbose_name_plural = 'Воспитатели'
 
     def __str__(self):
         return f"{self.last_name} {self.first_name}"
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(f"{self.last_name} {self.first_name}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
 
 class KindergartenTeacher(models.Model):
     ROLE_CHOICES = [
@@ -103,26 +128,76 @@ class KindergartenTeacher(models.Model):
     
     class Meta:
         unique_together = ['teacher', 'kindergarten']
+        indexes = [
+            models.Index(fields=['kindergarten', 'role'], name='app_kgteacher_kg_role_idx'),
+            models.Index(fields=['role', 'teacher'], name='app_kgteacher_role_teacher_idx'),
+        ]
         verbose_name = 'Работа воспитателя в саду'
         verbose_name_plural = 'Работы воспитателей в садах'
 
     def __str__(self):
-        return f"{self.teacher} в {self.kindergarten}"
+        return f"{objcache.related(self, 'teacher')} в {objcache.related(self, 'kindergarten')}"
 
 
 class Group(models.Model):
     name = models.CharField(max_length=100, verbose_name='Название группы')
     kindergarten = models.ForeignKey(Kindergarten, on_delete=models.CASCADE, verbose_name='Детский сад')
     age_range = models.CharField(max_length=50, verbose_name='Возрастная группа')
+    # Полуоткрытый диапазон возраста в месяцах: min_age_months <= возраст < max_age_months
+    min_age_months = models.PositiveSmallIntegerField(
+        null=True, blank=True, verbose_name='Возраст от (мес.)',
+        help_text='Если не указан, определяется по полю "Возрастная группа"'
+    )
+    max_age_months = models.PositiveSmallIntegerField(
+        null=True, blank=True, verbose_name='Возраст до (мес.)',
+        help_text='Не включительно: для группы 3-4 года — 48'
+    )
     max_capacity = models.IntegerField(default=15, verbose_name='Максимальная вместимость')
     
     class Meta:
         ordering = ['kindergarten', 'name']
+        indexes = [
+            models.Index(fields=['min_age_months', 'max_age_months'], name='app_group_age_idx'),
+        ]
         verbose_name = 'Группа'
         verbose_name_plural = 'Группы'
 
     def __str__(self):
-        return f"{self.name} ({self.kindergarten.name})"
+        return f"{self.name} ({objcache.related(self, 'kindergarten').name})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из базы: по ним save() видит, что изменили возрастную группу
+        if {'age_range', 'min_age_months', 'max_age_months'} <= set(field_names):
+            instance._loaded_age = (instance.age_range, instance.min_age_months, instance.max_age_months)
+        return instance
+
+    def _bounds_outdated(self):
+        if self.min_age_months is None and self.max_age_months is None:
+            return True
+        loaded = getattr(self, '_loaded_age', None)
+        # Изменили только "Возрастную группу" — диапазон в месяцах выводится заново;
+        # диапазон, заданный вместе с ней вручную, не трогаем
+        return (
+            loaded is not None and loaded[0] != self.age_range
+            and loaded[1:] == (self.min_age_months, self.max_age_months)
+        )
+
+    def save(self, *args, **kwargs):
+        if self._bounds_outdated():
+            self.min_age_months, self.max_age_months = parse_age_range(self.age_range) or (None, None)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'min_age_months', 'max_age_months'}
+        super().save(*args, **kwargs)
+        self._loaded_age = (self.age_range, self.min_age_months, self.max_age_months)
+
+    @property
+    def age_bounds(self):
+        if self.min_age_months is None or self.max_age_months is None:
+            return None
+        return self.min_age_months, self.max_age_months
 
 
 class Child(models.Model):
@@ -155,6 +230,9 @@ class Enrollment(models.Model):
     
     class Meta:
         unique_together = ['child', 'group']
+        indexes = [
+            models.Index(fields=['group', 'status'], name='app_enroll_group_status_idx'),
+        ]
         verbose_name = 'Запись в группу'
         verbose_name_plural = 'Записи в группы'
 
@@ -172,6 +250,12 @@ class Review(models.Model):
         verbose_name='Оценка'
     )
     comment = models.TextField(verbose_name='Комментарий')
+    # Отзывы, похожие на уже опубликованные (см. app/duplicates.py), ждут решения модератора
+    is_held = models.BooleanField(default=False, db_index=True, verbose_name='На модерации')
+    duplicate_cluster = models.BigIntegerField(
+        null=True, blank=True, db_index=True, verbose_name='Группа похожих',
+        help_text='id первого отзыва группы почти одинаковых текстов'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     
@@ -181,6 +265,303 @@ class Review(models.Model):
         verbose_name_plural = 'Отзывы'
 
     def __str__(self):
-        return f"Отзыв от {self.parent_name} о {self.kindergarten.name}"
+        return f"Отзыв от {self.parent_name} о {objcache.related(self, 'kindergarten').name}"
+
+ 
+
+class NameTrigram(models.Model):
+    """Триграммный индекс транслитерированных ФИО детей и воспитателей."""
+    KIND_CHOICES = [
+        ('child', 'Ребенок'),
+        ('teacher', 'Воспитатель'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'trigram', 'object_id'], name='app_trigram_lookup_idx'),
+            models.Index(fields=['object_id', 'kind'], name='app_trigram_object_idx'),
+        ]
+        verbose_name = 'Триграмма имени'
+        verbose_name_plural = 'Триграммы имен'
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.trigram!r}"
+
+
+class ReviewBand(models.Model):
+    """LSH-индекс текстов отзывов: ключи полос MinHash-сигнатуры комментария."""
+    # Без внешнего ключа: отзывы удаляются и прямым DELETE, а устаревшие
+    # строки индекса безвредны — кандидаты все равно проверяются по тексту
+    review_id = models.BigIntegerField()
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'review_id'], name='app_review_band_key_idx'),
+            models.Index(fields=['review_id'], name='app_review_band_review_idx'),
+        ]
+        verbose_name = 'Полоса сигнатуры отзыва'
+        verbose_name_plural = 'Полосы сигнатур отзывов'
+
+    def __str__(self):
+        return f"#{self.review_id}: {self.key}"
+
+
+class PrerenderTask(models.Model):
+    """Путь страницы, которую нужно заново отрисовать в статический файл."""
+    path = models.CharField(max_length=255, unique=True)
+    requested_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Задача публикации страницы'
+        verbose_name_plural = 'Очередь публикации страниц'
+
+    def __str__(self):
+        return self.path
+
+
+class FileCleanupTask(models.Model):
+    """Файл в MEDIA_ROOT, который больше не нужен и ждет удаления сборщиком."""
+    name = models.CharField(max_length=255, unique=True)
+    requested_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Файл к удалению'
+        verbose_name_plural = 'Очередь удаления файлов'
+
+    def __str__(self):
+        return self.name
+
+
+class StoredBlob(models.Model):
+    """Файл в хранилище по содержимому и число строк, которые на него ссылаются."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0, verbose_name='Размер, байт')
+    ref_count = models.PositiveIntegerField(default=0, verbose_name='Ссылок')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Файл хранилища'
+        verbose_name_plural = 'Файлы хранилища'
+
+    def __str__(self):
+        return self.name
+
+
+# --- Архив: старые отзывы и закрытые записи, перенесенные из рабочих таблиц ---
+
+class ArchivedReview(models.Model):
+    # id совпадает с id исходного отзыва, чтобы восстановление вернуло его на место
+    id = models.BigIntegerField(primary_key=True)
+    kindergarten = models.ForeignKey(Kindergarten, on_delete=models.CASCADE, verbose_name='Детский сад')
+    parent_name = models.CharField(max_length=100, verbose_name='Имя родителя')
+    parent_email = models.EmailField(blank=True, verbose_name='Email родителя')
+    parent_phone = models.CharField(max_length=20, blank=True, verbose_name='Телефон родителя')
+    rating = models.IntegerField(verbose_name='Оценка')
+    comment = models.TextField(verbose_name='Комментарий')
+    duplicate_cluster = models.BigIntegerField(null=True, blank=True, verbose_name='Группа похожих')
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+    archived_at = models.DateTimeField(verbose_name='Перенесен в архив')
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Архивный отзыв'
+        verbose_name_plural = 'Архив отзывов'
+
+    def __str__(self):
+        return f"Отзыв от {self.parent_name} о {objcache.related(self, 'kindergarten').name}"
 
- 
\ No newline at end of file
+
+class ArchivedEnrollment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    child = models.ForeignKey(Child, on_delete=models.CASCADE, verbose_name='Ребенок')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, verbose_name='Группа')
+    enrollment_date = models.DateField(verbose_name='Дата записи')
+    status = models.CharField(max_length=20, choices=Enrollment.STATUS_CHOICES, verbose_name='Статус')
+    archived_at = models.DateTimeField(verbose_name='Перенесена в архив')
+
+    class Meta:
+        ordering = ['-enrollment_date']
+        verbose_name = 'Архивная запись в группу'
+        verbose_name_plural = 'Архив записей в группы'
+
+    def __str__(self):
+        return f"{self.child} в {self.group}"
+
+
+class ReviewArchiveTotals(models.Model):
+    """Итоги по архивным отзывам сада: складываются с агрегатами рабочей таблицы."""
+    kindergarten = models.OneToOneField(
+        Kindergarten, on_delete=models.CASCADE, primary_key=True,
+        related_name='review_archive_totals', verbose_name='Детский сад'
+    )
+    count = models.PositiveIntegerField(default=0, verbose_name='Отзывов в архиве')
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Итоги архива отзывов'
+        verbose_name_plural = 'Итоги архива отзывов'
+
+    def __str__(self):
+        return f"{objcache.related(self, 'kindergarten').name}: {self.count}"
+
+
+# --- Рейтинг садов: предрассчитанные места, общий и по районам ---
+
+class Leaderboard(models.Model):
+    """Таблица мест: общая (district='') или по району."""
+    district = models.CharField(max_length=100, blank=True, unique=True, verbose_name='Район')
+    # Байесовское среднее: оценки сада сглаживаются к prior_mean с весом prior_weight отзывов
+    prior_mean = models.FloatField(default=0, verbose_name='Средняя оценка по всем садам')
+    prior_weight = models.FloatField(default=0, verbose_name='Вес средней оценки')
+    size = models.PositiveIntegerField(default=0, verbose_name='Садов')
+    rebuilt_at = models.DateTimeField(null=True, blank=True, verbose_name='Пересчитан')
+
+    class Meta:
+        verbose_name = 'Рейтинг'
+        verbose_name_plural = 'Рейтинги'
+
+    def __str__(self):
+        return self.district or 'Все сады'
+
+
+class LeaderboardEntry(models.Model):
+    board = models.ForeignKey(Leaderboard, on_delete=models.CASCADE, related_name='entries', verbose_name='Рейтинг')
+    kindergarten = models.ForeignKey(Kindergarten, on_delete=models.CASCADE, verbose_name='Детский сад')
+    rank = models.PositiveIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Балл')
+    is_recommended = models.BooleanField(default=False, verbose_name='Рекомендуемый')
+    reviews_count = models.PositiveIntegerField(default=0, verbose_name='Отзывов')
+    average_rating = models.FloatField(null=True, verbose_name='Средняя оценка')
+
+    class Meta:
+        verbose_name = 'Место в рейтинге'
+        verbose_name_plural = 'Места в рейтинге'
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'kindergarten'], name='app_leaderboard_entry_uniq'),
+        ]
+        indexes = [
+            # Страница рейтинга — диапазон мест; поиск нового места — по ключу сортировки
+            models.Index(fields=['board', 'rank'], name='app_lb_rank_idx'),
+            models.Index(fields=['board', 'is_recommended', 'score'], name='app_lb_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.rank}. {objcache.related(self, "kindergarten").name}'
+
+
+class SimilarKindergarten(models.Model):
+    """Похожий сад: top-k по косинусной близости признаков (см. app/similar.py)."""
+    kindergarten = models.ForeignKey(
+        Kindergarten, on_delete=models.CASCADE, related_name='similar_entries', verbose_name='Детский сад'
+    )
+    similar = models.ForeignKey(
+        Kindergarten, on_delete=models.CASCADE, related_name='+', verbose_name='Похожий сад'
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Близость')
+
+    class Meta:
+        verbose_name = 'Похожий сад'
+        verbose_name_plural = 'Похожие сады'
+        constraints = [
+            models.UniqueConstraint(fields=['kindergarten', 'rank'], name='app_similar_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{objcache.related(self, 'kindergarten').name} → {objcache.related(self, 'similar').name}"
+
+
+class ChangeEvent(models.Model):
+    """Событие журнала изменений (см. app/changefeed.py); id — номер события, только растет."""
+    ACTION_CHOICES = [
+        ('create', 'Создание'),
+        ('update', 'Изменение'),
+        ('delete', 'Удаление'),
+    ]
+
+    model = models.CharField(max_length=50, verbose_name='Модель')
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name='Действие')
+    # Имена измененных полей; None — запись могла измениться целиком (save() без update_fields)
+    fields = models.JSONField(null=True, blank=True, verbose_name='Поля')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Записано')
+
+    class Meta:
+        verbose_name = 'Событие журнала изменений'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = [
+            models.Index(fields=['model', 'id'], name='app_change_model_idx'),
+            models.Index(fields=['model', 'object_id'], name='app_change_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.model} #{self.object_id}"
+
+
+class EnrollmentApplication(models.Model):
+    """Заявка на запись с сайта (см. app/intake.py).
+
+    Промежуточная таблица: запрос только добавляет строку, а Child и
+    Enrollment из заявок создает воркер пачками. Сад хранится числом, без
+    внешнего ключа, чтобы вставка не зависела от основных таблиц.
+    """
+    STATUS_CHOICES = [
+        ('новая', 'Новая'),
+        ('принята', 'Принята'),
+        ('повтор', 'Повторная'),
+        ('без группы', 'Нет подходящей группы'),
+        ('закрыта', 'Запись завершена или отклонена'),
+    ]
+
+    # Ключ повторной отправки той же формы (двойной клик, повтор после обрыва связи)
+    key = models.CharField(max_length=64, unique=True, verbose_name='Ключ отправки')
+    # Хеш сада, ФИО и даты рождения ребенка: одна действующая заявка на ребенка в сад
+    identity = models.CharField(max_length=64, verbose_name='Ключ ребенка')
+    kindergarten_id = models.BigIntegerField(verbose_name='ID детского сада')
+    child_last_name = models.CharField(max_length=100, verbose_name='Фамилия ребенка')
+    child_first_name = models.CharField(max_length=100, verbose_name='Имя ребенка')
+    birth_date = models.DateField(verbose_name='Дата рождения')
+    parent_name = models.CharField(max_length=100, verbose_name='Имя родителя')
+    phone = models.CharField(max_length=20, verbose_name='Телефон')
+    email = models.EmailField(blank=True, verbose_name='Email')
+    message = models.TextField(blank=True, verbose_name='Сообщение')
+    submitted_at = models.DateTimeField(default=timezone.now, verbose_name='Отправлена')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='новая', verbose_name='Статус')
+    enrollment_id = models.BigIntegerField(null=True, blank=True, verbose_name='ID записи в группу')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Обработана')
+
+    class Meta:
+        verbose_name = 'Заявка на запись'
+        verbose_name_plural = 'Заявки на запись'
+        indexes = [
+            # Частичный индекс только по необработанным: воркер берет их по порядку,
+            # а разобранные заявки индекс не раздувают
+            models.Index(fields=['id'], condition=models.Q(status='новая'), name='app_intake_pending_idx'),
+        ]
+        constraints = [
+            # Только действующие заявки: после отказа "без группы" или закрытой
+            # записи родитель может подать заявку на того же ребенка снова
+            models.UniqueConstraint(
+                fields=['identity'], condition=models.Q(status__in=['новая', 'принята']),
+                name='app_intake_identity_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Заявка {self.receipt}: {self.child_last_name} {self.child_first_name}"
+
+    @property
+    def receipt(self):
+        """Номер заявки для родителя."""
+        return f"{self.submitted_at:%y%m%d}-{self.pk:06d}"
@@ -0,0 +1,154 @@
+# app/objcache.py
+# Кэш редко меняющихся записей (детские сады, воспитатели) по первичному ключу.
+# Два уровня: небольшой LRU в памяти процесса и общий кэш Django. Ключи
+# включают версию пространства имен модели, поэтому после сохранения или
+# удаления любой записи старые значения просто перестают читаться.
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import cache
+from django.http import Http404
+
+from .caching import bump_namespace, namespace_version, namespaced_key
+
+
+_bypass = threading.local()
+
+
+@contextmanager
+def bypassed():
+    """Внутри блока объекты читаются из базы, мимо обоих уровней кэша.
+
+    Для воркеров, которые публикуют страницы наружу: задержка VERSION_TTL и
+    вытесненные версии не должны попасть в опубликованный файл.
+    """
+    previous = getattr(_bypass, 'active', False)
+    _bypass.active = True
+    try:
+        yield
+    finally:
+        _bypass.active = previous
+
+
+class ObjectCache:
+    # Как долго процесс доверяет прочитанной версии пространства имен;
+    # изменения из других процессов становятся видны не позже чем через это время
+    VERSION_TTL = 1.0
+
+    def __init__(self, model_label, local_size=512, timeout=60 * 60):
+        self.model_label = model_label
+        self.namespace = f'objects:{model_label.lower()}'
+        self.local_size = local_size
+        self.timeout = timeout
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self.local_hits = self.shared_hits = self.misses = 0
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > self.VERSION_TTL:
+            self._version = namespace_version(self.namespace)
+            self._version_checked = now
+        return self._version
+
+    def get(self, pk):
+        return self.get_many([pk]).get(int(pk))
+
+    def get_or_404(self, pk):
+        try:
+            obj = self.get(pk)
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise Http404(f'{self.model._meta.verbose_name} не найден')
+        return obj
+
+    def get_many(self, pks):
+        """{pk: копия объекта}; отсутствующие в базе ключи пропускаются."""
+        pks = {int(pk) for pk in pks}
+        if getattr(_bypass, 'active', False):
+            return self.model._default_manager.in_bulk(pks)
+        version = self.version()
+        found = {}
+
+        with self._lock:
+            for pk in pks:
+                obj = self._local.get((version, pk))
+                if obj is not None:
+                    self._local.move_to_end((version, pk))
+                    found[pk] = obj
+            self.local_hits += len(found)
+
+        missing = pks - found.keys()
+        if missing:
+            keys = {namespaced_key(self.namespace, pk): pk for pk in missing}
+            shared = {keys[key]: obj for key, obj in cache.get_many(keys).items()}
+            missing -= shared.keys()
+            loaded = self.model._default_manager.in_bulk(missing) if missing else {}
+            with self._lock:
+                self.shared_hits += len(shared)
+                self.misses += len(missing)
+            if loaded:
+                cache.set_many(
+                    {namespaced_key(self.namespace, pk): obj for pk, obj in loaded.items()},
+                    self.timeout,
+                )
+            fresh = {**shared, **loaded}
+            self._remember(version, fresh)
+            found.update(fresh)
+
+        # Вызывающий код может менять объекты — наружу отдаем копии
+        return {pk: copy.copy(obj) for pk, obj in found.items()}
+
+    def _remember(self, version, objects):
+        with self._lock:
+            for pk, obj in objects.items():
+                self._local[(version, pk)] = obj
+                self._local.move_to_end((version, pk))
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def invalidate(self):
+        bump_namespace(self.namespace)
+        with self._lock:
+            self._local.clear()
+            self._version = None
+
+    def stats(self):
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'local_size': len(self._local),
+        }
+
+
+kindergartens = ObjectCache('app.Kindergarten')
+teachers = ObjectCache('app.Teacher')
+
+CACHES_BY_MODEL = {
+    'app.kindergarten': kindergartens,
+    'app.teacher': teachers,
+}
+
+
+def related(instance, field_name):
+    """Связанный объект по внешнему ключу: из уже загруженных данных
+    экземпляра или из кэша объектов, без отдельного запроса к базе."""
+    field = instance._meta.get_field(field_name)
+    object_cache = CACHES_BY_MODEL.get(field.related_model._meta.label_lower)
+    pk = getattr(instance, field.attname)
+    if object_cache is None or pk is None or field.is_cached(instance):
+        return getattr(instance, field_name)
+    obj = object_cache.get(pk)
+    return obj if obj is not None else getattr(instance, field_name)
@@ -0,0 +1,66 @@
+# app/pagination.py
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from .caching import namespaced_key
+
+COUNTS_NAMESPACE = 'admin-counts'
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который не делает COUNT(*) на каждой странице.
+
+    Общее число берётся из переданного count или из кэша по cache_key;
+    ключ должен меняться при изменении данных (см. caching.namespaced_key).
+    """
+
+    def __init__(self, object_list, per_page, *, count=None, cache_key=None,
+                 timeout=300, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+        self.cache_key = cache_key
+        self.timeout = timeout
+
+    @cached_property
+    def count(self):
+        if self._known_count is not None:
+            return self._known_count
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.cache_key, count, self.timeout)
+        return count
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator списков админки: точный COUNT(*) только для небольших выборок.
+
+    Сначала считаются строки до exact_limit (COUNT по подзапросу с LIMIT).
+    Если их больше, число оценивается: для всей таблицы — по наибольшему id,
+    для выборки с фильтрами — точный COUNT, закэшированный на timeout секунд.
+    """
+    exact_limit = 10000
+    timeout = 10 * 60
+    is_estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        count = queryset[:self.exact_limit + 1].count()
+        if count <= self.exact_limit:
+            return count
+        self.is_estimated = True
+        if not queryset.query.where:
+            # id только растут, поэтому после удалений оценка чуть завышена
+            return queryset.model._default_manager.aggregate(last=Max('pk'))['last'] or count
+        sql, params = queryset.query.sql_with_params()
+        key = namespaced_key(COUNTS_NAMESPACE, sql, params)
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.set(key, total, self.timeout)
+        return total
@@ -0,0 +1,210 @@
+# app/prerender.py
+# Статические копии публичных страниц (список садов и карточки садов) для
+# отдачи веб-сервером без Django. Изменения моделей ставят пути в очередь
+# PrerenderTask, воркер перерисовывает только их и атомарно подменяет файлы.
+# CSRF-токен и сообщения подставляет в статическую страницу скрипт,
+# запрашивающий session_fragment.
+#
+# Пример для nginx (PRERENDER_ROOT = /srv/app/prerendered):
+#
+#     location / {
+#         if ($request_method != GET) { proxy_pass http://django; }
+#         if ($args) { proxy_pass http://django; }
+#         root /srv/app/prerendered;
+#         try_files $uri/index.html @django;
+#     }
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpRequest
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import objcache
+from .models import (
+    Child, Enrollment, Group, Kindergarten, KindergartenImage, KindergartenTeacher,
+    PrerenderTask, Review, SimilarKindergarten, Teacher,
+)
+
+_CSRF_VALUE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+# Модели, изменение которых меняет страницы; для True меняется и общий список
+# (в нем рейтинг, число отзывов, групп и воспитателей)
+DEPENDENT_MODELS = {
+    Kindergarten: True,
+    Review: True,
+    Group: True,
+    KindergartenTeacher: True,
+    KindergartenImage: False,
+    Enrollment: False,
+    Child: False,
+    Teacher: False,
+}
+
+# Модели, от которых зависит блок "Похожие сады" (название, адрес, рейтинг и
+# свободные места похожего сада): их изменение меняет и карточки садов,
+# у которых этот сад среди похожих
+SIMILAR_BLOCK_MODELS = {Kindergarten, Review, Group, Enrollment, Child}
+
+
+def list_path():
+    return reverse('kindergarten_list')
+
+
+def detail_path(kindergarten_id):
+    return reverse('kindergarten_detail', args=[kindergarten_id])
+
+
+def all_paths():
+    return [list_path()] + [
+        detail_path(pk) for pk in Kindergarten.objects.order_by('pk').values_list('pk', flat=True)
+    ]
+
+
+def listing_paths(kindergarten_ids):
+    """Карточки садов, у которых сады kindergarten_ids в блоке "Похожие сады"."""
+    ids = SimilarKindergarten.objects.filter(similar_id__in=kindergarten_ids).values_list(
+        'kindergarten_id', flat=True,
+    ).distinct()
+    return [detail_path(pk) for pk in ids]
+
+
+def file_for(path):
+    return Path(settings.PRERENDER_ROOT) / path.strip('/') / 'index.html'
+
+
+def affected_paths(instance):
+    """Пути страниц, которые нужно перерисовать после изменения instance."""
+    model = type(instance)
+    if model is Kindergarten:
+        kindergarten_ids = [instance.pk]
+    elif model is Enrollment:
+        kindergarten_ids = Group.objects.filter(pk=instance.group_id).values_list('kindergarten_id', flat=True)
+    elif model is Child:
+        kindergarten_ids = Enrollment.objects.filter(child=instance).values_list('group__kindergarten_id', flat=True)
+    elif model is Teacher:
+        kindergarten_ids = KindergartenTeacher.objects.filter(teacher=instance).values_list('kindergarten_id', flat=True)
+    else:
+        kindergarten_ids = [instance.kindergarten_id]
+    kindergarten_ids = set(kindergarten_ids)
+    paths = [detail_path(pk) for pk in kindergarten_ids]
+    if model in SIMILAR_BLOCK_MODELS:
+        paths += listing_paths(kindergarten_ids)
+    if DEPENDENT_MODELS[model]:
+        paths.append(list_path())
+    return paths
+
+
+def enqueue(paths):
+    """Ставит пути в очередь; повторная постановка только обновляет время запроса."""
+    now = timezone.now()
+    PrerenderTask.objects.bulk_create(
+        [PrerenderTask(path=path, requested_at=now) for path in set(paths)],
+        update_conflicts=True, unique_fields=['path'], update_fields=['requested_at'],
+    )
+
+
+def enqueue_kindergartens(kindergarten_ids, include_list=True, include_similar=True):
+    """Для пакетных изменений: kindergarten_ids — список или подзапрос values().
+
+    include_similar=False — для изменений, которых нет в блоке "Похожие сады".
+    """
+    ids = Kindergarten.objects.filter(pk__in=kindergarten_ids).values_list('pk', flat=True)
+    paths = [detail_path(pk) for pk in ids]
+    if include_similar:
+        paths += listing_paths(ids)
+    if include_list:
+        paths.append(list_path())
+    enqueue(paths)
+
+
+def render_path(path):
+    """HTML страницы для анонимного посетителя или None, если страницы нет."""
+    match = resolve(path)
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META.update({'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'})
+    request.resolver_match = match
+    request.user = AnonymousUser()
+    request.prerendering = True
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return None
+    if response.status_code != 200:
+        return None
+    # Токен подставит скрипт из session_fragment — в общем файле его быть не должно
+    return _CSRF_VALUE.sub(r'\1\2', response.content.decode(response.charset))
+
+
+def write_atomic(target, content):
+    """Пишет файл через временный файл и os.replace; возвращает False, если содержимое не изменилось."""
+    data = content.encode()
+    try:
+        if hashlib.sha256(target.read_bytes()).digest() == hashlib.sha256(data).digest():
+            return False
+    except FileNotFoundError:
+        pass
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def publish(path):
+    """Перерисовывает один путь: 'written', 'unchanged' или 'removed'."""
+    content = render_path(path)
+    target = file_for(path)
+    if content is None:
+        target.unlink(missing_ok=True)
+        return 'removed'
+    return 'written' if write_atomic(target, content) else 'unchanged'
+
+
+def publish_many(paths):
+    # Опубликованный файл живет до следующего изменения сада, поэтому сады и
+    # воспитатели читаются из базы, а не из кэша объектов
+    results = {'written': 0, 'unchanged': 0, 'removed': 0}
+    with objcache.bypassed():
+        for path in paths:
+            results[publish(path)] += 1
+    return results
+
+
+def process_queue(limit=100):
+    """Обрабатывает до limit задач очереди; возвращает счетчики publish_many.
+
+    Задача удаляется, только если ее не поставили заново во время отрисовки.
+    """
+    tasks = list(PrerenderTask.objects.order_by('requested_at')[:limit])
+    if not tasks:
+        return None
+    results = publish_many([task.path for task in tasks])
+    for task in tasks:
+        PrerenderTask.objects.filter(pk=task.pk, requested_at=task.requested_at).delete()
+    return results
+
+
+def remove_stale_files(paths):
+    """Удаляет опубликованные карточки садов, которых больше нет в paths."""
+    root = Path(settings.PRERENDER_ROOT)
+    expected = {file_for(path) for path in paths}
+    removed = 0
+    for existing in root.glob('**/index.html'):
+        if existing not in expected:
+            existing.unlink()
+            removed += 1
+    return removed
@@ -0,0 +1,246 @@
+# app/profiling.py
+# Профилирование отдельных запросов в рабочем окружении. Профиль снимается,
+# если сотрудник запросил его (?_profile=1 или заголовок X-Profile-Request: 1)
+# или если запрос попал в автоматическую выборку (PROFILING_SAMPLE_RATE) и
+# выполнялся дольше PROFILING_SLOW_MS. В профиль входят статистические
+# снимки стека (поток-сэмплер читает стек потока запроса раз в
+# PROFILING_INTERVAL_MS), хронология SQL-запросов и время отрисовки шаблонов.
+# Профили пишутся в PROFILING_ROOT, хранятся последние PROFILING_MAX_CAPTURES;
+# список и выгрузка (JSON и collapsed stacks для flamegraph.pl/speedscope) —
+# на странице /admin/profiles/.
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import base as template_base
+from django.utils import timezone
+
+CAPTURE_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+MAX_SQL_LENGTH = 2000
+MAX_QUERIES = 5000
+
+_active = threading.local()
+_prefixes = None
+
+
+def _short_filename(filename):
+    global _prefixes
+    if _prefixes is None:
+        _prefixes = sorted({str(settings.BASE_DIR), *filter(None, sys.path)}, key=len, reverse=True)
+    for prefix in _prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip(os.sep)
+    return filename
+
+
+def collapse(frame):
+    """Стек в формате collapsed stacks: "модуль:функция;...", от корня к листу."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        name = getattr(code, 'co_qualname', code.co_name)
+        names.append(f'{_short_filename(code.co_filename)}:{name}'.replace(' ', '_'))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True, name='profiling-sampler')
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Capture:
+    """Данные профиля одного запроса, собираемые во время его выполнения."""
+
+    def __init__(self, request, trigger):
+        self.trigger = trigger
+        self.request = request
+        self.started_at = timezone.now()
+        self.start = time.perf_counter()
+        self.queries = []
+        self.templates = []
+        self.template_depth = 0
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000)
+
+    def offset_ms(self, moment=None):
+        return round(((moment or time.perf_counter()) - self.start) * 1000, 3)
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: время каждого SQL-запроса
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'start_ms': self.offset_ms(start),
+                    'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                    'sql': sql[:MAX_SQL_LENGTH],
+                    'many': many,
+                    'alias': context['connection'].alias,
+                })
+
+    def result(self, response, duration):
+        sql_ms = sum(query['duration_ms'] for query in self.queries)
+        meta = {
+            'id': f'{self.started_at:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}',
+            'started_at': self.started_at.isoformat(),
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'user': self.request.user.get_username() if self.request.user.is_authenticated else '',
+            'trigger': self.trigger,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'queries': len(self.queries),
+            'sql_ms': round(sql_ms, 1),
+            'templates': len(self.templates),
+            'samples': sum(self.sampler.stacks.values()),
+        }
+        details = {
+            'interval_ms': settings.PROFILING_INTERVAL_MS,
+            'sql': self.queries,
+            'templates': self.templates,
+            'stacks': dict(self.sampler.stacks.most_common()),
+        }
+        return meta, details
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        capture = getattr(_active, 'capture', None)
+        if capture is None:
+            return render(self, context)
+        entry = {'name': self.name or '<string>', 'start_ms': capture.offset_ms(), 'depth': capture.template_depth}
+        capture.template_depth += 1
+        try:
+            return render(self, context)
+        finally:
+            capture.template_depth -= 1
+            entry['duration_ms'] = round(capture.offset_ms() - entry['start_ms'], 3)
+            capture.templates.append(entry)
+    wrapper.profiling_hook = True
+    return wrapper
+
+
+def install_template_hook():
+    # Template.render вызывается для каждого шаблона, включая {% include %};
+    # вне профилируемого запроса обертка сразу вызывает исходный метод
+    if not getattr(template_base.Template.render, 'profiling_hook', False):
+        template_base.Template.render = _timed_render(template_base.Template.render)
+
+
+def requested_trigger(request):
+    # Сначала флаг: request.user — это загрузка сессии и пользователя из базы
+    if request.GET.get('_profile') != '1' and request.META.get('HTTP_X_PROFILE_REQUEST') != '1':
+        return None
+    if not (request.user.is_authenticated and request.user.is_staff):
+        return None
+    return 'manual'
+
+
+class ProfilingMiddleware:
+    """Снимает профиль запроса по запросу сотрудника или выборочно для медленных."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_hook()
+
+    def __call__(self, request):
+        trigger = requested_trigger(request)
+        if trigger is None and random.random() < settings.PROFILING_SAMPLE_RATE:
+            trigger = 'sampled'
+        if trigger is None:
+            return self.get_response(request)
+
+        capture = Capture(request, trigger)
+        _active.capture = capture
+        capture.sampler.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(capture))
+                response = self.get_response(request)
+        finally:
+            capture.sampler.stop()
+            _active.capture = None
+        duration = time.perf_counter() - capture.start
+
+        if trigger == 'sampled' and duration * 1000 < settings.PROFILING_SLOW_MS:
+            return response
+        meta, details = capture.result(response, duration)
+        save(meta, details)
+        response['X-Profile-Id'] = meta['id']
+        return response
+
+
+# --- Хранение: кольцевой буфер файлов ---
+# Файл профиля — две строки JSON: краткие сведения (для списка) и данные.
+
+def root():
+    return Path(settings.PROFILING_ROOT)
+
+
+def save(meta, details):
+    directory = root()
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(meta, ensure_ascii=False) + '\n')
+        f.write(json.dumps(details, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, directory / f'{meta["id"]}.json')
+    # Имена начинаются с времени, поэтому старые профили — первые по порядку
+    captures = sorted(directory.glob('*.json'))
+    for old in captures[:max(len(captures) - settings.PROFILING_MAX_CAPTURES, 0)]:
+        old.unlink(missing_ok=True)
+
+
+def list_captures():
+    """Краткие сведения о сохраненных профилях, новые первыми."""
+    captures = []
+    for path in sorted(root().glob('*.json'), reverse=True):
+        try:
+            with path.open(encoding='utf-8') as f:
+                captures.append(json.loads(f.readline()))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def load(capture_id):
+    """(meta, details) профиля или None."""
+    if not CAPTURE_ID.match(capture_id):
+        return None
+    try:
+        with (root() / f'{capture_id}.json').open(encoding='utf-8') as f:
+            return json.loads(f.readline()), json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def collapsed_stacks(details):
+    return ''.join(f'{stack} {count}\n' for stack, count in details['stacks'].items())
@@ -0,0 +1,80 @@
+# app/seats.py
+# Поиск групп со свободными местами для ребенка заданного возраста и
+# похожих садов, где места есть.
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .ages import age_in_months
+from .models import Child, Enrollment, Group, SimilarKindergarten
+from .stats import rating_annotations
+
+
+def active_enrollments():
+    """Число активных записей группы — коррелированный подзапрос для queryset'а групп."""
+    active_count = Enrollment.objects.filter(
+        group=OuterRef('pk'), status='активна'
+    ).order_by().values('group').annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(active_count, output_field=IntegerField()), Value(0))
+
+
+def groups_with_free_seats(child_or_birth_date, on_date=None):
+    """Группы, подходящие ребенку по возрасту и имеющие свободные места.
+
+    Возраст сравнивается с индексированными полями min/max_age_months,
+    занятость и рейтинг сада считаются коррелированными подзапросами, поэтому
+    JOIN не размножает строки. Сортировка — по рейтингу сада, затем по числу мест.
+    """
+    birth_date = child_or_birth_date.birth_date if isinstance(child_or_birth_date, Child) else child_or_birth_date
+    on_date = on_date or timezone.localdate()
+    age = age_in_months(birth_date, on_date)
+    if age < 0:
+        return Group.objects.none()
+
+    _, rating = rating_annotations('kindergarten')
+
+    return (
+        Group.objects
+        .filter(min_age_months__lte=age, max_age_months__gt=age)
+        .annotate(
+            active_count=active_enrollments(),
+            kindergarten_rating=rating,
+        )
+        .annotate(free_seats=F('max_capacity') - F('active_count'))
+        .filter(free_seats__gt=0)
+        .select_related('kindergarten')
+        .order_by(F('kindergarten_rating').desc(nulls_last=True), '-free_seats', 'kindergarten__name', 'name')
+    )
+
+
+def free_seats_total(kindergarten_ref='pk'):
+    """Свободные места во всех группах сада (kindergarten_ref — путь к саду от модели queryset'а)."""
+    free_seats = (
+        Group.objects.filter(kindergarten=OuterRef(kindergarten_ref))
+        .annotate(active_count=active_enrollments())
+        .order_by().values('kindergarten')
+        .annotate(free=Sum(Greatest(F('max_capacity') - F('active_count'), Value(0))))
+        .values('free')
+    )
+    return Coalesce(Subquery(free_seats, output_field=IntegerField()), Value(0))
+
+
+def similar_with_free_seats(kindergarten_id, limit=4):
+    """Похожие сады (из SimilarKindergarten), в группах которых есть свободные места.
+
+    Один запрос по индексу (kindergarten, rank): свободные места и рейтинг
+    похожего сада — коррелированные подзапросы.
+    """
+    reviews_count, rating = rating_annotations('similar')
+    return list(
+        SimilarKindergarten.objects
+        .filter(kindergarten_id=kindergarten_id)
+        .annotate(
+            free_seats=free_seats_total('similar'),
+            similar_rating=rating,
+            similar_reviews_count=reviews_count,
+        )
+        .filter(free_seats__gt=0)
+        .select_related('similar')
+        .order_by('rank')[:limit]
+    )
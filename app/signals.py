@@ -0,0 +1,165 @@
+# app/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from . import changefeed, directory, duplicates, fuzzy, geo, leaderboard, lookups, media, objcache, prerender, stats
+from .caching import bump_namespace
+from .models import Child, Kindergarten, KindergartenTeacher, Review, Teacher
+
+
+def refresh_derived(*models):
+    """Сбрасывает производные данные (кэши, индексы), зависящие от моделей.
+
+    Вызывается из сигналов сохранения/удаления, а также явно после пакетных
+    UPDATE/DELETE по queryset, которые сигналы не отправляют.
+    """
+    models = set(models)
+    _refresh_derived(models)
+    # Другой процесс мог между сбросом и COMMIT снова закэшировать старые
+    # строки уже под новой версией — после фиксации сбрасываем еще раз
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _refresh_derived(models))
+
+
+def _refresh_derived(models):
+    if Kindergarten in models:
+        geo.invalidate_index()
+        objcache.kindergartens.invalidate()
+        bump_namespace(lookups.KINDERGARTEN_CHOICES_NAMESPACE)
+    if Teacher in models:
+        objcache.teachers.invalidate()
+    if models & {Teacher, KindergartenTeacher}:
+        bump_namespace(directory.CACHE_NAMESPACE)
+    if Review in models:
+        bump_namespace(stats.CACHE_NAMESPACE)
+
+
+TRACKED_MODELS = (Kindergarten, Teacher, KindergartenTeacher, Review)
+
+
+def model_changed(sender, instance, **kwargs):
+    refresh_derived(sender)
+
+
+for model in TRACKED_MODELS:
+    post_save.connect(model_changed, sender=model, dispatch_uid=f'refresh_derived_save_{model.__name__}')
+    post_delete.connect(model_changed, sender=model, dispatch_uid=f'refresh_derived_delete_{model.__name__}')
+
+
+def name_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(fuzzy.NAME_FIELDS):
+        return
+    fuzzy.index_object(instance)
+
+
+def name_deleted(sender, instance, **kwargs):
+    fuzzy.remove_object(instance)
+
+
+for model in (Child, Teacher):
+    post_save.connect(name_saved, sender=model, dispatch_uid=f'name_index_save_{model.__name__}')
+    post_delete.connect(name_deleted, sender=model, dispatch_uid=f'name_index_delete_{model.__name__}')
+
+
+def change_saved(sender, instance, created=False, update_fields=None, using=None, **kwargs):
+    action = changefeed.CREATE if created else changefeed.UPDATE
+    changefeed.record(sender, [instance.pk], action, update_fields, using=using)
+
+
+def change_deleted(sender, instance, using=None, **kwargs):
+    changefeed.record(sender, [instance.pk], changefeed.DELETE, using=using)
+
+
+for model in changefeed.TRACKED_MODELS:
+    post_save.connect(change_saved, sender=model, dispatch_uid=f'change_feed_save_{model.__name__}')
+    post_delete.connect(change_deleted, sender=model, dispatch_uid=f'change_feed_delete_{model.__name__}')
+
+
+def review_text_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'comment' not in update_fields):
+        return
+    duplicates.index_review(instance)
+
+
+def review_text_deleted(sender, instance, **kwargs):
+    duplicates.remove_review(instance)
+
+
+post_save.connect(review_text_saved, sender=Review, dispatch_uid='review_bands_save')
+post_delete.connect(review_text_deleted, sender=Review, dispatch_uid='review_bands_delete')
+
+
+def review_ranking_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Отзывы, удаляемые каскадом вместе с садом, место сада не меняют:
+    # его уже убрал kindergarten_ranking_removed
+    if raw or getattr(origin, 'model', type(origin)) is Kindergarten:
+        return
+    leaderboard.update_kindergartens([instance.kindergarten_id])
+
+
+def kindergarten_ranking_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        leaderboard.update_kindergartens([instance.pk])
+
+
+def kindergarten_ranking_removed(sender, instance, **kwargs):
+    # До удаления: каскад удалит места сада, и сдвинуть остальные будет не от чего
+    leaderboard.remove_kindergartens([instance.pk])
+
+
+post_save.connect(review_ranking_changed, sender=Review, dispatch_uid='leaderboard_review_save')
+post_delete.connect(review_ranking_changed, sender=Review, dispatch_uid='leaderboard_review_delete')
+post_save.connect(kindergarten_ranking_changed, sender=Kindergarten, dispatch_uid='leaderboard_kindergarten_save')
+pre_delete.connect(kindergarten_ranking_removed, sender=Kindergarten, dispatch_uid='leaderboard_kindergarten_delete')
+
+
+def page_changed(sender, instance, **kwargs):
+    prerender.enqueue(prerender.affected_paths(instance))
+
+
+def kindergarten_page_removed(sender, instance, **kwargs):
+    # До удаления: каскад удалит строки "Похожих садов", по которым ищутся карточки со ссылкой на сад
+    prerender.enqueue(prerender.listing_paths([instance.pk]))
+
+
+for model in prerender.DEPENDENT_MODELS:
+    post_save.connect(page_changed, sender=model, dispatch_uid=f'prerender_save_{model.__name__}')
+    post_delete.connect(page_changed, sender=model, dispatch_uid=f'prerender_delete_{model.__name__}')
+pre_delete.connect(kindergarten_page_removed, sender=Kindergarten, dispatch_uid='prerender_kindergarten_delete')
+
+
+def _file_names(instance):
+    return [getattr(instance, field.name).name for field in FILE_FIELDS[type(instance)]]
+
+
+def files_saving(sender, instance, raw=False, **kwargs):
+    # Прежние имена файлов нужны post_save, чтобы снять ссылки с замененных
+    instance._previous_file_names = []
+    if instance.pk is not None and not raw:
+        names = sender._default_manager.filter(pk=instance.pk).values_list(
+            *[field.name for field in FILE_FIELDS[sender]]
+        ).first()
+        instance._previous_file_names = list(names or [])
+
+
+def files_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_file_names', [])
+    current = _file_names(instance)
+    media.acquire_files(name for name in current if name not in previous)
+    media.release_files(name for name in previous if name not in current)
+
+
+def files_deleted(sender, instance, **kwargs):
+    media.release_files(_file_names(instance))
+
+
+FILE_FIELDS = {}
+for model, field in media.file_fields():
+    FILE_FIELDS.setdefault(model, []).append(field)
+
+for model in FILE_FIELDS:
+    pre_save.connect(files_saving, sender=model, dispatch_uid=f'media_refs_pre_save_{model.__name__}')
+    post_save.connect(files_saved, sender=model, dispatch_uid=f'media_refs_save_{model.__name__}')
+    post_delete.connect(files_deleted, sender=model, dispatch_uid=f'media_refs_delete_{model.__name__}')
@@ -0,0 +1,815 @@
+# app/snapshot.py
+# Снимок публичного каталога для киосков партнеров и edge-узлов: отдельный
+# файл SQLite только для чтения (сады с рейтингом и свободными местами,
+# группы, воспитатели, последние опубликованные отзывы, адреса фотографий).
+#
+# Сборка читает основную базу потоково (iterator), пишет во временный файл
+# без журнала, строит индексы после загрузки, сжимает файл VACUUM и заменяет
+# прежний снимок через os.replace. Рядом кладется манифест <снимок>.json
+# с версией и sha256 для проверки скопированного файла. Следующие сборки
+# по умолчанию инкрементальные: копия снимка дополняется событиями журнала
+# изменений (app/changefeed.py) после номера, записанного в снимке.
+#
+# Snapshot читает файл в режиме immutable через mmap и не открывает
+# соединений с основной базой; файл, замененный новой сборкой, открывается
+# заново при следующем запросе. Для страниц сайта строки снимка собираются
+# в те же модели, что у представлений по базе (несохраненные, со связями
+# в кэше prefetch_related), поэтому шаблоны общие.
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from collections import defaultdict, namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from . import changefeed, seats
+from .ages import age_in_months
+from .geo import GridIndex
+from .models import ChangeEvent, Group, Kindergarten, KindergartenImage, KindergartenTeacher, Review, Teacher
+from .stats import rating_annotations
+from .text import normalize_name, prefix_range
+
+# Меняется при изменении схемы снимка: старый снимок тогда собирается заново
+SCHEMA_VERSION = 2
+REVIEWS_PER_KINDERGARTEN = 20
+CHUNK_SIZE = 2000
+MMAP_SIZE = 256 * 1024 * 1024
+
+Table = namedtuple('Table', ['name', 'columns', 'key', 'source'])
+
+KINDERGARTEN_LIST_COLUMNS = (
+    'id, name, address, district, phone, latitude, longitude, capacity, description, is_recommended, '
+    'reviews_count, rating, free_seats, '
+    '(SELECT COUNT(*) FROM groups WHERE groups.kindergarten_id = kindergarten.id) AS groups_count, '
+    '(SELECT COUNT(*) FROM staff WHERE staff.kindergarten_id = kindergarten.id) AS teachers_count'
+)
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _by_rating(row):
+    return row['rating'] is None, -(row['rating'] or 0)
+
+
+# Сортировки списка садов, как в views._kindergarten_queryset: ORDER BY для
+# страниц и тот же порядок ключом Python для выборки по расстоянию
+KINDERGARTEN_ORDER = {
+    '': ('is_recommended DESC, rating DESC NULLS LAST, id',
+         lambda row: (-row['is_recommended'], *_by_rating(row), row['id'])),
+    'rating': ('rating DESC NULLS LAST, id', lambda row: (*_by_rating(row), row['id'])),
+    'name': ('name, id', lambda row: (row['name'], row['id'])),
+    'capacity': ('capacity DESC, id', lambda row: (-row['capacity'], row['id'])),
+    'recommended': ('is_recommended DESC, name, id', lambda row: (-row['is_recommended'], row['name'], row['id'])),
+}
+
+
+class SnapshotUnavailable(Exception):
+    pass
+
+
+def _chunks(ids, size=900):
+    # SQLite ограничивает число параметров в одном запросе
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _kindergartens(ids=None):
+    reviews_count, rating = rating_annotations()
+    rows = Kindergarten.objects.order_by('pk')
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+    rows = rows.annotate(
+        reviews_count=reviews_count, rating=rating, free_seats=seats.free_seats_total(),
+    ).values_list(
+        'pk', 'name', 'address', 'district', 'phone', 'latitude', 'longitude', 'capacity',
+        'established_at', 'description', 'features', 'is_recommended', 'reviews_count', 'rating', 'free_seats',
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield (*row, normalize_name(row[1]))
+
+
+def _groups(ids=None):
+    rows = Group.objects.order_by('pk')
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+    return rows.annotate(active_count=seats.active_enrollments()).values_list(
+        'pk', 'kindergarten_id', 'name', 'age_range', 'min_age_months', 'max_age_months',
+        'max_capacity', 'active_count',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _teachers(ids=None):
+    # Без телефонов: снимок уходит за пределы основной системы
+    rows = Teacher.objects.order_by('pk')
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+    return rows.values_list(
+        'pk', 'first_name', 'last_name', 'qualification', 'experience_years', 'search_name',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _staff(ids=None):
+    rows = KindergartenTeacher.objects.order_by('pk')
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+    return rows.values_list(
+        'pk', 'kindergarten_id', 'teacher_id', 'role', 'years_at_kindergarten',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _reviews(kindergarten_ids=None):
+    # Последние опубликованные отзывы каждого сада — ROW_NUMBER по саду
+    rows = Review.objects.filter(is_held=False)
+    if kindergarten_ids is not None:
+        rows = rows.filter(kindergarten_id__in=kindergarten_ids)
+    rows = rows.annotate(position=Window(
+        RowNumber(), partition_by=[F('kindergarten_id')], order_by=[F('created_at').desc(), F('pk').desc()],
+    )).filter(position__lte=REVIEWS_PER_KINDERGARTEN).order_by('pk')
+    return rows.values_list(
+        'pk', 'kindergarten_id', 'parent_name', 'rating', 'comment', 'created_at',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _images(ids=None):
+    storage = KindergartenImage._meta.get_field('image').storage
+    rows = KindergartenImage.objects.order_by('pk')
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+    for pk, kindergarten_id, name, caption, order in rows.values_list(
+        'pk', 'kindergarten_id', 'image', 'caption', 'order',
+    ).iterator(chunk_size=CHUNK_SIZE):
+        yield pk, kindergarten_id, storage.url(name) if name else '', caption, order
+
+
+# key — столбец, по которому строки таблицы заменяются при обновлении
+TABLES = [
+    Table('kindergarten', [
+        'id INTEGER PRIMARY KEY', 'name TEXT', 'address TEXT', 'district TEXT', 'phone TEXT',
+        'latitude REAL', 'longitude REAL', 'capacity INTEGER', 'established_at TEXT', 'description TEXT',
+        'features TEXT', 'is_recommended INTEGER', 'reviews_count INTEGER', 'rating REAL',
+        'free_seats INTEGER', 'search_name TEXT',
+    ], 'id', _kindergartens),
+    Table('groups', [
+        'id INTEGER PRIMARY KEY', 'kindergarten_id INTEGER', 'name TEXT', 'age_range TEXT',
+        'min_age_months INTEGER', 'max_age_months INTEGER', 'max_capacity INTEGER', 'active_count INTEGER',
+    ], 'id', _groups),
+    Table('teacher', [
+        'id INTEGER PRIMARY KEY', 'first_name TEXT', 'last_name TEXT', 'qualification TEXT',
+        'experience_years INTEGER', 'search_name TEXT',
+    ], 'id', _teachers),
+    Table('staff', [
+        'id INTEGER PRIMARY KEY', 'kindergarten_id INTEGER', 'teacher_id INTEGER', 'role TEXT',
+        'years_at_kindergarten INTEGER',
+    ], 'id', _staff),
+    Table('review', [
+        'id INTEGER PRIMARY KEY', 'kindergarten_id INTEGER', 'parent_name TEXT', 'rating INTEGER',
+        'comment TEXT', 'created_at TEXT',
+    ], 'kindergarten_id', _reviews),
+    Table('image', [
+        'id INTEGER PRIMARY KEY', 'kindergarten_id INTEGER', 'url TEXT', 'caption TEXT', '"order" INTEGER',
+    ], 'id', _images),
+]
+TABLES_BY_NAME = {table.name: table for table in TABLES}
+
+INDEXES = [
+    'CREATE INDEX kindergarten_district ON kindergarten (district)',
+    'CREATE INDEX teacher_search ON teacher (search_name)',
+    'CREATE INDEX groups_kindergarten ON groups (kindergarten_id)',
+    'CREATE INDEX groups_age ON groups (min_age_months, max_age_months)',
+    'CREATE INDEX staff_kindergarten ON staff (kindergarten_id)',
+    'CREATE INDEX staff_teacher ON staff (teacher_id)',
+    'CREATE INDEX review_kindergarten ON review (kindergarten_id, created_at)',
+    'CREATE INDEX review_created ON review (created_at)',
+    'CREATE INDEX image_kindergarten ON image (kindergarten_id, "order")',
+]
+
+# Таблица снимка для события журнала изменений (модели с ключом id)
+FEED_TABLES = {
+    'kindergarten': 'kindergarten',
+    'group': 'groups',
+    'teacher': 'teacher',
+    'kindergartenteacher': 'staff',
+    'kindergartenimage': 'image',
+}
+# Таблицы, строки которых удаляются вместе с садом
+KINDERGARTEN_TABLES = ('groups', 'staff', 'review', 'image')
+
+
+def _value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _insert(connection, table, rows):
+    placeholders = ', '.join(['?'] * len(table.columns))
+    connection.executemany(
+        f'INSERT OR REPLACE INTO {table.name} VALUES ({placeholders})',
+        (tuple(_value(value) for value in row) for row in rows),
+    )
+
+
+def _replace_rows(connection, table, keys):
+    """Заменяет строки table с key из keys свежими строками из основной базы."""
+    for chunk in _chunks(keys):
+        connection.execute(
+            f'DELETE FROM {table.name} WHERE {table.key} IN ({", ".join(["?"] * len(chunk))})', chunk,
+        )
+        _insert(connection, table, table.source(chunk))
+
+
+def _delete_rows(connection, table_name, column, keys):
+    for chunk in _chunks(keys):
+        connection.execute(f'DELETE FROM {table_name} WHERE {column} IN ({", ".join(["?"] * len(chunk))})', chunk)
+
+
+def manifest_path(path):
+    return path.with_name(path.name + '.json')
+
+
+def _default_path():
+    return Path(settings.CATALOGUE_SNAPSHOT_PATH)
+
+
+def _read_meta(connection):
+    return dict(connection.execute('SELECT key, value FROM meta'))
+
+
+def _write_meta(connection, meta):
+    connection.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [(k, str(v)) for k, v in meta.items()])
+
+
+def _feed_position():
+    return ChangeEvent.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _publish(tmp_path, path, meta):
+    """Сжимает и подписывает временный файл, затем атомарно заменяет им снимок."""
+    connection = sqlite3.connect(tmp_path)
+    connection.execute('VACUUM')
+    connection.close()
+    manifest = {**meta, 'size': tmp_path.stat().st_size, 'sha256': _sha256(tmp_path)}
+    tmp_manifest = manifest_path(tmp_path)
+    tmp_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    os.replace(tmp_manifest, manifest_path(path))
+    return manifest
+
+
+def _open_for_writing(path):
+    connection = sqlite3.connect(path)
+    # Временный файл: при сбое он просто выбрасывается, журнал не нужен
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+    return connection
+
+
+def build(path=None):
+    """Собирает снимок заново; возвращает манифест."""
+    path = Path(path or _default_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest(path)
+    # Номер события берется до чтения данных: изменения, сделанные во время
+    # сборки, применятся еще раз при следующем обновлении
+    change_seq = _feed_position()
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    tmp_path.unlink(missing_ok=True)
+    connection = _open_for_writing(tmp_path)
+    try:
+        connection.execute('PRAGMA page_size=4096')
+        connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID')
+        for table in TABLES:
+            connection.execute(f'CREATE TABLE {table.name} ({", ".join(table.columns)})')
+            _insert(connection, table, table.source())
+        for statement in INDEXES:
+            connection.execute(statement)
+        built_at = timezone.now().isoformat()
+        meta = {
+            'schema': SCHEMA_VERSION,
+            'version': (previous or {}).get('version', 0) + 1,
+            'built_at': built_at,
+            'full_build_at': built_at,
+            'change_seq': change_seq,
+        }
+        _write_meta(connection, meta)
+        connection.commit()
+    except BaseException:
+        connection.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    connection.close()
+    return _publish(tmp_path, path, meta)
+
+
+def _replay(since):
+    """Объекты, измененные и удаленные после события since: ({модель: ids}, {модель: ids}, новый since)."""
+    changed, removed = defaultdict(set), defaultdict(set)
+    while True:
+        page = changefeed.read(since)
+        for event in page['events']:
+            if event['action'] == changefeed.DELETE:
+                removed[event['model']].add(event['id'])
+                changed[event['model']].discard(event['id'])
+            else:
+                # Восстановление из архива создает объект с прежним id
+                changed[event['model']].add(event['id'])
+                removed[event['model']].discard(event['id'])
+        since = page['next']
+        if not page['has_more']:
+            return changed, removed, since
+
+
+def _apply(connection, changed, removed):
+    kindergartens_removed = removed['kindergarten']
+    _delete_rows(connection, 'kindergarten', 'id', kindergartens_removed)
+    for table_name in KINDERGARTEN_TABLES:
+        _delete_rows(connection, table_name, 'kindergarten_id', kindergartens_removed)
+
+    for model, table_name in FEED_TABLES.items():
+        _delete_rows(connection, table_name, 'id', removed[model])
+        _replace_rows(connection, TABLES_BY_NAME[table_name], changed[model])
+
+    # Список последних отзывов пересобирается для садов, чьи отзывы менялись;
+    # сад удаленного отзыва известен, только если отзыв был в снимке
+    review_kindergartens = set()
+    for chunk in _chunks(changed['review']):
+        review_kindergartens.update(Review.objects.filter(pk__in=chunk).values_list('kindergarten_id', flat=True))
+    for chunk in _chunks(removed['review']):
+        review_kindergartens.update(kindergarten_id for (kindergarten_id,) in connection.execute(
+            f'SELECT kindergarten_id FROM review WHERE id IN ({", ".join(["?"] * len(chunk))})', chunk,
+        ))
+    _replace_rows(connection, TABLES_BY_NAME['review'], review_kindergartens - kindergartens_removed)
+
+    # Рейтинг и свободные места — итоги по многим строкам: пересчитываются для
+    # всех садов одним запросом, это дешевле поиска затронутых
+    if changed['review'] or removed['review']:
+        reviews_count, rating = rating_annotations()
+        rows = Kindergarten.objects.order_by().annotate(reviews_count=reviews_count, rating=rating)
+        connection.executemany(
+            'UPDATE kindergarten SET reviews_count = ?, rating = ? WHERE id = ?',
+            rows.values_list('reviews_count', 'rating', 'pk').iterator(chunk_size=CHUNK_SIZE),
+        )
+    if changed['enrollment'] or removed['enrollment'] or changed['group'] or removed['group']:
+        groups = Group.objects.order_by().annotate(active_count=seats.active_enrollments())
+        connection.executemany(
+            'UPDATE groups SET active_count = ? WHERE id = ?',
+            groups.values_list('active_count', 'pk').iterator(chunk_size=CHUNK_SIZE),
+        )
+        connection.execute(
+            'UPDATE kindergarten SET free_seats = COALESCE((SELECT SUM(MAX(max_capacity - active_count, 0)) '
+            'FROM groups WHERE groups.kindergarten_id = kindergarten.id), 0)'
+        )
+
+
+def refresh(path=None):
+    """Обновляет снимок по журналу изменений; без снимка или при другой схеме — build().
+
+    Возвращает манифест нового снимка или None, если изменений не было.
+    """
+    path = Path(path or _default_path())
+    previous = read_manifest(path)
+    if not path.exists() or previous is None or previous.get('schema') != SCHEMA_VERSION:
+        return build(path)
+    changed, removed, change_seq = _replay(previous['change_seq'])
+    if change_seq == previous['change_seq']:
+        return None
+
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    shutil.copyfile(path, tmp_path)
+    connection = _open_for_writing(tmp_path)
+    try:
+        _apply(connection, changed, removed)
+        meta = {
+            **_read_meta(connection),
+            'version': previous['version'] + 1,
+            'built_at': timezone.now().isoformat(),
+            'change_seq': change_seq,
+        }
+        _write_meta(connection, meta)
+        connection.commit()
+    except BaseException:
+        connection.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    connection.close()
+    return _publish(tmp_path, path, _typed_meta(meta))
+
+
+def _typed_meta(meta):
+    meta = dict(meta)
+    for key in ('schema', 'version', 'change_seq'):
+        meta[key] = int(meta[key])
+    return meta
+
+
+def read_manifest(path=None):
+    try:
+        return json.loads(manifest_path(Path(path or _default_path())).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def verify(path=None):
+    """Совпадает ли sha256 файла снимка с манифестом."""
+    path = Path(path or _default_path())
+    manifest = read_manifest(path)
+    return manifest is not None and path.exists() and _sha256(path) == manifest['sha256']
+
+
+class Snapshot:
+    """Чтение снимка каталога: свое соединение SQLite у каждого потока."""
+
+    def __init__(self, path):
+        self.path = Path(path).resolve()
+        self._local = threading.local()
+
+    def _state(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            raise SnapshotUnavailable(f'Снимок каталога не найден: {self.path}')
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        local = self._local
+        if getattr(local, 'signature', None) != signature:
+            if getattr(local, 'connection', None) is not None:
+                local.connection.close()
+            # immutable: файл не меняется на месте (новая сборка — новый файл),
+            # поэтому SQLite не берет блокировок и не проверяет журнал
+            connection = sqlite3.connect(f'{self.path.as_uri()}?mode=ro&immutable=1', uri=True)
+            connection.row_factory = sqlite3.Row
+            connection.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            try:
+                meta = _typed_meta(_read_meta(connection))
+            except (sqlite3.DatabaseError, KeyError) as e:
+                connection.close()
+                raise SnapshotUnavailable(f'Снимок каталога поврежден: {e}')
+            local.connection, local.signature, local.meta, local.geo_index = connection, signature, meta, None
+        return local
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._state().connection.execute(sql, params)]
+
+    @property
+    def meta(self):
+        return self._state().meta
+
+    def _kindergarten_condition(self, district='', search='', text='', ids=None):
+        # search — подстрока нормализованного названия (API каталога), text —
+        # подстрока любого из полей, как поиск на странице списка по базе
+        where, params = [], []
+        if district:
+            where.append('district = ?')
+            params.append(district)
+        if search:
+            where.append("search_name LIKE ? ESCAPE '\\'")
+            params.append(f'%{_escape_like(normalize_name(search))}%')
+        if text:
+            fields = ['name', 'address', 'district', 'description', 'features']
+            where.append('(' + ' OR '.join(f"{field} LIKE ? ESCAPE '\\'" for field in fields) + ')')
+            params.extend([f'%{_escape_like(text)}%'] * len(fields))
+        if ids is not None:
+            where.append(f'id IN ({", ".join(["?"] * len(ids))})')
+            params.extend(ids)
+        return f'WHERE {" AND ".join(where)}' if where else '', params
+
+    def kindergarten_count(self, district='', search='', text=''):
+        condition, params = self._kindergarten_condition(district, search, text)
+        return self._state().connection.execute(f'SELECT COUNT(*) FROM kindergarten {condition}', params).fetchone()[0]
+
+    def kindergarten_rows(self, district='', search='', text='', sort='', limit=24, offset=0, ids=None):
+        """Строки списка садов в порядке sort (ключ KINDERGARTEN_ORDER)."""
+        condition, params = self._kindergarten_condition(district, search, text, ids)
+        order, _ = KINDERGARTEN_ORDER.get(sort, KINDERGARTEN_ORDER[''])
+        return self._query(
+            f'SELECT {KINDERGARTEN_LIST_COLUMNS} FROM kindergarten {condition} ORDER BY {order} LIMIT ? OFFSET ?',
+            [*params, -1 if limit is None else limit, offset],
+        )
+
+    def kindergartens(self, district='', search='', limit=24, offset=0):
+        """(число садов, страница садов) по району и подстроке названия."""
+        return (
+            self.kindergarten_count(district, search),
+            self.kindergarten_rows(district, search, limit=limit, offset=offset),
+        )
+
+    def kindergartens_within(self, lat, lon, radius_km, district='', text='', sort=''):
+        """Сады в радиусе radius_km со столбцом distance_km; без sort — ближайшие первыми."""
+        distances = {pk: km for km, pk in self._geo_index().within(lat, lon, radius_km)}
+        rows = []
+        for chunk in _chunks(distances):
+            rows.extend(self.kindergarten_rows(district, text=text, limit=None, ids=chunk))
+        for row in rows:
+            row['distance_km'] = distances[row['id']]
+        if sort in KINDERGARTEN_ORDER:
+            rows.sort(key=KINDERGARTEN_ORDER[sort][1])
+        else:
+            rows.sort(key=lambda row: row['distance_km'])
+        return rows
+
+    def districts(self):
+        return [district for (district,) in self._state().connection.execute(
+            "SELECT DISTINCT district FROM kindergarten WHERE district != '' ORDER BY district"
+        )]
+
+    def kindergarten_choices(self):
+        """Список {'id', 'name'} всех садов в порядке названия, как lookups.kindergarten_choices."""
+        return self._query('SELECT id, name FROM kindergarten ORDER BY name, id')
+
+    def kindergarten(self, pk):
+        """Карточка сада с группами, сотрудниками, отзывами и фотографиями или None."""
+        rows = self._query('SELECT * FROM kindergarten WHERE id = ?', [pk])
+        if not rows:
+            return None
+        kindergarten = rows[0]
+        del kindergarten['search_name']
+        kindergarten['groups'] = self._query(
+            'SELECT id, name, age_range, min_age_months, max_age_months, max_capacity, active_count, '
+            'MAX(max_capacity - active_count, 0) AS free_seats FROM groups WHERE kindergarten_id = ? ORDER BY name, id',
+            [pk],
+        )
+        kindergarten['staff'] = self._query(
+            'SELECT t.id, t.first_name, t.last_name, t.qualification, t.experience_years, s.role, '
+            's.years_at_kindergarten FROM staff s JOIN teacher t ON t.id = s.teacher_id '
+            'WHERE s.kindergarten_id = ? ORDER BY t.last_name, t.first_name',
+            [pk],
+        )
+        kindergarten['reviews'] = self._query(
+            'SELECT id, parent_name, rating, comment, created_at FROM review '
+            'WHERE kindergarten_id = ? ORDER BY created_at DESC, id DESC',
+            [pk],
+        )
+        kindergarten['images'] = self._query(
+            'SELECT id, url, caption FROM image WHERE kindergarten_id = ? ORDER BY "order", id', [pk],
+        )
+        return kindergarten
+
+    def free_seats(self, birth_date, on_date=None, limit=50):
+        """Группы со свободными местами для ребенка, как seats.groups_with_free_seats."""
+        age = age_in_months(birth_date, on_date or timezone.localdate())
+        if age < 0:
+            return []
+        return self._query(
+            'SELECT g.id, g.name, g.age_range, g.max_capacity, MAX(g.max_capacity - g.active_count, 0) AS free_seats, '
+            'k.id AS kindergarten_id, k.name AS kindergarten_name, k.address, k.rating '
+            'FROM groups g JOIN kindergarten k ON k.id = g.kindergarten_id '
+            'WHERE g.min_age_months <= ? AND g.max_age_months > ? AND g.max_capacity > g.active_count '
+            'ORDER BY k.rating DESC NULLS LAST, free_seats DESC, k.name, g.name LIMIT ?',
+            [age, age, -1 if limit is None else limit],
+        )
+
+    def reviews(self, kindergarten_id=None, limit=10, offset=0):
+        """(число отзывов, страница) последних опубликованных отзывов с названием сада."""
+        condition, params = ('WHERE r.kindergarten_id = ?', [kindergarten_id]) if kindergarten_id is not None else ('', [])
+        connection = self._state().connection
+        total = connection.execute(f'SELECT COUNT(*) FROM review r {condition}', params).fetchone()[0]
+        rows = self._query(
+            'SELECT r.id, r.kindergarten_id, k.name AS kindergarten_name, r.parent_name, r.rating, r.comment, '
+            f'r.created_at FROM review r JOIN kindergarten k ON k.id = r.kindergarten_id {condition} '
+            'ORDER BY r.created_at DESC, r.id DESC LIMIT ? OFFSET ?',
+            [*params, limit, offset],
+        )
+        return total, rows
+
+    def review_stats(self, kindergarten_id=None):
+        """(число отзывов, средняя оценка) с учетом архива — итоги садов, посчитанные при сборке."""
+        condition, params = ('WHERE id = ?', [kindergarten_id]) if kindergarten_id is not None else ('', [])
+        count, rating_sum = self._state().connection.execute(
+            f'SELECT COALESCE(SUM(reviews_count), 0), COALESCE(SUM(reviews_count * rating), 0) '
+            f'FROM kindergarten {condition}',
+            params,
+        ).fetchone()
+        return count, rating_sum / count if count else 0
+
+    def _teacher_condition(self, search='', qualification='', role='', kindergarten_id=None):
+        where, params = [], []
+        words = normalize_name(search).split()
+        if words:
+            # Как directory.search_teachers: префикс "фамилия имя" в любом порядке слов
+            variants = {' '.join(words)}
+            if len(words) == 2:
+                variants.add(f'{words[1]} {words[0]}')
+            where.append(f'({" OR ".join(["(search_name >= ? AND search_name < ?)"] * len(variants))})')
+            for variant in sorted(variants):
+                params.extend(prefix_range(variant))
+        if qualification:
+            where.append('qualification = ?')
+            params.append(qualification)
+        if role or kindergarten_id:
+            staff = ['s.teacher_id = teacher.id']
+            if kindergarten_id:
+                staff.append('s.kindergarten_id = ?')
+                params.append(kindergarten_id)
+            if role:
+                staff.append('s.role = ?')
+                params.append(role)
+            where.append(f'EXISTS (SELECT 1 FROM staff s WHERE {" AND ".join(staff)})')
+        return f'WHERE {" AND ".join(where)}' if where else '', params
+
+    def teacher_count(self, **filters):
+        condition, params = self._teacher_condition(**filters)
+        return self._state().connection.execute(f'SELECT COUNT(*) FROM teacher {condition}', params).fetchone()[0]
+
+    def teacher_rows(self, limit=12, offset=0, **filters):
+        """Страница воспитателей; у каждого assignments — места работы с названием сада."""
+        condition, params = self._teacher_condition(**filters)
+        rows = self._query(
+            'SELECT id, first_name, last_name, qualification, experience_years FROM teacher '
+            f'{condition} ORDER BY last_name, first_name, id LIMIT ? OFFSET ?',
+            [*params, limit, offset],
+        )
+        assignments = defaultdict(list)
+        if rows:
+            for row in self._query(
+                'SELECT s.teacher_id, s.role, s.years_at_kindergarten, k.id AS kindergarten_id, '
+                'k.name AS kindergarten_name FROM staff s JOIN kindergarten k ON k.id = s.kindergarten_id '
+                f'WHERE s.teacher_id IN ({", ".join(["?"] * len(rows))}) ORDER BY k.name, s.id',
+                [row['id'] for row in rows],
+            ):
+                assignments[row.pop('teacher_id')].append(row)
+        for row in rows:
+            row['assignments'] = assignments[row['id']]
+        return rows
+
+    def _geo_index(self):
+        # Сетка строится по снимку один раз на его версию
+        state = self._state()
+        if state.geo_index is None:
+            state.geo_index = GridIndex(state.connection.execute(
+                'SELECT id, latitude, longitude FROM kindergarten WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+            ))
+        return state.geo_index
+
+    def nearby(self, lat, lon, limit, max_radius_km=None):
+        """[(км, сад)] ближайших садов."""
+        hits = self._geo_index().nearest(lat, lon, limit, max_radius_km=max_radius_km)
+        if not hits:
+            return []
+        rows = {row['id']: row for row in self._query(
+            f'SELECT id, name, address, latitude, longitude, rating, free_seats FROM kindergarten '
+            f'WHERE id IN ({", ".join(["?"] * len(hits))})',
+            [pk for _, pk in hits],
+        )}
+        return [(km, rows[pk]) for km, pk in hits if pk in rows]
+
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def get_snapshot(path=None):
+    path = Path(path or _default_path())
+    with _lock:
+        if path not in _snapshots:
+            _snapshots[path] = Snapshot(path)
+        return _snapshots[path]
+
+
+class Rows:
+    """Выборка снимка как последовательность для Paginator, по образцу leaderboard.Ranking.
+
+    count — число строк, fetch(limit, offset) — строки страницы, build —
+    модель из строки; срез читает только свою страницу.
+    """
+
+    def __init__(self, count, fetch, build):
+        self._count = count
+        self.fetch = fetch
+        self.build = build
+
+    def count(self):
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop if index.stop is not None else self.count()
+        return [self.build(row) for row in self.fetch(stop - start, start)]
+
+
+def _prefetched(instance, **related):
+    # Связанные списки кладутся туда же, куда их кладет prefetch_related:
+    # manager.all() отдает их без запроса к базе
+    instance._prefetched_objects_cache = related
+    return instance
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value) if value else None
+
+
+def _datetime(value):
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def build_kindergarten(row):
+    """Несохраненный Kindergarten из строки списка снимка с аннотациями списка садов."""
+    kindergarten = Kindergarten(
+        pk=row['id'], name=row['name'], address=row['address'], district=row['district'],
+        phone=row['phone'], latitude=row['latitude'], longitude=row['longitude'],
+        capacity=row['capacity'], description=row['description'],
+        is_recommended=bool(row['is_recommended']),
+    )
+    kindergarten.avg_rating_value = row['rating']
+    kindergarten.reviews_count = row['reviews_count']
+    kindergarten.groups_count_value = row['groups_count']
+    kindergarten.teachers_count_value = row['teachers_count']
+    if 'distance_km' in row:
+        kindergarten.distance_km = row['distance_km']
+    return kindergarten
+
+
+def build_review(row, kindergarten=None):
+    review = Review(
+        pk=row['id'], parent_name=row['parent_name'], rating=row['rating'], comment=row['comment'],
+        created_at=_datetime(row['created_at']),
+    )
+    review.kindergarten = kindergarten or Kindergarten(pk=row['kindergarten_id'], name=row['kindergarten_name'])
+    return review
+
+
+def build_teacher(row):
+    """Несохраненный Teacher с assignments, как у directory.search_teachers; телефонов в снимке нет."""
+    teacher = Teacher(
+        pk=row['id'], first_name=row['first_name'], last_name=row['last_name'],
+        qualification=row['qualification'], experience_years=row['experience_years'],
+    )
+    teacher.assignments = [
+        KindergartenTeacher(
+            teacher=teacher, role=assignment['role'], years_at_kindergarten=assignment['years_at_kindergarten'],
+            kindergarten=Kindergarten(pk=assignment['kindergarten_id'], name=assignment['kindergarten_name']),
+        )
+        for assignment in row['assignments']
+    ]
+    return teacher
+
+
+def build_free_seat_group(row):
+    """Несохраненная Group с аннотациями seats.groups_with_free_seats."""
+    group = Group(pk=row['id'], name=row['name'], age_range=row['age_range'], max_capacity=row['max_capacity'])
+    group.kindergarten = Kindergarten(pk=row['kindergarten_id'], name=row['kindergarten_name'], address=row['address'])
+    group.free_seats = row['free_seats']
+    group.kindergarten_rating = row['rating']
+    return group
+
+
+def build_kindergarten_card(data):
+    """Kindergarten карточки сада со связями из Snapshot.kindergarten() в кэше prefetch_related.
+
+    Имен детей в снимке нет: у групп пустой enrollment_set и active_count
+    из снимка.
+    """
+    kindergarten = Kindergarten(
+        pk=data['id'], name=data['name'], address=data['address'], district=data['district'],
+        phone=data['phone'], latitude=data['latitude'], longitude=data['longitude'],
+        capacity=data['capacity'], established_at=_date(data['established_at']),
+        description=data['description'], features=data['features'],
+        is_recommended=bool(data['is_recommended']),
+    )
+    groups = []
+    for row in data['groups']:
+        group = Group(
+            pk=row['id'], kindergarten=kindergarten, name=row['name'], age_range=row['age_range'],
+            min_age_months=row['min_age_months'], max_age_months=row['max_age_months'],
+            max_capacity=row['max_capacity'],
+        )
+        group.active_count = row['active_count']
+        groups.append(_prefetched(group, enrollment_set=[]))
+    staff = [
+        KindergartenTeacher(
+            kindergarten=kindergarten, role=row['role'], years_at_kindergarten=row['years_at_kindergarten'],
+            teacher=Teacher(
+                pk=row['id'], first_name=row['first_name'], last_name=row['last_name'],
+                qualification=row['qualification'], experience_years=row['experience_years'],
+            ),
+        )
+        for row in data['staff']
+    ]
+    reviews = [build_review(row, kindergarten) for row in data['reviews']]
+    return _prefetched(kindergarten, group_set=groups, kindergartenteacher_set=staff, review_set=reviews)
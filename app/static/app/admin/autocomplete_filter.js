@@ -0,0 +1,14 @@
+// Фильтры списков админки с автодополнением (app/admin_filters.py):
+// выбор значения сразу открывает список с этим фильтром.
+'use strict';
+{
+    const $ = django.jQuery;
+    $(document).on('change', 'select.autocomplete-filter', function() {
+        const base = this.closest('.autocomplete-filter-field').dataset.baseUrl;
+        const url = new URL(base, window.location.href);
+        if (this.value) {
+            url.searchParams.set(this.dataset.param, this.value);
+        }
+        window.location.href = url.href;
+    });
+}
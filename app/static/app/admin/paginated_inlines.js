@@ -0,0 +1,109 @@
+// Постраничные инлайны формы изменения (app/admin_inlines.py):
+// "Показать еще" дозагружает строки, а при сохранении в формсетах остаются
+// только измененные существующие строки и новые.
+'use strict';
+{
+    const $ = django.jQuery;
+
+    function renumber(group, prefix) {
+        // Как updateElementIndex в admin/js/inlines.js: индексы форм подряд с нуля
+        const pattern = new RegExp('(' + prefix + '-(\\d+|__prefix__))');
+        const rows = group.querySelectorAll('tbody > tr.form-row:not(.empty-form)');
+        rows.forEach(function(row, index) {
+            const replacement = prefix + '-' + index;
+            row.id = row.id.replace(pattern, replacement);
+            row.querySelectorAll('[id], [name], [for]').forEach(function(el) {
+                ['id', 'name', 'for'].forEach(function(attr) {
+                    const value = el.getAttribute(attr);
+                    if (value) {
+                        el.setAttribute(attr, value.replace(pattern, replacement));
+                    }
+                });
+            });
+        });
+        document.getElementById('id_' + prefix + '-TOTAL_FORMS').value = rows.length;
+        document.getElementById('id_' + prefix + '-INITIAL_FORMS').value =
+            group.querySelectorAll('tbody > tr.form-row.has_original').length;
+    }
+
+    function loadedPks(group, prefix) {
+        const pattern = new RegExp('^' + prefix + '-\\d+-id$');
+        return new Set(Array.from(group.querySelectorAll('input[type=hidden]'))
+            .filter(function(input) { return pattern.test(input.name); })
+            .map(function(input) { return input.value; }));
+    }
+
+    function appendFormsetRows(control, html) {
+        const prefix = control.dataset.prefix;
+        const group = document.getElementById(prefix + '-group');
+        const page = document.createElement('div');
+        page.innerHTML = html;
+        const known = loadedPks(group, prefix);
+        const tbody = group.querySelector('tbody');
+        // Существующие строки идут перед новыми: их индексы меньше INITIAL_FORMS
+        const firstNew = tbody.querySelector('tr.form-row:not(.has_original)');
+        const added = [];
+        page.querySelectorAll('tbody > tr.form-row.has_original').forEach(function(row) {
+            const pk = row.querySelector('input[type=hidden][name$="-id"]');
+            if (pk && known.has(pk.value)) {
+                return;
+            }
+            row.classList.add('dynamic-' + prefix);
+            tbody.insertBefore(row, firstNew);
+            added.push(row);
+        });
+        renumber(group, prefix);
+        added.forEach(function(row) {
+            // Виджеты (автодополнение, календарь) подключаются к новым строкам по этому событию
+            row.dispatchEvent(new CustomEvent('formset:added', {bubbles: true, detail: {formsetName: prefix}}));
+        });
+    }
+
+    $(document).on('click', '.paginated-inline-more', function() {
+        const button = this;
+        const control = button.parentElement;
+        const url = new URL(control.dataset.url, window.location.href);
+        url.searchParams.set('offset', control.dataset.offset);
+        button.disabled = true;
+        fetch(url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function(data) {
+                if (control.classList.contains('paginated-rows')) {
+                    document.querySelector(control.dataset.target).insertAdjacentHTML('beforeend', data.html);
+                } else {
+                    appendFormsetRows(control, data.html);
+                }
+                control.dataset.offset = data.next;
+                if (data.has_more) {
+                    button.disabled = false;
+                } else {
+                    button.remove();
+                }
+            })
+            .catch(function() {
+                button.disabled = false;
+            });
+    });
+
+    // Правка существующей строки помечает ее для отправки
+    $(document).on('input change', 'tr.form-row.has_original :input', function() {
+        this.closest('tr.form-row').dataset.changed = '1';
+    });
+
+    $(document).on('submit', 'form', function() {
+        // После ошибки проверки в форме уже только отправленные строки — их не трогаем
+        this.querySelectorAll('.paginated-inline:not([data-bound])').forEach(function(control) {
+            const prefix = control.dataset.prefix;
+            const group = document.getElementById(prefix + '-group');
+            group.querySelectorAll('tbody > tr.form-row.has_original:not([data-changed])').forEach(function(row) {
+                row.remove();
+            });
+            renumber(group, prefix);
+        });
+    });
+}
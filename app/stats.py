@@ -0,0 +1,79 @@
+# app/stats.py
+# Статистика отзывов (число, средняя оценка, гистограмма) одним агрегирующим
+# запросом с кэшированием по фильтру. Кэш сбрасывается при записи отзывов.
+# Отзывы, перенесенные в архив, учитываются через ReviewArchiveTotals.
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .caching import namespaced_key
+from .models import Review, ReviewArchiveTotals
+
+CACHE_NAMESPACE = 'review-stats'
+CACHE_TIMEOUT = 60 * 60
+
+RATINGS = range(1, 6)
+
+# archived — сколько из count приходится на архив (в списках отзывов их нет)
+ReviewStats = namedtuple('ReviewStats', ['count', 'average', 'histogram', 'archived'], defaults=(0,))
+
+
+def review_stats(kindergarten_id=None):
+    key = namespaced_key(CACHE_NAMESPACE, 'all' if kindergarten_id is None else kindergarten_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = _compute(kindergarten_id)
+        cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
+
+
+def _compute(kindergarten_id):
+    # Задержанные модерацией отзывы в статистику не входят
+    reviews = Review.objects.filter(is_held=False)
+    totals = ReviewArchiveTotals.objects.all()
+    if kindergarten_id is not None:
+        reviews = reviews.filter(kindergarten_id=kindergarten_id)
+        totals = totals.filter(kindergarten_id=kindergarten_id)
+    row = reviews.aggregate(
+        count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS},
+    )
+    archived = totals.aggregate(
+        count=Sum('count'),
+        rating_sum=Sum('rating_sum'),
+        **{f'rating_{rating}': Sum(f'rating_{rating}') for rating in RATINGS},
+    )
+    count = row['count'] + (archived['count'] or 0)
+    rating_sum = (row['rating_sum'] or 0) + (archived['rating_sum'] or 0)
+    return ReviewStats(
+        count=count,
+        average=rating_sum / count if count else 0,
+        histogram={
+            rating: row[f'rating_{rating}'] + (archived[f'rating_{rating}'] or 0)
+            for rating in RATINGS
+        },
+        archived=archived['count'] or 0,
+    )
+
+
+def rating_annotations(kindergarten_ref='pk'):
+    """Выражения (число отзывов, средняя оценка) для аннотации queryset'а.
+
+    kindergarten_ref — путь к саду от модели queryset'а ('pk' для садов,
+    'kindergarten' для групп). Рабочая таблица считается коррелированными
+    подзапросами, поэтому JOIN'ы с другими связями не размножают оценки.
+    """
+    hot = Review.objects.filter(kindergarten=OuterRef(kindergarten_ref), is_held=False).order_by().values('kindergarten')
+    archived = ReviewArchiveTotals.objects.filter(kindergarten=OuterRef(kindergarten_ref))
+    count = (
+        Coalesce(Subquery(hot.annotate(n=Count('id')).values('n')), Value(0))
+        + Coalesce(Subquery(archived.values('count')), Value(0))
+    )
+    rating_sum = (
+        Coalesce(Subquery(hot.annotate(s=Sum('rating')).values('s')), Value(0))
+        + Coalesce(Subquery(archived.values('rating_sum')), Value(0))
+    )
+    return count, Cast(rating_sum, FloatField()) / NullIf(count, Value(0))
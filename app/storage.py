@@ -0,0 +1,75 @@
+# app/storage.py
+# Хранилище фотографий, в котором имя файла — SHA-256 содержимого:
+# kindergartens/images/ab/ab12...ef.jpg. Одинаковые загрузки хранятся один
+# раз, а URL файла никогда не меняет содержимое, поэтому его можно кэшировать
+# бессрочно. Пример для nginx:
+#
+#     location /media/kindergartens/images/ {
+#         alias /srv/app/media/kindergartens/images/;
+#         add_header Cache-Control "public, max-age=31536000, immutable";
+#     }
+#
+# Сколько строк ссылается на файл, учитывает StoredBlob (см. app/media.py).
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.[a-z0-9]+)?$')
+
+
+def is_content_name(name):
+    return bool(CONTENT_NAME.search(name))
+
+
+def hash_chunks(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, hexdigest):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save; совпадение имен — это
+        # совпадение содержимого, а не конфликт
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        # Содержимое читается один раз: хэшируем и пишем во временный файл,
+        # который затем переименовывается в имя по хэшу
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            name = self.content_name(name, digest.hexdigest())
+            target = self.path(name)
+            if os.path.exists(target):
+                os.unlink(tmp_path)
+                # Файл снова нужен: сборщик (media.sweep) не удаляет недавно тронутые файлы
+                os.utime(target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
@@ -0,0 +1,81 @@
+# app/templatetags/catalog.py
+# Теги и фильтры каталога. Звезды рейтинга, склонение по числу и обрезка
+# длинных списков считаются в Python один раз на объект вместо циклов
+# в шаблоне с цепочками floatformat/add/stringformat на каждую звезду.
+from functools import lru_cache
+from typing import NamedTuple
+
+from django import template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+MAX_STARS = 5
+
+
+@lru_cache(maxsize=None)
+def _stars_html(halves, css_class):
+    # halves — рейтинг в половинах звезды (0..10); вариантов мало, HTML кэшируется
+    full, half = divmod(halves, 2)
+    suffix = f' {css_class}' if css_class else ''
+    icons = (
+        [f'<i class="fas fa-star{suffix}"></i>'] * full
+        + [f'<i class="fas fa-star-half-alt{suffix}"></i>'] * half
+        + [f'<i class="far fa-star{suffix}"></i>'] * (MAX_STARS - full - half)
+    )
+    return mark_safe(''.join(icons))
+
+
+@register.simple_tag
+def stars(rating, css_class=''):
+    """Пять звезд рейтинга с точностью до половины: {% stars avg_rating "text-warning" %}."""
+    try:
+        rating = float(rating or 0)
+    except (TypeError, ValueError):
+        rating = 0.0
+    halves = min(max(int(rating * 2 + 0.5), 0), MAX_STARS * 2)
+    return _stars_html(halves, css_class)
+
+
+@lru_cache(maxsize=64)
+def _plural_forms(forms):
+    one, few, many = forms.split(',')
+    return one, few, many
+
+
+@register.filter
+def ru_plural(number, forms):
+    """Форма слова для числа: {{ n|ru_plural:"отзыв,отзыва,отзывов" }}."""
+    one, few, many = _plural_forms(forms)
+    try:
+        number = abs(int(number))
+    except (TypeError, ValueError):
+        return many
+    if number % 10 == 1 and number % 100 != 11:
+        return one
+    if 2 <= number % 10 <= 4 and not 12 <= number % 100 <= 14:
+        return few
+    return many
+
+
+@register.filter
+def with_plural(number, forms):
+    """Число вместе со словом: {{ reviews_count|with_plural:"отзыв,отзыва,отзывов" }}."""
+    return f'{number} {ru_plural(number, forms)}'
+
+
+class Capped(NamedTuple):
+    items: list
+    total: int
+    rest: int
+
+
+@register.simple_tag
+def capped(items, limit):
+    """Первые limit элементов и сколько осталось: {% capped group.enrollment_set.all 8 as children %}.
+
+    Список вычисляется один раз — из кэша prefetch_related, без COUNT-запросов.
+    """
+    items = list(items)
+    return Capped(items[:limit], len(items), max(len(items) - limit, 0))
+
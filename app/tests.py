@@ -1,3 +1,518 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, changefeed, deletion, intake, leaderboard, media, profiling, snapshot, stats
+from .models import (
+    ArchivedEnrollment, ChangeEvent, Child, Enrollment, EnrollmentApplication, FileCleanupTask, Group,
+    Kindergarten, KindergartenImage, KindergartenTeacher, Leaderboard, LeaderboardEntry, Review, StoredBlob,
+    Teacher,
+)
+
+# Файловый кэш из настроек общий с запущенным сайтом: в тестах — свой, в памяти
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_kindergarten(name='Солнышко', **fields):
+    return Kindergarten.objects.create(
+        name=name, address='ул. Ленина, 1', capacity=100, established_at=datetime.date(2000, 1, 1), **fields,
+    )
+
+
+def make_teacher(first_name='Анна'):
+    return Teacher.objects.create(
+        first_name=first_name, last_name='Иванова', phone_number='+7 900 000-00-00',
+        qualification='высшая', experience_years=5,
+    )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CacheIsolatedTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+
+class ChangeFeedTests(CacheIsolatedTestCase):
+    def events(self, model='teacher'):
+        return list(
+            ChangeEvent.objects.filter(model=model).order_by('pk').values_list('object_id', 'action', 'fields')
+        )
+
+    def test_savepoint_rollback_drops_its_events(self):
+        teacher = make_teacher()
+        with transaction.atomic():
+            teacher.first_name = 'Мария'
+            teacher.save(update_fields=['first_name'])
+            try:
+                with transaction.atomic():
+                    teacher.last_name = 'Петрова'
+                    teacher.save(update_fields=['last_name'])
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(self.events(), [
+            (teacher.pk, changefeed.CREATE, None),
+            (teacher.pk, changefeed.UPDATE, ['first_name', 'search_name']),
+        ])
+
+    def test_rolled_back_transaction_writes_no_events(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            make_teacher()
+            raise ValueError
+        self.assertEqual(self.events(), [])
+
+    def test_events_are_visible_inside_the_transaction(self):
+        with transaction.atomic():
+            teacher = make_teacher()
+            self.assertEqual(self.events(), [(teacher.pk, changefeed.CREATE, None)])
+
+    def test_read_pages_by_seq(self):
+        teachers = [make_teacher(str(i)) for i in range(3)]
+        page = changefeed.read(0, limit=2, models=['teacher'])
+        self.assertEqual([event['id'] for event in page['events']], [t.pk for t in teachers[:2]])
+        self.assertTrue(page['has_more'])
+        page = changefeed.read(page['next'], models=['teacher'])
+        self.assertEqual([event['id'] for event in page['events']], [teachers[2].pk])
+        self.assertFalse(page['has_more'])
+
+    def compact(self):
+        return changefeed.compact(timezone.now() + datetime.timedelta(seconds=1))
+
+    def test_compact_merges_updated_fields(self):
+        teacher = make_teacher()
+        ChangeEvent.objects.filter(model='teacher').delete()
+        teacher.first_name = 'Мария'
+        teacher.save(update_fields=['first_name'])
+        changefeed.update(Teacher.objects.filter(pk=teacher.pk), experience_years=6)
+        last_seq = ChangeEvent.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+        self.assertEqual(self.compact(), 1)
+        # search_name обновляет сигнал нормализованных имен вместе с first_name
+        self.assertEqual(self.events(), [
+            (teacher.pk, changefeed.UPDATE, ['experience_years', 'first_name', 'search_name']),
+        ])
+        # Оставшееся событие сохраняет номер последнего
+        self.assertEqual(ChangeEvent.objects.get(model='teacher').pk, last_seq)
+
+    def test_compact_keeps_create_and_delete(self):
+        created = make_teacher()
+        changefeed.update(Teacher.objects.filter(pk=created.pk), experience_years=6)
+        deleted = make_teacher('Ольга')
+        deleted_pk = deleted.pk
+        deleted.delete()
+
+        self.assertEqual(self.compact(), 2)
+        self.assertEqual(self.events(), [
+            (created.pk, changefeed.CREATE, None),
+            (deleted_pk, changefeed.DELETE, None),
+        ])
+
+    def test_compact_in_several_chunks(self):
+        teacher = make_teacher()
+        ChangeEvent.objects.filter(model='teacher').delete()
+        changefeed.record(Teacher, [teacher.pk] * (changefeed.WRITE_CHUNK + 100), changefeed.UPDATE, ['first_name'])
+
+        self.assertEqual(self.compact(), changefeed.WRITE_CHUNK + 99)
+        self.assertEqual(self.events(), [(teacher.pk, changefeed.UPDATE, ['first_name'])])
+
+    def test_compact_update_without_fields_stays_full(self):
+        teacher = make_teacher()
+        ChangeEvent.objects.filter(model='teacher').delete()
+        teacher.save()
+        teacher.first_name = 'Мария'
+        teacher.save(update_fields=['first_name'])
+
+        self.compact()
+        self.assertEqual(self.events(), [(teacher.pk, changefeed.UPDATE, None)])
+
+
+@override_settings(LEADERBOARD_PRIOR_WEIGHT=2)
+class LeaderboardTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.kindergartens = [
+            make_kindergarten(f'Сад {i}', district='Центральный' if i % 2 else 'Северный') for i in range(6)
+        ]
+        for kindergarten, ratings in zip(self.kindergartens, [[5], [4, 4], [3, 5, 5], [2], [], [5, 5, 5, 4]]):
+            for rating in ratings:
+                self.review(kindergarten, rating)
+        leaderboard.rebuild()
+
+    def review(self, kindergarten, rating):
+        return Review.objects.create(kindergarten=kindergarten, parent_name='Родитель', rating=rating, comment='Отзыв')
+
+    def assertMatchesRebuild(self):
+        """Места — плотные 1..N в порядке полной перестройки с тем же prior_mean."""
+        boards = Leaderboard.objects.all()
+        self.assertEqual({board.district for board in boards}, {leaderboard.OVERALL, 'Центральный', 'Северный'})
+        totals = leaderboard._totals()
+        for board in boards:
+            rows = [
+                (pk, leaderboard._entry_values(row, board.prior_mean, board.prior_weight))
+                for pk, row in totals.items() if board.district in (leaderboard.OVERALL, row[0])
+            ]
+            rows.sort(key=lambda item: leaderboard._sort_key(*item))
+            entries = list(board.entries.order_by('rank').values_list('rank', 'kindergarten_id'))
+            self.assertEqual(entries, [(rank, pk) for rank, (pk, _) in enumerate(rows, start=1)], board.district)
+            self.assertEqual(board.size, len(rows))
+
+    def test_rebuild(self):
+        self.assertMatchesRebuild()
+
+    def test_new_reviews_move_kindergartens(self):
+        prior_mean = leaderboard.get_board().prior_mean
+        for _ in range(3):
+            self.review(self.kindergartens[3], 5)
+        self.review(self.kindergartens[5], 1)
+        # Инкрементальное обновление не пересчитывает prior_mean
+        self.assertEqual(leaderboard.get_board().prior_mean, prior_mean)
+        self.assertMatchesRebuild()
+
+    def test_held_and_deleted_reviews(self):
+        review = self.review(self.kindergartens[4], 5)
+        self.assertMatchesRebuild()
+        review.is_held = True
+        review.save()
+        self.assertMatchesRebuild()
+        Review.objects.filter(kindergarten=self.kindergartens[0]).delete()
+        leaderboard.update_kindergartens([self.kindergartens[0].pk])
+        self.assertMatchesRebuild()
+
+    def test_recommended_and_district_change(self):
+        kindergarten = self.kindergartens[3]
+        kindergarten.is_recommended = True
+        kindergarten.district = 'Центральный'
+        kindergarten.save()
+        self.assertEqual(leaderboard.get_board().entries.get(rank=1).kindergarten_id, kindergarten.pk)
+        self.assertMatchesRebuild()
+
+    def test_old_sqlite_fails_check(self):
+        self.assertEqual(leaderboard.check_sqlite_version(None, ['default']), [])
+        if connection.vendor != 'sqlite':
+            return
+        with mock.patch.object(connection.Database, 'sqlite_version_info', (3, 31, 1)):
+            errors = leaderboard.check_sqlite_version(None, ['default'])
+        self.assertEqual([error.id for error in errors], ['app.E001'])
+
+    def test_remove_kindergartens(self):
+        self.kindergartens[2].delete()
+        self.assertMatchesRebuild()
+        deletion.delete_kindergartens([self.kindergartens[0].pk, self.kindergartens[5].pk, self.kindergartens[4].pk])
+        self.assertMatchesRebuild()
+        self.assertFalse(LeaderboardEntry.objects.filter(kindergarten_id=self.kindergartens[0].pk).exists())
+
+
+class IntakeTests(CacheIsolatedTestCase):
+    # Ребенку 55 месяцев — группа "4-5 лет"
+    ON_DATE = datetime.date(2026, 10, 19)
+    DATA = {
+        'child_last_name': 'Петров', 'child_first_name': 'Ваня', 'birth_date': datetime.date(2022, 3, 1),
+        'parent_name': 'Петр', 'phone': '+7 900 000-00-01', 'email': '', 'message': '',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.kindergarten = make_kindergarten()
+
+    def submit(self, key, **data):
+        return intake.submit(self.kindergarten.pk, key, {**self.DATA, **data})
+
+    def drain(self):
+        return intake.drain(on_date=self.ON_DATE)
+
+    def add_group(self, name='Старшая'):
+        return Group.objects.create(kindergarten=self.kindergarten, name=name, age_range='4-5 лет', max_capacity=20)
+
+    def test_same_key_returns_first_application(self):
+        first, created = self.submit('k1')
+        self.assertTrue(created)
+        again, created = self.submit('k1')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, first.pk)
+
+    def test_same_child_with_new_key(self):
+        first, _ = self.submit('k1')
+        # ФИО сравнивается по name_key
+        again, created = self.submit('k2', child_last_name=' петров', child_first_name='ВАНЯ')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, first.pk)
+        _, created = intake.submit(make_kindergarten('Ромашка').pk, 'k3', self.DATA)
+        self.assertTrue(created)
+
+    def test_key_reused_for_other_child(self):
+        first, _ = self.submit('k1')
+        with self.assertRaises(intake.KeyReused) as raised:
+            self.submit('k1', child_first_name='Иван')
+        self.assertEqual(raised.exception.application.pk, first.pk)
+        self.assertEqual(EnrollmentApplication.objects.count(), 1)
+
+    def test_resubmit_after_no_group(self):
+        first, _ = self.submit('k1')
+        self.assertEqual(self.drain(), {intake.NO_GROUP: 1})
+        self.add_group()
+        second, created = self.submit('k2')
+        self.assertTrue(created)
+        self.assertEqual(self.drain(), {intake.ACCEPTED: 1})
+        second.refresh_from_db()
+        self.assertEqual(Enrollment.objects.get(pk=second.enrollment_id).status, intake.WAITING)
+        self.assertIsNone(self.drain())
+
+    def test_resubmit_after_rejected_enrollment(self):
+        group = self.add_group()
+        first, _ = self.submit('k1')
+        self.drain()
+        first.refresh_from_db()
+        # Пока запись ждет места, новая заявка — повтор прежней
+        self.assertEqual(self.submit('k2')[0].pk, first.pk)
+
+        Enrollment.objects.filter(pk=first.enrollment_id).update(status='отклонена')
+        second, created = self.submit('k3')
+        self.assertTrue(created)
+        first.refresh_from_db()
+        self.assertEqual(first.status, intake.CLOSED)
+
+        self.assertEqual(self.drain(), {intake.ACCEPTED: 1})
+        second.refresh_from_db()
+        # Та же запись (child и group уникальны) снова в очереди с датой повторной заявки
+        self.assertEqual(second.enrollment_id, first.enrollment_id)
+        enrollment = Enrollment.objects.get(pk=second.enrollment_id)
+        self.assertEqual((enrollment.group_id, enrollment.status), (group.pk, intake.WAITING))
+        self.assertEqual(enrollment.enrollment_date, self.ON_DATE)
+        self.assertEqual(Child.objects.count(), 1)
+
+    def test_drain_marks_duplicate_only_for_open_enrollments(self):
+        self.add_group('Б')
+        other = self.add_group('А')
+        child = Child.objects.create(
+            first_name='Ваня', last_name='Петров', birth_date=self.DATA['birth_date'], parent_contact='Петр',
+        )
+        waiting = Enrollment.objects.create(child=child, group=other, status=intake.WAITING)
+        first, _ = self.submit('k1')
+        self.assertEqual(self.drain(), {intake.DUPLICATE: 1})
+        first.refresh_from_db()
+        self.assertEqual(first.enrollment_id, waiting.pk)
+
+        Enrollment.objects.filter(pk=waiting.pk).update(status='завершена')
+        second, created = self.submit('k2')
+        self.assertTrue(created)
+        self.assertEqual(self.drain(), {intake.ACCEPTED: 1})
+        second.refresh_from_db()
+        self.assertEqual(second.enrollment_id, waiting.pk)
+
+
+class RestoreEnrollmentsTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.group = Group.objects.create(
+            kindergarten=make_kindergarten(), name='Старшая', age_range='4-5 лет', max_capacity=20,
+        )
+        self.child = Child.objects.create(
+            first_name='Ваня', last_name='Петров', birth_date=datetime.date(2022, 3, 1), parent_contact='Петр',
+        )
+
+    def archive_twice(self):
+        """Ребенок дважды записан в группу, и обе закрытые записи ушли в архив."""
+        ids = []
+        for status in ('завершена', 'отклонена'):
+            enrollment = Enrollment.objects.create(child=self.child, group=self.group, status=status)
+            archive.archive_enrollments(Enrollment.objects.filter(pk=enrollment.pk))
+            ids.append(enrollment.pk)
+        return ids
+
+    def assertRestoredNewest(self, batch_size):
+        older, newer = self.archive_twice()
+        self.assertEqual(archive.restore_enrollments(ArchivedEnrollment.objects.all(), batch_size), (1, 1))
+        self.assertEqual(list(Enrollment.objects.values_list('pk', 'status')), [(newer, 'отклонена')])
+        self.assertEqual(list(ArchivedEnrollment.objects.values_list('pk', flat=True)), [older])
+
+    def test_same_group_archived_twice(self):
+        self.assertRestoredNewest(batch_size=1000)
+
+    def test_same_group_archived_twice_in_other_batches(self):
+        self.assertRestoredNewest(batch_size=1)
+
+    def test_skips_child_enrolled_again(self):
+        self.archive_twice()
+        Enrollment.objects.create(child=self.child, group=self.group)
+        self.assertEqual(archive.restore_enrollments(ArchivedEnrollment.objects.all()), (0, 2))
+
+
+class ReviewListTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.kindergarten = make_kindergarten()
+        Review.objects.create(kindergarten=self.kindergarten, parent_name='Родитель', rating=5, comment='Отзыв')
+
+    def get(self, kindergarten):
+        return self.client.get(reverse('review_list'), {'kindergarten': kindergarten})
+
+    def test_unicode_digit_shows_all_reviews(self):
+        # '²'.isdigit() истинно, но int('²') падает
+        response = self.get('²')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['reviews_count'], 1)
+
+    def test_zero_shows_all_reviews(self):
+        response = self.get('0')
+        self.assertEqual(len(response.context['reviews']), 1)
+        self.assertEqual(response.context['reviews_count'], 1)
+
+    def test_unknown_kindergarten_has_empty_stats(self):
+        response = self.get(str(self.kindergarten.pk + 1))
+        self.assertEqual(len(response.context['reviews']), 0)
+        self.assertEqual(response.context['reviews_count'], 0)
+
+    def test_stats_for_missing_id_are_not_global(self):
+        self.assertEqual(stats.review_stats(0).count, 0)
+        self.assertEqual(stats.review_stats().count, 1)
+
+
+class FreeSeatsTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+
+    def get(self, child):
+        return self.client.get(reverse('free_seats'), {'child': child})
+
+    def test_invalid_child_id_is_404(self):
+        for child in ('abc', '²', '0', '-1'):
+            with self.subTest(child=child):
+                self.assertEqual(self.get(child).status_code, 404)
+
+    def test_child_birth_date_prefills_form(self):
+        child = Child.objects.create(
+            first_name='Ваня', last_name='Петров', birth_date=datetime.date(2022, 3, 1), parent_contact='Петр',
+        )
+        response = self.get(str(child.pk))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['child'], child)
+
+
+class ProfilingTriggerTests(CacheIsolatedTestCase):
+    def request(self, path='/', is_staff=True, **headers):
+        request = RequestFactory().get(path, **headers)
+        request.user = User(username='staff', is_staff=is_staff)
+        return request
+
+    def test_user_not_loaded_without_flag(self):
+        request = RequestFactory().get('/')
+        # Без AuthenticationMiddleware у запроса нет user: обращение к нему упало бы
+        with self.assertNumQueries(0):
+            self.assertIsNone(profiling.requested_trigger(request))
+
+    def test_flag_or_header_for_staff(self):
+        self.assertEqual(profiling.requested_trigger(self.request('/?_profile=1')), 'manual')
+        self.assertEqual(profiling.requested_trigger(self.request(HTTP_X_PROFILE_REQUEST='1')), 'manual')
+
+    def test_flag_ignored_for_visitors(self):
+        self.assertIsNone(profiling.requested_trigger(self.request('/?_profile=1', is_staff=False)))
+
+
+class SweepTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = KindergartenImage._meta.get_field('image').storage
+        self.name = self.upload()
+        # Файл и задача на его удаление — двухчасовой давности
+        hours_ago = timezone.now() - datetime.timedelta(hours=2)
+        os.utime(self.storage.path(self.name), (hours_ago.timestamp(), hours_ago.timestamp()))
+        media.enqueue_files([self.name])
+        FileCleanupTask.objects.update(requested_at=hours_ago)
+
+    def upload(self):
+        return self.storage.save('kindergartens/images/photo.jpg', ContentFile(b'photo'))
+
+    def test_deletes_unreferenced_file(self):
+        self.assertEqual(media.sweep(), (1, 0))
+        self.assertFalse(self.storage.exists(self.name))
+        self.assertFalse(FileCleanupTask.objects.exists())
+
+    def test_keeps_file_reused_by_pending_upload(self):
+        # Та же фотография загружена заново, но строка еще не сохранена
+        self.assertEqual(self.upload(), self.name)
+        self.assertEqual(media.sweep(), (0, 0))
+        self.assertTrue(self.storage.exists(self.name))
+        # Задача ждет следующего прохода
+        self.assertIsNone(media.sweep())
+        self.assertTrue(FileCleanupTask.objects.filter(name=self.name).exists())
+
+    def test_keeps_file_with_references(self):
+        StoredBlob.objects.create(name=self.name, ref_count=1)
+        self.assertEqual(media.sweep(), (0, 1))
+        self.assertTrue(self.storage.exists(self.name))
+
+    def test_fresh_tasks_wait(self):
+        media.enqueue_files([self.name])
+        self.assertIsNone(media.sweep())
+        self.assertTrue(self.storage.exists(self.name))
+
+
+class SnapshotPagesTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.kindergarten = make_kindergarten(district='Центральный', description='Бассейн и сад')
+        group = Group.objects.create(kindergarten=self.kindergarten, name='Пчелки', age_range='3-4 года')
+        # Три с половиной года — возраст группы "3-4 года"
+        self.birth_date = timezone.localdate() - datetime.timedelta(days=3 * 365 + 180)
+        child = Child.objects.create(
+            first_name='Ваня', last_name='Петров', birth_date=self.birth_date, parent_contact='Петр',
+        )
+        Enrollment.objects.create(child=child, group=group, status='активна')
+        KindergartenTeacher.objects.create(kindergarten=self.kindergarten, teacher=make_teacher(), role='воспитатель')
+        Review.objects.create(kindergarten=self.kindergarten, parent_name='Мария', rating=5, comment='Хороший сад')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'catalogue.sqlite3')
+        snapshot.build(path)
+        # Настройки узла CATALOGUE_SNAPSHOT_ONLY, кроме движка базы: он нужен фикстурам теста
+        settings_override = override_settings(
+            CATALOGUE_SNAPSHOT_PATH=path, ROOT_URLCONF='new.urls_snapshot',
+            MIDDLEWARE=settings.CATALOGUE_SNAPSHOT_MIDDLEWARE,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Посетитель с сессией основного сайта
+        self.client.cookies['sessionid'] = 'x' * 32
+
+    def test_public_pages_do_not_query_primary_database(self):
+        pages = [
+            (reverse('kindergarten_list'), {}, 'Солнышко'),
+            (reverse('kindergarten_list'), {'search': 'Бассейн', 'sort': 'name'}, 'Солнышко'),
+            (reverse('kindergarten_list'), {'lat': '55.75', 'lon': '37.61'}, 'Детские сады не найдены'),
+            (reverse('kindergarten_detail', args=[self.kindergarten.pk]), {}, 'Пчелки'),
+            (reverse('review_list'), {'kindergarten': str(self.kindergarten.pk)}, 'Хороший сад'),
+            (reverse('teacher_list'), {'search': 'иванова'}, 'Иванова'),
+            (reverse('free_seats'), {'birth_date': self.birth_date.isoformat()}, 'Пчелки'),
+        ]
+        for url, params, text in pages:
+            with self.subTest(url=url, params=params):
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, params)
+                self.assertContains(response, text)
+
+    def test_card_counts_active_enrollments_without_names(self):
+        response = self.client.get(reverse('kindergarten_detail', args=[self.kindergarten.pk]))
+        self.assertContains(response, '1/15')
+        self.assertNotContains(response, 'Ваня')
+        self.assertNotContains(response, 'bookModal')
+
+    def test_missing_detail_is_404(self):
+        response = self.client.get(reverse('kindergarten_detail', args=[self.kindergarten.pk + 1]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,62 @@
+# app/text.py
+import re
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_name(value):
+    """Ключ для поиска по ФИО: нижний регистр, ё → е, одиночные пробелы."""
+    return _SPACES.sub(' ', value.lower().replace('ё', 'е')).strip()
+
+
+def prefix_range(prefix):
+    """Границы [prefix, prefix + максимальный символ) для индексного поиска по префиксу."""
+    return prefix, prefix + '\U0010ffff'
+
+
+# Транслитерация в упрощенную латиницу: "Алексей", "Aleksei" и "Alexey"
+# сводятся к одному ключу "aleksei"
+_CYRILLIC_TO_LATIN = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'i',
+    'ь': '', 'э': 'e', 'ю': 'iu', 'я': 'ia',
+})
+_LATIN_VARIANTS = [
+    (re.compile(r'kh'), 'h'),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'c(?!h)'), 'k'),
+    (re.compile(r'[yj]'), 'i'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'q'), 'k'),
+]
+_NON_LETTERS = re.compile(r'[^a-z]+')
+_REPEATS = re.compile(r'(.)\1+')
+
+
+def name_key(value):
+    """Ключ для нечеткого поиска по ФИО: транслитерация, без повторов букв."""
+    key = normalize_name(value).translate(_CYRILLIC_TO_LATIN)
+    for pattern, replacement in _LATIN_VARIANTS:
+        key = pattern.sub(replacement, key)
+    key = _NON_LETTERS.sub(' ', key)
+    return _REPEATS.sub(r'\1', key).strip()
+
+
+def trigrams(key):
+    """Триграммы слов ключа, как в pg_trgm: слово дополняется "  " слева и " " справа."""
+    grams = set()
+    for word in key.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(left, right):
+    """Коэффициент Жаккара двух множеств триграмм."""
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
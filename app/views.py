@@ -1,56 +1,288 @@
 # app/views.py
+import functools
+import math
+import uuid
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q, Avg, Count
+from django.db.models import Q, Count, Prefetch, prefetch_related_objects
 from django.contrib import messages
+from django.contrib.admin import site as admin_site
+from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
-from .models import Kindergarten, Teacher, Review
-from .forms import ReviewForm
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from .models import Child, Enrollment, Group, Kindergarten, Review
+from .forms import EnrollmentApplicationForm, FreeSeatsForm, ReviewForm, TeacherFilterForm
+from .pagination import CachedCountPaginator
+from . import changefeed, directory, geo, intake, leaderboard, lookups, objcache, profiling, seats, snapshot, stats
+
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 50
+NEARBY_API_LIMIT = 20
+KINDERGARTENS_PER_PAGE = 24
+
+
+def _location_params(request):
+    point = geo.parse_point(request.GET.get('lat'), request.GET.get('lon'))
+    try:
+        radius = float(request.GET.get('radius', DEFAULT_RADIUS_KM))
+    except ValueError:
+        radius = DEFAULT_RADIUS_KM
+    # float() принимает "nan" и "inf"; nan проходит через min/max без изменений
+    if not math.isfinite(radius):
+        radius = DEFAULT_RADIUS_KM
+    return point, min(max(radius, 0.1), MAX_RADIUS_KM)
+
+
+def _positive_id(value):
+    """id из параметра запроса или None; str.isdigit() пропускает "²", на котором int() падает."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
 
 
 def kindergarten_list(request):
+    search_query = request.GET.get('search', '')
+    district = request.GET.get('district', '')
+    sort_by = request.GET.get('sort', '')
+    point, radius = _location_params(request)
+    
+    # Без поиска и координат список по рейтингу — страница предрассчитанной таблицы мест
+    board = None
+    if not search_query and not point and sort_by in ('', 'rating'):
+        board = leaderboard.get_board(district)
+    if board is not None:
+        kindergartens = leaderboard.Ranking(board, by_score=sort_by == 'rating')
+    else:
+        kindergartens = _kindergarten_queryset(search_query, district, sort_by, point, radius)
+    
+    paginator = Paginator(kindergartens, KINDERGARTENS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+    
+    context = {
+        'kindergartens': page_obj,
+        'page_obj': page_obj,
+        'search_query': search_query,
+        'district': district,
+        'districts': leaderboard.districts(),
+        'location': point,
+        'radius': radius,
+        'query_string': query_params.urlencode(),
+    }
+    return render(request, 'kindergarten_list.html', context)
+
+
+def _kindergarten_queryset(search_query, district, sort_by, point, radius):
+    reviews_count, avg_rating = stats.rating_annotations()
     kindergartens = Kindergarten.objects.annotate(
-        avg_rating_value=Avg('review__rating'),
+        avg_rating_value=avg_rating,
         groups_count_value=Count('group', distinct=True),
         teachers_count_value=Count('kindergartenteacher', distinct=True),
-        reviews_count=Count('review', distinct=True)
+        reviews_count=reviews_count
     )
     
-    search_query = request.GET.get('search', '')
     if search_query:
         kindergartens = kindergartens.filter(
             Q(name__icontains=search_query) |
             Q(address__icontains=search_query) |
+            Q(district__icontains=search_query) |
             Q(description__icontains=search_query) |
             Q(features__icontains=search_query)
         )
+    if district:
+        kindergartens = kindergartens.filter(district=district)
+    
+    distances = None
+    if point:
+        distances = {pk: km for km, pk in geo.get_index().within(*point, radius)}
+        kindergartens = kindergartens.filter(pk__in=distances)
     
-    sort_by = request.GET.get('sort', '')
     if sort_by == 'rating':
-        kindergartens = kindergartens.order_by('-avg_rating_value')
+        kindergartens = kindergartens.order_by('-avg_rating_value', 'pk')
     elif sort_by == 'name':
-        kindergartens = kindergartens.order_by('name')
+        kindergartens = kindergartens.order_by('name', 'pk')
     elif sort_by == 'capacity':
-        kindergartens = kindergartens.order_by('-capacity')
+        kindergartens = kindergartens.order_by('-capacity', 'pk')
     elif sort_by == 'recommended':
-        kindergartens = kindergartens.order_by('-is_recommended', 'name')
+        kindergartens = kindergartens.order_by('-is_recommended', 'name', 'pk')
     else:
-        kindergartens = kindergartens.order_by('-is_recommended', '-avg_rating_value')
+        kindergartens = kindergartens.order_by('-is_recommended', '-avg_rating_value', 'pk')
     
-    context = {
-        'kindergartens': kindergartens,
-        'search_query': search_query,
-    }
-    return render(request, 'kindergarten_list.html', context)
+    if distances is not None:
+        kindergartens = list(kindergartens)
+        for kindergarten in kindergartens:
+            kindergarten.distance_km = distances[kindergarten.pk]
+        if not sort_by:
+            kindergartens.sort(key=lambda k: k.distance_km)
+    return kindergartens
+
+
+def kindergarten_nearby_api(request):
+    point, radius = _location_params(request)
+    if not point:
+        return JsonResponse({'error': 'Укажите координаты lat и lon'}, status=400)
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', NEARBY_API_LIMIT)), 1), 100)
+    except ValueError:
+        limit = NEARBY_API_LIMIT
+    
+    max_radius = radius if 'radius' in request.GET else None
+    hits = geo.get_index().nearest(*point, limit, max_radius_km=max_radius)
+    kindergartens = objcache.kindergartens.get_many(pk for _, pk in hits)
+    results = [
+        {
+            'id': pk,
+            'name': kindergartens[pk].name,
+            'address': kindergartens[pk].address,
+            'latitude': kindergartens[pk].latitude,
+            'longitude': kindergartens[pk].longitude,
+            'distance_km': round(km, 3),
+            'url': reverse('kindergarten_detail', args=[pk]),
+        }
+        for km, pk in hits if pk in kindergartens
+    ]
+    return JsonResponse({'count': len(results), 'results': results})
+
+
+def _change_feed_allowed(request):
+    if request.user.is_active and request.user.is_staff:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and any(
+        constant_time_compare(token, allowed) for allowed in settings.CHANGE_FEED_TOKENS
+    )
+
+
+@never_cache
+def change_feed(request):
+    """События журнала изменений после seq since (см. app/changefeed.py)."""
+    if not _change_feed_allowed(request):
+        return JsonResponse({'error': 'Нужен ключ доступа к журналу изменений'}, status=403)
+    try:
+        since = max(int(request.GET.get('since', 0)), 0)
+        limit = int(request.GET.get('limit', changefeed.MAX_PAGE))
+    except ValueError:
+        return JsonResponse({'error': 'since и limit должны быть целыми числами'}, status=400)
+    models = request.GET.getlist('model')
+    unknown = set(models) - set(changefeed.LABELS.values())
+    if unknown:
+        return JsonResponse({'error': f'Неизвестные модели: {", ".join(sorted(unknown))}'}, status=400)
+    return JsonResponse(changefeed.read(since, limit, models))
+
+
+def _from_snapshot(view):
+    """Представление каталога по снимку (app/snapshot.py): ответ с версией снимка, без снимка — 503."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            catalogue = snapshot.get_snapshot()
+            version = catalogue.meta['version']
+            response = view(request, catalogue, *args, **kwargs)
+        except snapshot.SnapshotUnavailable as e:
+            return JsonResponse({'error': str(e)}, status=503)
+        response['X-Catalogue-Version'] = str(version)
+        return response
+    return wrapper
+
+
+def _page_from_snapshot(view):
+    """Страница сайта по снимку для узла CATALOGUE_SNAPSHOT_ONLY: без снимка — 503."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            catalogue = snapshot.get_snapshot()
+            version = catalogue.meta['version']
+            response = view(request, catalogue, *args, **kwargs)
+        except snapshot.SnapshotUnavailable:
+            return HttpResponse('Каталог временно недоступен', status=503, content_type='text/plain; charset=utf-8')
+        response['X-Catalogue-Version'] = str(version)
+        return response
+    return wrapper
+
+
+@_from_snapshot
+def catalogue_kindergartens(request, catalogue):
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    total, rows = catalogue.kindergartens(
+        district=request.GET.get('district', ''),
+        search=request.GET.get('search', ''),
+        limit=KINDERGARTENS_PER_PAGE,
+        offset=(page - 1) * KINDERGARTENS_PER_PAGE,
+    )
+    return JsonResponse({
+        'version': catalogue.meta['version'],
+        'count': total,
+        'page': page,
+        'has_next': page * KINDERGARTENS_PER_PAGE < total,
+        'results': rows,
+    })
+
+
+@_from_snapshot
+def catalogue_kindergarten(request, catalogue, pk):
+    kindergarten = catalogue.kindergarten(pk)
+    if kindergarten is None:
+        return JsonResponse({'error': 'Детский сад не найден'}, status=404)
+    return JsonResponse({'version': catalogue.meta['version'], **kindergarten})
+
+
+@_from_snapshot
+def catalogue_free_seats(request, catalogue):
+    form = FreeSeatsForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    results = catalogue.free_seats(form.cleaned_data['birth_date'])
+    return JsonResponse({'version': catalogue.meta['version'], 'count': len(results), 'results': results})
+
+
+@_from_snapshot
+def catalogue_nearby(request, catalogue):
+    point, radius = _location_params(request)
+    if not point:
+        return JsonResponse({'error': 'Укажите координаты lat и lon'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', NEARBY_API_LIMIT)), 1), 100)
+    except ValueError:
+        limit = NEARBY_API_LIMIT
+    max_radius = radius if 'radius' in request.GET else None
+    results = [
+        {**row, 'distance_km': round(km, 3)}
+        for km, row in catalogue.nearby(*point, limit, max_radius_km=max_radius)
+    ]
+    return JsonResponse({'version': catalogue.meta['version'], 'count': len(results), 'results': results})
 
 
 def kindergarten_detail(request, pk):
-    kindergarten = get_object_or_404(Kindergarten.objects.prefetch_related(
-        'group_set', 'group_set__enrollment_set__child',
-        'kindergartenteacher_set__teacher', 'review_set'
-    ), pk=pk)
+    kindergarten = objcache.kindergartens.get_or_404(pk)
+    # В группе показываются только активные записи — как в подсчете свободных мест
+    prefetch_related_objects(
+        [kindergarten],
+        Prefetch('group_set', queryset=Group.objects.annotate(active_count=seats.active_enrollments())),
+        Prefetch(
+            'group_set__enrollment_set',
+            queryset=Enrollment.objects.filter(status='активна').select_related('child'),
+        ),
+        'kindergartenteacher_set__teacher',
+        Prefetch('review_set', queryset=Review.objects.filter(is_held=False)),
+    )
     
-    reviews = kindergarten.review_set.all()
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+    review_stats = stats.review_stats(kindergarten.pk)
     
     if request.method == 'POST' and 'add_review' in request.POST:
         form = ReviewForm(request.POST)
@@ -65,15 +297,16 @@ def kindergarten_detail(request, pk):
     
     context = {
         'kindergarten': kindergarten,
-        'avg_rating': avg_rating,
-        'reviews_count': reviews.count(),
+        'avg_rating': review_stats.average,
+        'reviews_count': review_stats.count,
+        'alternatives': seats.similar_with_free_seats(kindergarten.pk),
         'form': form,
     }
     return render(request, 'kindergarten_detail.html', context)
 
 
 def add_review(request, kindergarten_id):
-    kindergarten = get_object_or_404(Kindergarten, pk=kindergarten_id)
+    kindergarten = objcache.kindergartens.get_or_404(kindergarten_id)
     
     if request.method == 'POST':
         form = ReviewForm(request.POST)
@@ -93,34 +326,62 @@ def add_review(request, kindergarten_id):
     return render(request, 'add_review.html', context)
 
 
+@require_POST
+def enrollment_apply(request, pk):
+    """Прием заявки на запись: номер заявки сразу, разбор — воркером (app/intake.py)."""
+    kindergarten = objcache.kindergartens.get_or_404(pk)
+    form = EnrollmentApplicationForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data.copy()
+    key = data.pop('key') or uuid.uuid4().hex
+    try:
+        application, created = intake.submit(kindergarten.pk, key, data)
+    except intake.KeyReused as e:
+        return JsonResponse({
+            'errors': {'key': [f'С этой формы уже отправлена заявка {e.application.receipt} с другими данными']},
+            'receipt': e.application.receipt,
+        }, status=409)
+    return JsonResponse({
+        'receipt': application.receipt,
+        'status': application.get_status_display(),
+        'duplicate': not created,
+    }, status=201 if created else 200)
+
+
 def review_list(request):
-    reviews = Review.objects.select_related('kindergarten').all().order_by('-created_at')
+    reviews = Review.objects.filter(is_held=False).select_related('kindergarten').order_by('-created_at')
     
-    kindergarten_id = request.GET.get('kindergarten')
-    if kindergarten_id:
+    kindergarten_id = _positive_id(request.GET.get('kindergarten'))
+    if kindergarten_id is not None:
         reviews = reviews.filter(kindergarten_id=kindergarten_id)
     
-    kindergartens = Kindergarten.objects.all()
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+    review_stats = stats.review_stats(kindergarten_id)
     
     if request.method == 'POST' and 'add_review' in request.POST:
         form = ReviewForm(request.POST)
         if form.is_valid():
             review = form.save()
-            messages.success(request, 'Ваш отзыв успешно добавлен!')
+            if review.is_held:
+                messages.info(request, 'Спасибо! Ваш отзыв похож на уже опубликованный и будет проверен модератором.')
+            else:
+                messages.success(request, 'Ваш отзыв успешно добавлен!')
             return redirect('review_list')
     else:
         form = ReviewForm()
     
-    paginator = Paginator(reviews, 10)
+    # В списке только рабочая таблица, архивные отзывы учтены лишь в статистике
+    paginator = CachedCountPaginator(reviews, 10, count=review_stats.count - review_stats.archived)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
     context = {
         'reviews': page_obj,
-        'kindergartens': kindergartens,
-        'avg_rating': avg_rating,
-        'reviews_count': reviews.count(),
+        'page_obj': page_obj,
+        'kindergartens': lookups.kindergarten_choices(),
+        'avg_rating': review_stats.average,
+        'reviews_count': review_stats.count,
+        'rating_histogram': sorted(review_stats.histogram.items(), reverse=True),
         'is_paginated': paginator.num_pages > 1,
         'form': form,
     }
@@ -128,21 +389,225 @@ def review_list(request):
 
 
 def teacher_list(request):
-    teachers = Teacher.objects.all()
+    filter_form = TeacherFilterForm(request.GET)
+    filters = filter_form.filters()
+    teachers = directory.search_teachers(**filters)
+    
+    paginator = CachedCountPaginator(
+        teachers, 12, cache_key=directory.count_cache_key(**filters)
+    )
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+    
+    context = {
+        'teachers': page_obj,
+        'page_obj': page_obj,
+        'kindergartens': lookups.kindergarten_choices(),
+        'filter_form': filter_form,
+        'query_string': query_params.urlencode(),
+        'is_paginated': paginator.num_pages > 1,
+    }
+    return render(request, 'teacher_list.html', context)
+
+
+def free_seats(request):
+    child = None
+    child_id = request.GET.get('child')
+    if child_id and request.user.is_staff:
+        child_id = _positive_id(child_id)
+        if child_id is None:
+            raise Http404
+        child = get_object_or_404(Child, pk=child_id)
+        form = FreeSeatsForm(initial={'birth_date': child.birth_date})
+    else:
+        form = FreeSeatsForm(request.GET or None)
+    
+    groups = None
+    if child is not None:
+        groups = seats.groups_with_free_seats(child)
+    elif form.is_valid():
+        groups = seats.groups_with_free_seats(form.cleaned_data['birth_date'])
+    
+    page_obj = None
+    if groups is not None:
+        page_obj = Paginator(groups, 20).get_page(request.GET.get('page'))
+    
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+    
+    context = {
+        'form': form,
+        'child': child,
+        'page_obj': page_obj,
+        'query_string': query_params.urlencode(),
+    }
+    return render(request, 'free_seats.html', context)
+
+
+@never_cache
+@ensure_csrf_cookie
+def session_fragment(request):
+    """Персональные части статических страниц: CSRF-токен и flash-сообщения."""
+    return JsonResponse({
+        'csrf_token': get_token(request),
+        'messages': render_to_string('fragments/messages.html', request=request).strip(),
+    })
+
+
+@staff_member_required
+def profile_list(request):
+    """Сохраненные профили запросов (см. app/profiling.py)."""
+    return render(request, 'admin/profiles.html', {
+        **admin_site.each_context(request),
+        'title': 'Профили запросов',
+        'captures': profiling.list_captures(),
+        'object_caches': {name: cache.stats() for name, cache in objcache.CACHES_BY_MODEL.items()},
+    })
+
+
+@staff_member_required
+def profile_download(request, capture_id, fmt):
+    capture = profiling.load(capture_id)
+    if capture is None:
+        raise Http404('Профиль не найден')
+    meta, details = capture
+    if fmt == 'folded':
+        response = HttpResponse(profiling.collapsed_stacks(details), content_type='text/plain; charset=utf-8')
+    else:
+        response = JsonResponse({**meta, **details}, json_dumps_params={'ensure_ascii': False})
+    response['Content-Disposition'] = f'attachment; filename="{capture_id}.{fmt}"'
+    return response
+
+
+# Страницы узла только для чтения (new/urls_snapshot.py): те же шаблоны, что
+# у представлений выше, но данные из снимка и без форм, пишущих в базу
+
+@_page_from_snapshot
+def snapshot_kindergarten_list(request, catalogue):
+    search_query = request.GET.get('search', '')
+    district = request.GET.get('district', '')
+    sort_by = request.GET.get('sort', '')
+    point, radius = _location_params(request)
+    
+    if point:
+        kindergartens = [
+            snapshot.build_kindergarten(row)
+            for row in catalogue.kindergartens_within(*point, radius, district=district, text=search_query, sort=sort_by)
+        ]
+    else:
+        kindergartens = snapshot.Rows(
+            lambda: catalogue.kindergarten_count(district, text=search_query),
+            lambda limit, offset: catalogue.kindergarten_rows(
+                district, text=search_query, sort=sort_by, limit=limit, offset=offset,
+            ),
+            snapshot.build_kindergarten,
+        )
+    
+    paginator = Paginator(kindergartens, KINDERGARTENS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+    
+    context = {
+        'kindergartens': page_obj,
+        'page_obj': page_obj,
+        'search_query': search_query,
+        'district': district,
+        'districts': catalogue.districts(),
+        'location': point,
+        'radius': radius,
+        'query_string': query_params.urlencode(),
+    }
+    return render(request, 'kindergarten_list.html', context)
+
+
+@_page_from_snapshot
+def snapshot_kindergarten_detail(request, catalogue, pk):
+    data = catalogue.kindergarten(pk)
+    if data is None:
+        raise Http404('Детский сад не найден')
+    reviews_count, avg_rating = catalogue.review_stats(pk)
+    context = {
+        'kindergarten': snapshot.build_kindergarten_card(data),
+        'avg_rating': avg_rating,
+        'reviews_count': reviews_count,
+        'read_only': True,
+    }
+    return render(request, 'kindergarten_detail.html', context)
+
+
+@_page_from_snapshot
+def snapshot_review_list(request, catalogue):
+    kindergarten_id = _positive_id(request.GET.get('kindergarten'))
+    reviews_count, avg_rating = catalogue.review_stats(kindergarten_id)
     
-    kindergarten_id = request.GET.get('kindergarten')
-    if kindergarten_id:
-        teachers = teachers.filter(kindergartenteacher__kindergarten_id=kindergarten_id)
+    # В снимке только последние отзывы каждого сада (snapshot.REVIEWS_PER_KINDERGARTEN)
+    def fetch(limit, offset):
+        return catalogue.reviews(kindergarten_id, limit=limit, offset=offset)[1]
     
-    kindergartens = Kindergarten.objects.all()
+    reviews = snapshot.Rows(lambda: catalogue.reviews(kindergarten_id, limit=0)[0], fetch, snapshot.build_review)
+    paginator = Paginator(reviews, 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
+    context = {
+        'reviews': page_obj,
+        'page_obj': page_obj,
+        'kindergartens': catalogue.kindergarten_choices(),
+        'avg_rating': avg_rating,
+        'reviews_count': reviews_count,
+        'is_paginated': paginator.num_pages > 1,
+        'read_only': True,
+    }
+    return render(request, 'review_list.html', context)
+
+
+@_page_from_snapshot
+def snapshot_teacher_list(request, catalogue):
+    filter_form = TeacherFilterForm(request.GET)
+    filters = filter_form.filters()
+    teachers = snapshot.Rows(
+        lambda: catalogue.teacher_count(**filters),
+        lambda limit, offset: catalogue.teacher_rows(limit=limit, offset=offset, **filters),
+        snapshot.build_teacher,
+    )
     paginator = Paginator(teachers, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
     
     context = {
         'teachers': page_obj,
-        'kindergartens': kindergartens,
+        'page_obj': page_obj,
+        'kindergartens': catalogue.kindergarten_choices(),
+        'filter_form': filter_form,
+        'query_string': query_params.urlencode(),
         'is_paginated': paginator.num_pages > 1,
     }
-    return render(request, 'teacher_list.html', context)
\ No newline at end of file
+    return render(request, 'teacher_list.html', context)
+
+
+@_page_from_snapshot
+def snapshot_free_seats(request, catalogue):
+    form = FreeSeatsForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        groups = [
+            snapshot.build_free_seat_group(row)
+            for row in catalogue.free_seats(form.cleaned_data['birth_date'], limit=None)
+        ]
+        page_obj = Paginator(groups, 20).get_page(request.GET.get('page'))
+    
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+    
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'query_string': query_params.urlencode(),
+    }
+    return render(request, 'free_seats.html', context)
@@ -0,0 +1,178 @@
+# app/waitlist.py
+# Распределение очереди ожидания: заявки в статусе "ожидание" обрабатываются
+# одним проходом в порядке даты записи, свободные места и возраст проверяются
+# по снимку групп, а все изменения применяются пакетными UPDATE в одной транзакции.
+from collections import Counter, defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import changefeed, prerender
+from .ages import age_in_months
+from .models import Enrollment, Group
+
+WAITING = 'ожидание'
+ACTIVE = 'активна'
+
+# Причины, по которым заявка осталась в очереди
+REASON_ALREADY_ENROLLED = 'ребенок уже зачислен'
+REASON_NO_SEATS = 'нет свободных мест'
+REASON_AGE = 'не подходит по возрасту'
+
+Decision = namedtuple('Decision', ['enrollment_id', 'child_id', 'from_group_id', 'to_group_id', 'reason'])
+
+
+class AllocationReport:
+    def __init__(self, on_date, dry_run):
+        self.on_date = on_date
+        self.dry_run = dry_run
+        self.decisions = []
+
+    @property
+    def placed(self):
+        return [d for d in self.decisions if d.to_group_id is not None]
+
+    @property
+    def moved(self):
+        return [d for d in self.placed if d.to_group_id != d.from_group_id]
+
+    @property
+    def waiting(self):
+        return Counter(d.reason for d in self.decisions if d.to_group_id is None)
+
+    def summary(self):
+        waiting = self.waiting
+        parts = [
+            f'обработано заявок: {len(self.decisions)}',
+            f'зачислено: {len(self.placed)}',
+            f'из них в другую группу сада: {len(self.moved)}',
+            f'осталось в очереди: {sum(waiting.values())}',
+        ]
+        parts += [f'{reason}: {count}' for reason, count in waiting.most_common()]
+        prefix = 'Предварительный расчет' if self.dry_run else 'Очередь распределена'
+        return f"{prefix} на {self.on_date:%d.%m.%Y} — " + ', '.join(parts)
+
+
+def _group_snapshot(kindergarten_ids):
+    # kindergarten_ids — подзапрос, чтобы не упираться в лимит параметров SQLite
+    groups = Group.objects.filter(kindergarten_id__in=kindergarten_ids).annotate(
+        active_count=Count('enrollment', filter=Q(enrollment__status=ACTIVE)),
+    ).values_list(
+        'id', 'kindergarten_id', 'name', 'min_age_months', 'max_age_months', 'max_capacity', 'active_count'
+    )
+
+    free_seats = {}
+    age_bounds = {}
+    by_kindergarten = defaultdict(list)
+    for group_id, kindergarten_id, name, min_age, max_age, max_capacity, active_count in groups:
+        free_seats[group_id] = max_capacity - active_count
+        age_bounds[group_id] = None if min_age is None or max_age is None else (min_age, max_age)
+        by_kindergarten[kindergarten_id].append((name, group_id))
+    for siblings in by_kindergarten.values():
+        siblings.sort()
+    return free_seats, age_bounds, {
+        kindergarten_id: [group_id for _, group_id in siblings]
+        for kindergarten_id, siblings in by_kindergarten.items()
+    }
+
+
+def allocate_waitlist(enrollments=None, on_date=None, dry_run=False):
+    """Распределяет заявки из очереди ожидания по группам со свободными местами.
+
+    enrollments — необязательный queryset, ограничивающий обрабатываемые заявки
+    (например, выбранные в админке); из него берутся только заявки "ожидание".
+    Заявка зачисляется в выбранную группу, а если там нет мест или ребенок не
+    подходит по возрасту — в другую подходящую группу того же сада.
+    """
+    on_date = on_date or timezone.localdate()
+    report = AllocationReport(on_date, dry_run)
+
+    with transaction.atomic():
+        pending_qs = (enrollments if enrollments is not None else Enrollment.objects.all()).filter(status=WAITING)
+        pending = list(
+            pending_qs.order_by('enrollment_date', 'id')
+            .values_list('id', 'child_id', 'group_id', 'group__kindergarten_id', 'child__birth_date')
+        )
+        if not pending:
+            return report
+
+        free_seats, age_bounds, groups_by_kindergarten = _group_snapshot(
+            pending_qs.order_by().values('group__kindergarten_id')
+        )
+
+        existing_pairs = set()
+        enrolled_children = set()
+        for child_id, group_id, status in Enrollment.objects.filter(
+            child_id__in=pending_qs.order_by().values('child_id')
+        ).values_list('child_id', 'group_id', 'status').iterator(chunk_size=5000):
+            existing_pairs.add((child_id, group_id))
+            if status == ACTIVE:
+                enrolled_children.add(child_id)
+
+        for enrollment_id, child_id, group_id, kindergarten_id, birth_date in pending:
+            if child_id in enrolled_children:
+                report.decisions.append(Decision(enrollment_id, child_id, group_id, None, REASON_ALREADY_ENROLLED))
+                continue
+
+            age = age_in_months(birth_date, on_date)
+            candidates = [group_id] + [
+                other for other in groups_by_kindergarten[kindergarten_id]
+                if other != group_id and (child_id, other) not in existing_pairs
+            ]
+            reason = None
+            target = None
+            for candidate in candidates:
+                bounds = age_bounds[candidate]
+                if bounds and not bounds[0] <= age < bounds[1]:
+                    reason = reason or REASON_AGE
+                    continue
+                if free_seats[candidate] <= 0:
+                    reason = REASON_NO_SEATS
+                    continue
+                target = candidate
+                break
+
+            if target is None:
+                report.decisions.append(Decision(enrollment_id, child_id, group_id, None, reason))
+                continue
+
+            free_seats[target] -= 1
+            enrolled_children.add(child_id)
+            existing_pairs.add((child_id, target))
+            report.decisions.append(Decision(enrollment_id, child_id, group_id, target, None))
+
+        if not dry_run:
+            _apply(report)
+
+    return report
+
+
+def _apply(report):
+    stay = []
+    moves = defaultdict(list)
+    for decision in report.placed:
+        if decision.to_group_id == decision.from_group_id:
+            stay.append(decision.enrollment_id)
+        else:
+            moves[decision.to_group_id].append(decision.enrollment_id)
+
+    # Пакетные UPDATE: оставшиеся в своей группе отдельно, переведенные — по группе-получателю
+    for ids in _chunks(stay):
+        changefeed.update(Enrollment.objects.filter(pk__in=ids), status=ACTIVE)
+    for group_id, enrollment_ids in moves.items():
+        for ids in _chunks(enrollment_ids):
+            changefeed.update(Enrollment.objects.filter(pk__in=ids), status=ACTIVE, group_id=group_id)
+
+    # Перевод идет только внутри сада, поэтому достаточно садов целевых групп
+    group_ids = {decision.to_group_id for decision in report.placed}
+    if group_ids:
+        prerender.enqueue_kindergartens(
+            Group.objects.filter(pk__in=group_ids).values('kindergarten_id'), include_list=False
+        )
+
+
+def _chunks(ids, size=900):
+    # SQLite ограничивает число параметров в одном запросе
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
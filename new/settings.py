@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'new.urls'
@@ -56,13 +58,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Скомпилированные шаблоны хранятся в памяти процесса. При DEBUG
+            # runserver сбрасывает этот кэш, когда файл шаблона меняется
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -72,6 +81,7 @@ WSGI_APPLICATION = 'new.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# SQLite не ниже 3.33 (см. app/leaderboard.py, проверка app.E001)
 
 DATABASES = {
     'default': {
@@ -81,6 +91,31 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Кэш общий для всех процессов: сайта, prerender_worker, intake_worker и
+# команд. Через версии пространств имен в нем (app/caching.py) процессы
+# узнают об изменениях, поэтому кэш в памяти процесса (LocMemCache) здесь
+# не подходит. С REDIS_URL в окружении — Redis (нужен пакет redis),
+# без него — файлы в BASE_DIR / 'cache'.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -117,6 +152,52 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Загруженные файлы (фотографии садов)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Статические копии публичных страниц (см. app/prerender.py)
+PRERENDER_ROOT = BASE_DIR / 'prerendered'
+
+# Профилирование запросов (см. app/profiling.py)
+PROFILING_ROOT = BASE_DIR / 'profiles'
+PROFILING_MAX_CAPTURES = 200
+PROFILING_INTERVAL_MS = 5
+# Доля запросов, профилируемых автоматически; сохраняются только медленные
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_SLOW_MS = 1000
+
+# Рейтинг садов (см. app/leaderboard.py): сколько "средних" отзывов
+# добавляется к отзывам сада, чтобы единичные оценки не выводили его в лидеры
+LEADERBOARD_PRIOR_WEIGHT = 10
+
+# Журнал изменений (см. app/changefeed.py): ключи внешних потребителей для
+# /api/changes/ (заголовок "Authorization: Bearer <ключ>"); сотрудникам
+# с входом в админку ключ не нужен
+CHANGE_FEED_TOKENS = []
+
+# Снимок публичного каталога (см. app/snapshot.py), собирается командой
+# build_snapshot. CATALOGUE_SNAPSHOT_ONLY=1 в окружении включает режим узла
+# только для чтения: публичные страницы и /api/catalogue/ по смонтированному
+# снимку. Основной базы у такого узла нет вовсе — движок dummy падает на
+# любом запросе, — а middleware без сессий, входа, сообщений и профилировщика,
+# которые читают пользователя из базы
+CATALOGUE_SNAPSHOT_PATH = BASE_DIR / 'snapshots' / 'catalogue.sqlite3'
+CATALOGUE_SNAPSHOT_ONLY = os.environ.get('CATALOGUE_SNAPSHOT_ONLY') == '1'
+CATALOGUE_SNAPSHOT_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+if CATALOGUE_SNAPSHOT_ONLY:
+    ROOT_URLCONF = 'new.urls_snapshot'
+    MIDDLEWARE = CATALOGUE_SNAPSHOT_MIDDLEWARE
+    DATABASES = {'default': {'ENGINE': 'django.db.backends.dummy'}}
+    SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+    # Админка на этом узле не подключена к URL, ее проверки middleware не нужны
+    SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
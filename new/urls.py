@@ -14,15 +14,26 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path, re_path
 from app import views
 
 urlpatterns = [
+    path('admin/profiles/', views.profile_list, name='profile_list'),
+    re_path(r'^admin/profiles/(?P<capture_id>[\w-]+)\.(?P<fmt>json|folded)$', views.profile_download,
+            name='profile_download'),
     path('admin/', admin.site.urls),
     path('', views.kindergarten_list, name='kindergarten_list'),
     path('kindergartens/<int:pk>/', views.kindergarten_detail, name='kindergarten_detail'),
     path('kindergarten/<int:kindergarten_id>/add-review/', views.add_review, name='add_review'),
+    path('kindergartens/<int:pk>/apply/', views.enrollment_apply, name='enrollment_apply'),
     path('teachers/', views.teacher_list, name='teacher_list'),
     path('reviews/', views.review_list, name='review_list'),
-]
\ No newline at end of file
+    path('groups/free-seats/', views.free_seats, name='free_seats'),
+    path('api/kindergartens/nearby/', views.kindergarten_nearby_api, name='kindergarten_nearby_api'),
+    path('api/changes/', views.change_feed, name='change_feed'),
+    path('api/catalogue/', include('new.urls_catalogue')),
+    path('fragments/session/', views.session_fragment, name='session_fragment'),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
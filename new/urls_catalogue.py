@@ -0,0 +1,10 @@
+"""Каталог по снимку app/snapshot.py: /api/catalogue/ в обоих режимах развертывания."""
+from django.urls import path
+from app import views
+
+urlpatterns = [
+    path('kindergartens/', views.catalogue_kindergartens, name='catalogue_kindergartens'),
+    path('kindergartens/<int:pk>/', views.catalogue_kindergarten, name='catalogue_kindergarten'),
+    path('kindergartens/nearby/', views.catalogue_nearby, name='catalogue_nearby'),
+    path('groups/free-seats/', views.catalogue_free_seats, name='catalogue_free_seats'),
+]
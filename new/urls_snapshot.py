@@ -0,0 +1,20 @@
+"""
+URL configuration for read-only snapshot nodes (CATALOGUE_SNAPSHOT_ONLY=1).
+
+Публичные страницы и API каталога по смонтированному снимку. Админки,
+приема заявок и отзывов, которым нужна основная база, здесь нет; имена
+маршрутов те же, что в new/urls.py, поэтому шаблоны общие.
+"""
+from django.conf import settings
+from django.conf.urls.static import static
+from django.urls import include, path
+from app import views
+
+urlpatterns = [
+    path('', views.snapshot_kindergarten_list, name='kindergarten_list'),
+    path('kindergartens/<int:pk>/', views.snapshot_kindergarten_detail, name='kindergarten_detail'),
+    path('teachers/', views.snapshot_teacher_list, name='teacher_list'),
+    path('reviews/', views.snapshot_review_list, name='review_list'),
+    path('groups/free-seats/', views.snapshot_free_seats, name='free_seats'),
+    path('api/catalogue/', include('new.urls_catalogue')),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)